@@ -188,6 +188,7 @@ def script_func(command_string, status_file_path):
         + escape_bash_quotes(command_string) + " ; printf \"\\n" \
         + sprint_varx(ret_code_str, "${?}").rstrip("\n") + "\\n\"'"
     qprint_issuing(cmd_buf)
+    flush_print_sink()
     sub_proc = subprocess.Popen(cmd_buf, shell=True)
     sub_proc.communicate()
     shell_rc = sub_proc.returncode
@@ -219,6 +220,7 @@ def tee_func(command_string, status_file_path):
     cmd_buf = "set -o pipefail ; " + command_string + " 2>&1 | tee -a " \
         + status_file_path
     qprint_issuing(cmd_buf)
+    flush_print_sink()
     sub_proc = subprocess.Popen(cmd_buf, shell=True)
     sub_proc.communicate()
     shell_rc = sub_proc.returncode
@@ -7,12 +7,13 @@ Refer to https://robot-framework.readthedocs.io/en/3.0.1/autodoc/robot.parsing.h
 
 import sys
 import os
-from robot.parsing.model import TestData
+import multiprocessing
 sys.path.append(os.path.join(os.path.dirname(__file__), "../lib"))
 
 from gen_arg import *
 from gen_print import *
 from gen_valid import *
+import suite_index as si
 
 # Set exit_on_error for gen_valid functions.
 set_exit_on_error(True)
@@ -46,6 +47,27 @@ parser.add_argument(
     help='Test case attribute name.  This may be any one of the following:\n'
     + sprint_var(valid_options))
 
+parser.add_argument(
+    '--tags',
+    '-t',
+    default="",
+    help='A colon-delimited list of tags.  If specified, only test cases'
+    + ' having at least one of these tags are shown (tag comparison ignores'
+    + ' case and spaces).  Files without such test cases are not listed.')
+
+parser.add_argument(
+    '--index_file_path',
+    default=si.SUITE_INDEX_FILE_PATH,
+    help='The path of the suite index file.  Test case information is cached'
+    + ' in this file so that only robot files which have changed since the'
+    + ' last run need to be parsed.')
+
+parser.add_argument(
+    '--max_workers',
+    default=multiprocessing.cpu_count(),
+    type=int,
+    help='The maximum number of robot files to be parsed at once.')
+
 # Populate stock_list with options we want.
 stock_list = [("test_mode", 0), ("quiet", 0), ("debug", 0)]
 
@@ -95,14 +117,24 @@ def validate_parms():
     gen_post_validation(exit_function, signal_handler)
 
 
-def parse_test_suites(source_path, option):
+def parse_test_suites(source_path, option, tags="", index_file_path=None,
+                      max_workers=None):
     r"""
     Parse the robot files and extract test data output.
 
+    The test data is obtained from the suite index (see suite_index.py),
+    which is first brought up to date by re-parsing (in parallel) only the
+    robot files which have changed.
+
     Description of argument(s):
     source_path   The path to a robot file or a directory of robot files.
     option        Test case attribute instances such as "name",
                   "tags" or "doc".
+    tags          A colon-delimited list of tags.  If specified, only test
+                  cases having at least one of these tags are shown.
+    index_file_path
+                  The path of the suite index file.
+    max_workers   The maximum number of robot files to be parsed at once.
     """
     if os.path.isfile(source_path):
         file_paths = [source_path]
@@ -110,41 +142,46 @@ def parse_test_suites(source_path, option):
         file_paths = [os.path.join(path, file)
                       for (path, dirs, files) in os.walk(source_path)
                       for file in files]
+    file_paths = [os.path.abspath(file_path) for file_path in file_paths]
+    robot_file_paths = [file_path for file_path in file_paths
+                        if file_path.endswith(".robot")]
+
+    index = si.update_index(robot_file_paths, index_file_path, max_workers)
 
+    tags = list(filter(None, tags.split(":")))
     for file_path in file_paths:
-        print (file_path)
-        if "__init__.robot" in file_path:
+        tests = [test for _, test in si.query_index(index, [file_path], tags)]
+        if tags and not tests:
             continue
-        test_suite_obj = TestData(parent=None, source=file_path)
-        parse_test_file(test_suite_obj, option)
+        print (file_path)
+        parse_test_file(tests, option)
 
 
-def parse_test_file(test_suite_obj, option):
+def parse_test_file(tests, option):
     r"""
-    Extract test information from test suite object and print it to stdout in
-    the following format:
+    Print the test information in the following format:
 
     <Test Case name>
     <Test Tags name>
     <Test Documentation>
 
     Description of argument(s):
-    test_suite_obj    Test data suite object.
+    tests             A list of test dictionaries (see suite_index.py).
     option            Test case attribute instances such as "name",
                       "tags" or "doc".
     """
 
-    for testcase in test_suite_obj.testcase_table:
+    for testcase in tests:
         if option == "name":
-            print (testcase.name)
+            print (testcase['name'])
         elif option == "tags":
-            print (testcase.tags)
+            print (testcase['tags'])
         elif option == "doc":
-            print (testcase.doc)
+            print (testcase['doc'])
         elif option == "all":
-            print (testcase.name)
-            print (testcase.tags)
-            print (testcase.doc)
+            print (testcase['name'])
+            print (testcase['tags'])
+            print (testcase['doc'])
 
 
 def main():
@@ -155,7 +192,8 @@ def main():
 
     qprint_pgm_header()
 
-    parse_test_suites(source_path, option)
+    parse_test_suites(source_path, option, tags, index_file_path,
+                      max_workers)
 
     return True
 
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+import sys
+try:
+    import __builtin__
+except ImportError:
+    import builtins as __builtin__
+
+import os
+import signal
+import time
+import threading
+
+# python puts the program's directory path in sys.path[0].  In other words,
+# the user ordinarily has no way to override python's choice of a module from
+# its own dir.  We want to have that ability in our environment.  However, we
+# don't want to break any established python modules that depend on this
+# behavior.  So, we'll save the value from sys.path[0], delete it, import our
+# modules and then restore sys.path to its original value.
+
+save_path_0 = sys.path[0]
+del sys.path[0]
+
+from gen_print import *
+from gen_arg import *
+import func_timer as ft
+
+# Restore sys.path[0].
+sys.path.insert(0, save_path_0)
+
+
+# Create parser object to process command line parameters and args.
+
+# Create parser object.
+parser = argparse.ArgumentParser(
+    usage='%(prog)s [OPTIONS]',
+    description="%(prog)s will measure and print the average per-call cost,"
+                + " in microseconds, of running a trivial function with"
+                + " func_timer_class.run, with and without a time_out, from"
+                + " the main thread and from several threads at once.  For"
+                + " comparison, it also measures the cost of the fork, kill"
+                + " and waitpid which the former fork-based func timer paid"
+                + " per timed call.",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    prefix_chars='-+')
+
+# Create arguments.
+parser.add_argument(
+    '--num_calls',
+    default=10000,
+    type=int,
+    help='The number of calls to be timed for each case.' + default_string)
+
+parser.add_argument(
+    '--num_threads',
+    default=8,
+    type=int,
+    help='The number of threads making timed calls at once for the'
+         + ' concurrent case.' + default_string)
+
+parser.add_argument(
+    '--num_forks',
+    default=100,
+    type=int,
+    help='The number of fork/kill/waitpid cycles to be timed.'
+         + default_string)
+
+# The stock_list will be passed to gen_get_options.  We populate it with the
+# names of stock parm options we want.  These stock parms are pre-defined by
+# gen_get_options.
+stock_list = [("test_mode", 0), ("quiet", 1), ("debug", 0)]
+
+
+def exit_function(signal_number=0,
+                  frame=None):
+    r"""
+    Execute whenever the program ends normally or with the signals that we
+    catch (i.e. TERM, INT).
+    """
+
+    dprint_executing()
+    dprint_var(signal_number)
+
+    qprint_pgm_footer()
+
+
+def signal_handler(signal_number, frame):
+    r"""
+    Handle signals.  Without a function to catch a SIGTERM or SIGINT, our
+    program would terminate immediately with return code 143 and without
+    calling our exit_function.
+    """
+
+    # Our convention is to set up exit_function with atexit.registr() so
+    # there is no need to explicitly call exit_function from here.
+
+    dprint_executing()
+
+    # Calling exit prevents us from returning to the code that was running
+    # when we received the signal.
+    exit(0)
+
+
+def validate_parms():
+    r"""
+    Validate program parameters, etc.  Return True or False accordingly.
+    """
+
+    gen_post_validation(exit_function, signal_handler)
+
+    return True
+
+
+def time_calls(num_calls,
+               num_threads,
+               num_forks):
+    r"""
+    Time the func timer cases described in the program description and
+    return a dictionary of average per-call times in microseconds.
+
+    Description of argument(s):
+    num_calls                       The number of calls to be timed for each
+                                    case.
+    num_threads                     The number of threads making timed calls
+                                    at once for the concurrent case.
+    num_forks                       The number of fork/kill/waitpid cycles to
+                                    be timed.
+    """
+
+    func_timer = ft.func_timer_class()
+
+    def call_direct():
+        len("Hi.")
+
+    def call_run():
+        func_timer.run(len, "Hi.")
+
+    def call_run_time_out():
+        func_timer.run(len, "Hi.", time_out=60)
+
+    call_times = collections.OrderedDict()
+    for func in [call_direct, call_run, call_run_time_out]:
+        start_time = time.time()
+        for ix in range(num_calls):
+            func()
+        call_times[func.__name__[5:]] = \
+            "%.2f" % ((time.time() - start_time) * 1000000.0 / num_calls)
+
+    def run_time_out_loop():
+        for ix in range(num_calls):
+            call_run_time_out()
+
+    threads = [threading.Thread(target=run_time_out_loop)
+               for ix in range(num_threads)]
+    start_time = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    call_times['run_time_out_' + str(num_threads) + '_threads'] = \
+        "%.2f" % ((time.time() - start_time) * 1000000.0
+                  / (num_calls * num_threads))
+
+    start_time = time.time()
+    for ix in range(num_forks):
+        child_pid = os.fork()
+        if child_pid == 0:
+            time.sleep(60)
+            os._exit(0)
+        os.kill(child_pid, signal.SIGKILL)
+        os.waitpid(child_pid, 0)
+    call_times['fork_kill_waitpid'] = \
+        "%.2f" % ((time.time() - start_time) * 1000000.0 / num_forks)
+
+    return call_times
+
+
+def main():
+    r"""
+    This is the "main" function.  The advantage of having this function vs
+    just doing this in the true mainline is that you can:
+    - Declare local variables
+    - Use "return" instead of "exit".
+    - Indent 4 chars like you would in any function.
+    This makes coding more consistent, i.e. it's easy to move code from here
+    into a function and vice versa.
+    """
+
+    if not gen_get_options(parser, stock_list):
+        return False
+
+    if not validate_parms():
+        return False
+
+    qprint_pgm_header()
+
+    # Access program parameter globals.
+    global num_calls
+    global num_threads
+    global num_forks
+
+    call_times = time_calls(num_calls, num_threads, num_forks)
+    print_var(call_times)
+
+    return True
+
+
+# Main
+
+if not main():
+    exit(1)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+import sys
+try:
+    import __builtin__
+except ImportError:
+    import builtins as __builtin__
+
+import time
+
+# python puts the program's directory path in sys.path[0].  In other words,
+# the user ordinarily has no way to override python's choice of a module from
+# its own dir.  We want to have that ability in our environment.  However, we
+# don't want to break any established python modules that depend on this
+# behavior.  So, we'll save the value from sys.path[0], delete it, import our
+# modules and then restore sys.path to its original value.
+
+save_path_0 = sys.path[0]
+del sys.path[0]
+
+from gen_print import *
+from gen_arg import *
+import gen_print as gp
+
+# Restore sys.path[0].
+sys.path.insert(0, save_path_0)
+
+
+# Create parser object to process command line parameters and args.
+
+# Create parser object.
+parser = argparse.ArgumentParser(
+    usage='%(prog)s [OPTIONS]',
+    description="%(prog)s will measure and print the average per-call cost,"
+                + " in microseconds, of qprint and dprint calls which are"
+                + " suppressed (i.e. quiet=1, debug=0) as well as that of"
+                + " get_arg_name-based calls such as sprint_var.  The calls"
+                + " are made from the specified stack depth since the cost of"
+                + " resolving the quiet and debug values depends on it.",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    prefix_chars='-+')
+
+# Create arguments.
+parser.add_argument(
+    '--num_calls',
+    default=10000,
+    type=int,
+    help='The number of calls to be timed for each function.'
+         + default_string)
+
+parser.add_argument(
+    '--stack_depth',
+    default=20,
+    type=int,
+    help='The number of stack frames beneath which the calls are to be made.'
+         + default_string)
+
+# The stock_list will be passed to gen_get_options.  We populate it with the
+# names of stock parm options we want.  These stock parms are pre-defined by
+# gen_get_options.
+stock_list = [("test_mode", 0), ("quiet", 1), ("debug", 0)]
+
+
+def exit_function(signal_number=0,
+                  frame=None):
+    r"""
+    Execute whenever the program ends normally or with the signals that we
+    catch (i.e. TERM, INT).
+    """
+
+    dprint_executing()
+    dprint_var(signal_number)
+
+    qprint_pgm_footer()
+
+
+def signal_handler(signal_number, frame):
+    r"""
+    Handle signals.  Without a function to catch a SIGTERM or SIGINT, our
+    program would terminate immediately with return code 143 and without
+    calling our exit_function.
+    """
+
+    # Our convention is to set up exit_function with atexit.registr() so
+    # there is no need to explicitly call exit_function from here.
+
+    dprint_executing()
+
+    # Calling exit prevents us from returning to the code that was running
+    # when we received the signal.
+    exit(0)
+
+
+def validate_parms():
+    r"""
+    Validate program parameters, etc.  Return True or False accordingly.
+    """
+
+    gen_post_validation(exit_function, signal_handler)
+
+    return True
+
+
+def time_calls(stack_depth,
+               num_calls):
+    r"""
+    Recurse to the given stack depth and then time num_calls calls to each of
+    several print functions.  Return a dictionary of average per-call times in
+    microseconds.
+
+    Description of argument(s):
+    stack_depth                     The number of additional stack frames to
+                                    create before timing the calls.
+    num_calls                       The number of calls to be timed for each
+                                    function.
+    """
+
+    if stack_depth > 0:
+        return time_calls(stack_depth - 1, num_calls)
+
+    my_var = "my value"
+
+    def call_qprint_timen():
+        gp.qprint_timen("Hi.")
+
+    def call_qprint_var():
+        gp.qprint_var(my_var)
+
+    def call_dprint_var():
+        gp.dprint_var(my_var)
+
+    def call_sprint_var():
+        gp.sprint_var(my_var)
+
+    call_times = collections.OrderedDict()
+    for func in [call_qprint_timen, call_qprint_var, call_dprint_var,
+                 call_sprint_var]:
+        start_time = time.time()
+        for ix in range(num_calls):
+            func()
+        call_times[func.__name__[5:]] = \
+            "%.2f" % ((time.time() - start_time) * 1000000.0 / num_calls)
+
+    return call_times
+
+
+def main():
+    r"""
+    This is the "main" function.  The advantage of having this function vs
+    just doing this in the true mainline is that you can:
+    - Declare local variables
+    - Use "return" instead of "exit".
+    - Indent 4 chars like you would in any function.
+    This makes coding more consistent, i.e. it's easy to move code from here
+    into a function and vice versa.
+    """
+
+    if not gen_get_options(parser, stock_list):
+        return False
+
+    if not validate_parms():
+        return False
+
+    qprint_pgm_header()
+
+    # Access program parameter globals.
+    global num_calls
+    global stack_depth
+
+    call_times = time_calls(stack_depth, num_calls)
+    print_var(call_times)
+
+    return True
+
+
+# Main
+
+if not main():
+    exit(1)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+import sys
+try:
+    import __builtin__
+except ImportError:
+    import builtins as __builtin__
+
+import os
+
+# python puts the program's directory path in sys.path[0].  In other words,
+# the user ordinarily has no way to override python's choice of a module from
+# its own dir.  We want to have that ability in our environment.  However, we
+# don't want to break any established python modules that depend on this
+# behavior.  So, we'll save the value from sys.path[0], delete it, import our
+# modules and then restore sys.path to its original value.
+
+save_path_0 = sys.path[0]
+del sys.path[0]
+
+from gen_print import *
+from gen_valid import *
+from gen_arg import *
+from gen_misc import *
+import boot_fleet as bf
+
+# Restore sys.path[0].
+sys.path.insert(0, save_path_0)
+
+
+# Create parser object to process command line parameters and args.
+
+# Create parser object.
+parser = argparse.ArgumentParser(
+    usage='%(prog)s [OPTIONS]',
+    description="%(prog)s will run obmc_boot_test against many BMCs at once"
+                + " from a single controlling process.  Each BMC's FFDC,"
+                + " status and plug-in save data is kept in its own"
+                + " directory beneath the fleet directory.  When all of the"
+                + " boot tests have finished, %(prog)s prints the merged"
+                + " boot results.",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    prefix_chars='-+')
+
+# Create arguments.
+parser.add_argument(
+    '--openbmc_hosts',
+    required=True,
+    help='A colon-delimited list of the BMC hosts to be tested.  Each entry'
+         + ' may take the form "<nickname>=<host>".' + default_string)
+
+parser.add_argument(
+    '--os_hosts',
+    default="",
+    help='A colon-delimited list of OS hosts corresponding to the BMC hosts'
+         + ' specified in openbmc_hosts.' + default_string)
+
+parser.add_argument(
+    '--fleet_dir_path',
+    default=os.environ.get("HOME", ".") + "/fleet/",
+    help='The directory beneath which a directory is to be created for each'
+         + ' BMC.' + default_string)
+
+parser.add_argument(
+    '--max_workers',
+    default=0,
+    type=int,
+    help='The maximum number of BMCs to test at once.  A value of 0 means'
+         + ' that all BMCs are to be tested at once.' + default_string)
+
+parser.add_argument(
+    '--variable',
+    action='append',
+    default=[],
+    help='A "<name>:<value>" robot variable specification to be passed to'
+         + ' each obmc_boot_test (e.g. "boot_list:Redfish Power On").  This'
+         + ' option may be specified more than once.' + default_string)
+
+# The stock_list will be passed to gen_get_options.  We populate it with the
+# names of stock parm options we want.  These stock parms are pre-defined by
+# gen_get_options.
+stock_list = [("test_mode", 0), ("quiet", 0), ("debug", 0)]
+
+
+def exit_function(signal_number=0,
+                  frame=None):
+    r"""
+    Execute whenever the program ends normally or with the signals that we
+    catch (i.e. TERM, INT).
+    """
+
+    dprint_executing()
+    dprint_var(signal_number)
+
+    qprint_pgm_footer()
+
+
+def signal_handler(signal_number, frame):
+    r"""
+    Handle signals.  Without a function to catch a SIGTERM or SIGINT, our
+    program would terminate immediately with return code 143 and without
+    calling our exit_function.
+    """
+
+    # Our convention is to set up exit_function with atexit.registr() so
+    # there is no need to explicitly call exit_function from here.
+
+    dprint_executing()
+
+    # Calling exit prevents us from returning to the code that was running
+    # when we received the signal.
+    exit(0)
+
+
+def validate_parms():
+    r"""
+    Validate program parameters, etc.  Return True or False accordingly.
+    """
+
+    gen_post_validation(exit_function, signal_handler)
+
+    return True
+
+
+def main():
+    r"""
+    This is the "main" function.  The advantage of having this function vs
+    just doing this in the true mainline is that you can:
+    - Declare local variables
+    - Use "return" instead of "exit".
+    - Indent 4 chars like you would in any function.
+    This makes coding more consistent, i.e. it's easy to move code from here
+    into a function and vice versa.
+    """
+
+    if not gen_get_options(parser, stock_list):
+        return False
+
+    if not validate_parms():
+        return False
+
+    qprint_pgm_header()
+
+    # Access program parameter globals.
+    global openbmc_hosts
+    global os_hosts
+    global fleet_dir_path
+    global max_workers
+    global variable
+
+    host_list = bf.create_host_list(openbmc_hosts, os_hosts)
+    qprint_var(host_list)
+
+    if test_mode:
+        return True
+
+    results, boot_results = \
+        bf.run_fleet_boot_test(host_list, fleet_dir_path, variable,
+                               max_workers or None)
+
+    for result in results:
+        print_vars(result['openbmc_nickname'], result['rc'],
+                   result['host_dir_path'])
+
+    if boot_results is not None:
+        boot_results.print_report()
+
+    return not [result for result in results if result['rc'] != 0]
+
+
+# Main
+
+if not main():
+    exit(1)
@@ -8,6 +8,7 @@ except ImportError:
 import subprocess
 import os
 import argparse
+import threading
 
 # python puts the program's directory path in sys.path[0].  In other words,
 # the user ordinarily has no way to override python's choice of a module from
@@ -121,6 +122,18 @@ parser.add_argument(
     default="obmc",
     help=mch_class_help_text + default_string)
 
+parser.add_argument(
+    '--max_workers',
+    default=int(os.environ.get('PLUG_IN_MAX_WORKERS', 8)),
+    type=int,
+    help='The maximum number of call point programs to be run concurrently.'
+         + '  Only plug-ins which declare themselves parallel-safe (via a'
+         + ' "parallel_safe" file in the plug-in directory) are run'
+         + ' concurrently, and a plug-in is never started until the plug-ins'
+         + ' listed in its "depends_on" file have finished.  The results are'
+         + ' reported in plug-in order.  A value of 1 causes all call point'
+         + ' programs to be run one at a time.' + default_string)
+
 # The stock_list will be passed to gen_get_options.  We populate it with the
 # names of stock parm options we want.  These stock parms are pre-defined by
 # gen_get_options.
@@ -178,54 +191,37 @@ def validate_parms():
     return True
 
 
-def run_pgm(plug_in_dir_path,
-            call_point,
-            allow_shell_rc):
+def prepare_pgm(plug_in_dir_path,
+                call_point,
+                stdout):
     r"""
-    Run the call point program in the given plug_in_dir_path.  Return the
-    following:
-    rc                              The return code - 0 = PASS, 1 = FAIL.
-    shell_rc                        The shell return code returned by
-                                    process_plug_in_packages.py.
-    failed_plug_in_name             The failed plug in name (if any).
+    Prepare to run the call point program in the given plug_in_dir_path and
+    return a dictionary describing it or None if the plug-in has no such call
+    point program.
+
+    The dictionary contains the following keys:
+    plug_in_name                    The plug-in name.
+    pgm_name                        The plug-in name and call point program
+                                    name (e.g. "Stop/cp_stop_check").
+    cmd_buf                         The command string which runs the call
+                                    point program.
+    status_file_path                The path of the program's status file.
 
     Description of arguments:
-    plug_in_dir_path                The directory path where the call_point
-                                    program may be located.
-    call_point                      The call point (e.g. "setup").  This
-                                    program will look for a program named
-                                    "cp_" + call_point in the
-                                    plug_in_dir_path.  If no such call point
-                                    program is found, this function returns an
-                                    rc of 0 (i.e. success).
-    allow_shell_rc                  The user may supply a value other than
-                                    zero to indicate an acceptable non-zero
-                                    return code.  For example, if this value
-                                    equals 0x00000200, it means that for each
-                                    plug-in call point that runs, a 0x00000200
-                                    will not be counted as a failure.  See
-                                    note above regarding left-shifting of
-                                    return codes.
+    plug_in_dir_path                See run_pgm.
+    call_point                      See run_pgm.
+    stdout                          Indicates whether the call point
+                                    program's output should be written to
+                                    stdout as well as to its status file.
     """
 
-    rc = 0
-    failed_plug_in_name = ""
-    shell_rc = 0x00000000
-
-    plug_in_name = os.path.basename(os.path.normpath(plug_in_dir_path))
+    plug_in_name = get_plug_in_name(plug_in_dir_path)
     cp_prefix = "cp_"
     plug_in_pgm_path = plug_in_dir_path + cp_prefix + call_point
     if not os.path.exists(plug_in_pgm_path):
-        # No such call point in this plug in dir path.  This is legal so we
-        # return 0, etc.
-        return rc, shell_rc, failed_plug_in_name
-
-    print("------------------------------------------------- Starting plug-"
-          + "in -----------------------------------------------")
+        # No such call point in this plug in dir path.  This is legal.
+        return None
 
-    print_timen("Running " + plug_in_name + "/" + cp_prefix + call_point + ".")
-
-    stdout = 1 - quiet
     if AUTOBOOT_OPENBMC_NICKNAME != "":
         auto_status_file_prefix = AUTOBOOT_OPENBMC_NICKNAME + "."
     else:
@@ -250,21 +246,81 @@ def run_pgm(plug_in_dir_path,
 
     cmd_buf = "PATH=" + plug_in_dir_path.rstrip("/") + ":${PATH} ; " +\
         auto_status_file_subcmd + cp_prefix + call_point
-    print_issuing(cmd_buf)
 
-    sub_proc = subprocess.Popen(cmd_buf, shell=True)
+    return {'plug_in_name': plug_in_name,
+            'pgm_name': plug_in_name + "/" + cp_prefix + call_point,
+            'cmd_buf': cmd_buf,
+            'status_file_path': status_dir_path + status_file_name}
+
+
+def print_pgm_start(pgm):
+    r"""
+    Print the lines which announce the running of a call point program.
+
+    Description of arguments:
+    pgm                             A dictionary returned by prepare_pgm.
+    """
+
+    print("------------------------------------------------- Starting plug-"
+          + "in -----------------------------------------------")
+
+    print_timen("Running " + pgm['pgm_name'] + ".")
+    print_issuing(pgm['cmd_buf'])
+
+
+def execute_pgm(pgm):
+    r"""
+    Run the call point program and return its shell return code (shifted
+    left one byte).
+
+    This function does no printing and so may be run in a worker thread.
+
+    Description of arguments:
+    pgm                             A dictionary returned by prepare_pgm.
+    """
+
+    sub_proc = subprocess.Popen(pgm['cmd_buf'], shell=True)
     sub_proc.communicate()
-    shell_rc = sub_proc.returncode
     # Shift to left.
-    shell_rc *= 0x100
+    return sub_proc.returncode * 0x100
+
+
+def report_pgm(pgm,
+               shell_rc,
+               allow_shell_rc,
+               stdout,
+               show_status_file=0):
+    r"""
+    Print the results of running a call point program and return the
+    following:
+    rc                              The return code - 0 = PASS, 1 = FAIL.
+    shell_rc                        The shell return code.
+    failed_plug_in_name             The failed plug in name (if any).
+
+    Description of arguments:
+    pgm                             A dictionary returned by prepare_pgm.
+    shell_rc                        The shell return code returned by
+                                    execute_pgm.
+    allow_shell_rc                  See run_pgm.
+    stdout                          Indicates that the call point program's
+                                    output was written to stdout as it ran
+                                    (i.e. that its status file need not be
+                                    printed).
+    show_status_file                Indicates that, if stdout is not set, the
+                                    call point program's status file is to be
+                                    printed even if the program succeeded.
+    """
+
+    rc = 0
+    failed_plug_in_name = ""
     if shell_rc != 0 and shell_rc != allow_shell_rc:
         rc = 1
-        failed_plug_in_name = plug_in_name + "/" + cp_prefix + call_point
+        failed_plug_in_name = pgm['pgm_name']
     if shell_rc != 0:
-        failed_plug_in_name = plug_in_name + "/" + cp_prefix + call_point
-    if failed_plug_in_name != "" and not stdout:
+        failed_plug_in_name = pgm['pgm_name']
+    if (failed_plug_in_name != "" or show_status_file) and not stdout:
         # Use tail to avoid double-printing of status_file_url.
-        shell_cmd("tail -n +2 " + status_dir_path + status_file_name, quiet=1,
+        shell_cmd("tail -n +2 " + pgm['status_file_path'], quiet=1,
                   print_output=1)
 
     print("------------------------------------------------- Ending plug-in"
@@ -276,6 +332,186 @@ def run_pgm(plug_in_dir_path,
     return rc, shell_rc, failed_plug_in_name
 
 
+def run_pgm(plug_in_dir_path,
+            call_point,
+            allow_shell_rc):
+    r"""
+    Run the call point program in the given plug_in_dir_path.  Return the
+    following:
+    rc                              The return code - 0 = PASS, 1 = FAIL.
+    shell_rc                        The shell return code returned by
+                                    process_plug_in_packages.py.
+    failed_plug_in_name             The failed plug in name (if any).
+
+    Description of arguments:
+    plug_in_dir_path                The directory path where the call_point
+                                    program may be located.
+    call_point                      The call point (e.g. "setup").  This
+                                    program will look for a program named
+                                    "cp_" + call_point in the
+                                    plug_in_dir_path.  If no such call point
+                                    program is found, this function returns an
+                                    rc of 0 (i.e. success).
+    allow_shell_rc                  The user may supply a value other than
+                                    zero to indicate an acceptable non-zero
+                                    return code.  For example, if this value
+                                    equals 0x00000200, it means that for each
+                                    plug-in call point that runs, a 0x00000200
+                                    will not be counted as a failure.  See
+                                    note above regarding left-shifting of
+                                    return codes.
+    """
+
+    stdout = 1 - quiet
+    pgm = prepare_pgm(plug_in_dir_path, call_point, stdout)
+    if pgm is None:
+        return 0, 0x00000000, ""
+
+    print_pgm_start(pgm)
+    flush_print_sink()
+    shell_rc = execute_pgm(pgm)
+
+    return report_pgm(pgm, shell_rc, allow_shell_rc, stdout)
+
+
+def is_stop_condition(rc,
+                      shell_rc):
+    r"""
+    Return True if the given call point program results mean that no further
+    call point programs are to be run (per stop_on_plug_in_failure and
+    stop_on_non_zero_rc).
+
+    Description of arguments:
+    rc                              The return code - 0 = PASS, 1 = FAIL.
+    shell_rc                        The shell return code.
+    """
+
+    return (rc != 0 and stop_on_plug_in_failure) \
+        or (shell_rc != 0 and stop_on_non_zero_rc)
+
+
+def run_pgm_serially(plug_in_group,
+                     call_point,
+                     allow_shell_rc):
+    r"""
+    Run the call point programs of the given group of plug-ins one at a time
+    and return a list of (rc, shell_rc, failed_plug_in_name) tuples, one per
+    plug-in which was run, in plug-in order.  Plug-ins are run until one of
+    them meets a stop condition (see is_stop_condition).
+
+    Description of arguments:
+    plug_in_group                   A list of plug-in directory paths (see
+                                    create_plug_in_schedule).
+    call_point                      See run_pgm.
+    allow_shell_rc                  See run_pgm.
+    """
+
+    results = []
+    for plug_in_dir_path in plug_in_group:
+        results.append(run_pgm(plug_in_dir_path, call_point, allow_shell_rc))
+        rc, shell_rc, failed_plug_in_name = results[-1]
+        if is_stop_condition(rc, shell_rc):
+            break
+
+    return results
+
+
+def run_pgm_group(plug_in_group,
+                  call_point,
+                  allow_shell_rc):
+    r"""
+    Run the call point programs of the given group of plug-ins concurrently
+    and return a list of (rc, shell_rc, failed_plug_in_name) tuples, one per
+    plug-in, in plug-in order.  The tuple for any plug-in which was not run
+    (e.g. because an earlier plug-in failed and stop_on_plug_in_failure is
+    set) is None.
+
+    Each plug-in is started only after any plug-ins in the group that it
+    depends on have finished.  The call point programs' output is written
+    only to their status files while they run.  Once all have finished, the
+    results are printed in plug-in order, exactly as run_pgm would have
+    printed them.
+
+    If the concurrent.futures module is not available (i.e. python 2 without
+    the futures backport), the programs are run one at a time instead (see
+    run_pgm_serially).
+
+    Description of arguments:
+    plug_in_group                   A list of plug-in directory paths (see
+                                    create_plug_in_schedule).
+    call_point                      See run_pgm.
+    allow_shell_rc                  See run_pgm.
+    """
+
+    # concurrent.futures is imported here rather than at module level because
+    # python 2 only has it if the "futures" backport is installed.
+    try:
+        from concurrent import futures
+    except ImportError:
+        return run_pgm_serially(plug_in_group, call_point, allow_shell_rc)
+
+    pgms = [prepare_pgm(plug_in_dir_path, call_point, 0)
+            for plug_in_dir_path in plug_in_group]
+    names = [get_plug_in_name(plug_in_dir_path)
+             for plug_in_dir_path in plug_in_group]
+    stop_event = threading.Event()
+
+    def run_group_pgm(pgm, dependency_futures):
+        # Wait for the plug-ins we depend on and then run our program unless
+        # a stop condition has been met.
+        for dependency_future in dependency_futures:
+            dependency_future.result()
+        if pgm is None:
+            return 0
+        if stop_event.is_set():
+            return None
+        shell_rc = execute_pgm(pgm)
+        rc = int(shell_rc != 0 and shell_rc != allow_shell_rc)
+        if is_stop_condition(rc, shell_rc):
+            stop_event.set()
+        return shell_rc
+
+    flush_print_sink()
+    executor = futures.ThreadPoolExecutor(
+        max_workers=min(max_workers, len(plug_in_group)))
+    try:
+        pgm_futures = []
+        for pgm, plug_in_dir_path in zip(pgms, plug_in_group):
+            dependency_futures = \
+                [pgm_futures[names.index(dependency)]
+                 for dependency in get_plug_in_dependencies(plug_in_dir_path)
+                 if dependency in names[:len(pgm_futures)]]
+            pgm_futures.append(executor.submit(run_group_pgm, pgm,
+                                               dependency_futures))
+        shell_rcs = [pgm_future.result() for pgm_future in pgm_futures]
+    finally:
+        executor.shutdown(wait=True)
+
+    # Report in plug-in order up to the first result which meets a stop
+    # condition, just as if the programs had been run one at a time.  Any
+    # programs after that one which had already been started are noted but
+    # not reported, so that the last failed_plug_in_name and shell_rc values
+    # printed are the same as they would have been.
+    results = []
+    stopped = False
+    for pgm, shell_rc in zip(pgms, shell_rcs):
+        if pgm is None:
+            results.append((0, 0x00000000, ""))
+        elif shell_rc is None:
+            results.append(None)
+        elif stopped:
+            print_timen(pgm['pgm_name'] + " was run concurrently and"
+                        + " returned shell_rc 0x%08x" % shell_rc
+                        + " but its results are being ignored.")
+            results.append(None)
+        else:
+            print_pgm_start(pgm)
+            results.append(report_pgm(pgm, shell_rc, allow_shell_rc, 0,
+                                      1 - quiet))
+            stopped = is_stop_condition(*results[-1][:2])
+    return results
+
+
 def main():
     r"""
     This is the "main" function.  The advantage of having this function vs
@@ -301,6 +537,7 @@ def main():
     global allow_shell_rc
     global stop_on_plug_in_failure
     global stop_on_non_zero_rc
+    global max_workers
 
     plug_in_packages_list = return_plug_in_packages_list(plug_in_dir_paths,
                                                          mch_class)
@@ -315,17 +552,40 @@ def main():
     global AUTOBOOT_OPENBMC_NICKNAME
     AUTOBOOT_OPENBMC_NICKNAME = os.environ.get("AUTOBOOT_OPENBMC_NICKNAME", "")
 
+    try:
+        plug_in_schedule = create_plug_in_schedule(plug_in_packages_list,
+                                                   call_point)
+    except ValueError as error:
+        print_error(str(error))
+        return False
+    dprint_var(plug_in_schedule)
+
     ret_code = 0
-    for plug_in_dir_path in plug_in_packages_list:
-        rc, shell_rc, failed_plug_in_name = \
-            run_pgm(plug_in_dir_path, call_point, allow_shell_rc)
-        if rc != 0:
-            ret_code = 1
-            if stop_on_plug_in_failure:
+    stop = False
+    for plug_in_group in plug_in_schedule:
+        if len(plug_in_group) > 1 and max_workers > 1:
+            results = run_pgm_group(plug_in_group, call_point,
+                                    allow_shell_rc)
+        else:
+            results = run_pgm_serially(plug_in_group, call_point,
+                                       allow_shell_rc)
+        # Process the results in plug-in order so that the outcome does not
+        # depend on which call point programs finished first.
+        for result in results:
+            if result is None:
+                continue
+            rc, shell_rc, failed_plug_in_name = result
+            if rc != 0:
+                ret_code = 1
+                if stop_on_plug_in_failure:
+                    stop = True
+                    break
+            if shell_rc != 0 and stop_on_non_zero_rc:
+                qprint_time("Stopping on non-zero shell return code as"
+                            + " requested by caller.\n")
+                stop = True
                 break
-        if shell_rc != 0 and stop_on_non_zero_rc:
-            qprint_time("Stopping on non-zero shell return code as requested"
-                        + " by caller.\n")
+        if stop:
             break
 
     if ret_code == 0:
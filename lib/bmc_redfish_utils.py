@@ -4,10 +4,146 @@ r"""
 BMC redfish utility functions.
 """
 
+import os
 import json
+import threading
+import requests
+from requests.adapters import HTTPAdapter
 from robot.libraries.BuiltIn import BuiltIn
 import gen_print as gp
 
+# REDFISH_MAX_WORKERS is the default maximum number of concurrent requests
+# that enumerate_request will make to any one BMC.  A value of 1 (the default)
+# causes enumerate_request to make its requests one at a time via the redfish
+# library object, which applies its own status code checking and response
+# cache.
+REDFISH_MAX_WORKERS = int(os.environ.get('REDFISH_MAX_WORKERS', 1))
+# The HTTP status codes which enumerate_request tolerates.  Resources with
+# status codes other than 200 are left out of the enumeration.  Any other
+# status code (or a connection error) causes enumerate_request to fail.
+ENUMERATE_VALID_STATUS_CODES = [200, 404, 500]
+# The number of seconds to allow for each request made by the parallel
+# crawler.
+REDFISH_REQUEST_TIME_OUT = int(os.environ.get('REDFISH_REQUEST_TIME_OUT', 30))
+
+# host_semaphores is a dictionary whose keys are redfish base URLs and whose
+# values are semaphores which limit the number of concurrent requests made to
+# that host by all crawls in this process.
+host_semaphores = {}
+host_semaphores_lock = threading.Lock()
+
+
+def get_host_semaphore(base_url,
+                       max_workers):
+    r"""
+    Return the semaphore which limits the number of concurrent requests to
+    the given host, creating it if necessary.
+
+    Description of argument(s):
+    base_url                        The redfish base URL of the host (e.g.
+                                    "https://bmc1").
+    max_workers                     The maximum number of concurrent requests
+                                    to be allowed for the host.  This is only
+                                    used when the semaphore is first created.
+    """
+
+    with host_semaphores_lock:
+        if base_url not in host_semaphores:
+            host_semaphores[base_url] = threading.BoundedSemaphore(max_workers)
+        return host_semaphores[base_url]
+
+
+class redfish_session_pool(object):
+    r"""
+    Define the redfish session pool class.
+
+    A redfish session pool provides one keep-alive requests.Session per
+    thread, all of which share the redfish session key (i.e. X-Auth-Token) of
+    an existing, logged-in redfish object.  This allows a crawler to make
+    many concurrent GET requests to a BMC without creating additional redfish
+    sessions on the BMC.
+    """
+
+    def __init__(self,
+                 base_url,
+                 session_key,
+                 max_workers=REDFISH_MAX_WORKERS,
+                 time_out=REDFISH_REQUEST_TIME_OUT):
+        r"""
+        Initialize the session pool.
+
+        Description of argument(s):
+        base_url                    The redfish base URL (e.g.
+                                    "https://bmc1").
+        session_key                 The session key of a logged-in redfish
+                                    object.
+        max_workers                 The maximum number of concurrent requests
+                                    to be made to the host.
+        time_out                    The number of seconds to allow for each
+                                    request.
+        """
+
+        self.__base_url = base_url.rstrip('/')
+        self.__session_key = session_key
+        self.__time_out = time_out
+        self.__semaphore = get_host_semaphore(self.__base_url, max_workers)
+        self.__thread_data = threading.local()
+        self.__sessions = []
+        self.__sessions_lock = threading.Lock()
+
+    def get_session(self):
+        r"""
+        Return the calling thread's session, creating it if necessary.
+        """
+
+        session = getattr(self.__thread_data, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({'X-Auth-Token': self.__session_key,
+                                    'Content-Type': 'application/json'})
+            session.verify = False
+            session.mount('https://', HTTPAdapter(pool_connections=1,
+                                                  pool_maxsize=1))
+            self.__thread_data.session = session
+            with self.__sessions_lock:
+                self.__sessions.append(session)
+        return session
+
+    def get(self, resource_path):
+        r"""
+        Perform a GET request and return a tuple consisting of the resource
+        path, the HTTP status code and the response dictionary.  Connection
+        errors and time-outs are reported with a status of None.
+
+        Description of argument(s):
+        resource_path               URI resource absolute path (e.g.
+                                    "/redfish/v1/Systems/system").
+        """
+
+        with self.__semaphore:
+            try:
+                response = self.get_session().get(self.__base_url
+                                                  + resource_path,
+                                                  timeout=self.__time_out)
+            except requests.exceptions.RequestException as exception:
+                gp.lprint_varx("exception", str(exception))
+                return resource_path, None, {}
+        try:
+            response_dict = response.json()
+        except ValueError:
+            response_dict = {}
+        return resource_path, response.status_code, response_dict
+
+    def close(self):
+        r"""
+        Close all sessions created by this pool.
+        """
+
+        with self.__sessions_lock:
+            for session in self.__sessions:
+                session.close()
+            self.__sessions = []
+
 
 class bmc_redfish_utils(object):
 
@@ -167,26 +303,100 @@ class bmc_redfish_utils(object):
             self.walk_nested_dict(self._rest_response_.dict)
         return list(sorted(self.__pending_enumeration))
 
-    def enumerate_request(self, resource_path, return_json=1):
+    def enumerate_request(self, resource_path, return_json=1,
+                          max_workers=None):
         r"""
         Perform a GET enumerate request and return available resource paths.
 
+        The resource tree is crawled breadth-first.  When max_workers is
+        greater than 1, all of the resources at a given level are fetched
+        concurrently by a bounded pool of worker threads, each of which uses
+        its own keep-alive HTTP session (see redfish_session_pool).  Such
+        requests bypass the redfish object (and therefore its response cache)
+        but are subject to the same status code checking: a status code not
+        in ENUMERATE_VALID_STATUS_CODES or a connection error raises a
+        ValueError.  The resources are fetched one at a time if the
+        concurrent.futures module is not available (i.e. python 2 without the
+        futures backport).
+
+        Callers which do not need the entire result in memory at once should
+        use enumerate_request_iter or enumerate_request_to_file instead.
+
         Description of argument(s):
         resource_path               URI resource absolute path (e.g.
                                     "/redfish/v1/SessionService/Sessions").
         return_json                 Indicates whether the result should be
                                     returned as a json string or as a
                                     dictionary.
+        max_workers                 The maximum number of concurrent requests
+                                    to make to the BMC.  This defaults to the
+                                    REDFISH_MAX_WORKERS environment variable
+                                    or to 1.
         """
 
         gp.qprint_executing(style=gp.func_line_style_short)
 
         return_json = int(return_json)
 
+        result = dict(self.enumerate_request_iter(resource_path,
+                                                  max_workers=max_workers))
+
+        if return_json:
+            return json.dumps(result, sort_keys=True,
+                              indent=4, separators=(',', ': '))
+        else:
+            return result
+
+    def enumerate_request_iter(self, resource_path, max_workers=None):
+        r"""
+        Perform a GET enumerate request and yield a (uri, payload) tuple for
+        each resource as soon as it has been obtained.
+
+        Resources are yielded in the order in which they are discovered and
+        are not retained by this object, so memory use stays flat regardless
+        of the size of the resource tree.  See enumerate_request for details
+        on how the tree is crawled.
+
+        Example use:
+
+        for uri, payload in redfish_utils.enumerate_request_iter(
+                "/redfish/v1"):
+            ...
+
+        Description of argument(s):
+        resource_path               URI resource absolute path (e.g.
+                                    "/redfish/v1/SessionService/Sessions").
+        max_workers                 The maximum number of concurrent requests
+                                    to make to the BMC.  This defaults to the
+                                    REDFISH_MAX_WORKERS environment variable
+                                    or to 1.
+        """
+
+        if max_workers is None:
+            max_workers = REDFISH_MAX_WORKERS
+        max_workers = int(max_workers)
+
+        session_pool = None
+        if max_workers > 1:
+            # concurrent.futures is imported here rather than at module level
+            # because python 2 only has it if the "futures" backport is
+            # installed.  Without it, the serial crawl is done.
+            try:
+                from concurrent import futures
+            except ImportError:
+                futures = None
+            session_key = self._redfish_.get_session_key()
+            if futures is not None and session_key:
+                session_pool = \
+                    redfish_session_pool(self._redfish_.get_base_url(),
+                                         session_key, max_workers)
+                executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+
         # Set quiet variable to keep subordinate get() calls quiet.
         quiet = 1
 
-        # Variable to hold enumerated data.
+        # Variable to hold enumerated data which has not yet been yielded to
+        # the caller.
         self.__result = {}
 
         # Variable to hold the pending list of resources for which enumeration.
@@ -200,32 +410,97 @@ class bmc_redfish_utils(object):
 
         resources_to_be_enumerated = (resource_path,)
 
-        while resources_to_be_enumerated:
-            for resource in resources_to_be_enumerated:
-                # JsonSchemas and SessionService data are not required in enumeration.
+        try:
+            while resources_to_be_enumerated:
+                # JsonSchemas and SessionService data are not required in
+                # enumeration.
                 # Example: '/redfish/v1/JsonSchemas/' and sub resources.
                 #          '/redfish/v1/SessionService'
-                if ('JsonSchemas' in resource) or ('SessionService' in resource):
-                    continue
+                resources = [resource
+                             for resource in resources_to_be_enumerated
+                             if 'JsonSchemas' not in resource
+                             and 'SessionService' not in resource]
+                if session_pool is None:
+                    responses = self.get_responses(resources)
+                else:
+                    # Fetch the entire level concurrently.  The responses are
+                    # walked in this thread since walk_nested_dict updates
+                    # this object's data.
+                    responses = executor.map(session_pool.get, resources)
+
+                for resource, status, response_dict in responses:
+                    if session_pool is not None:
+                        # get_responses has this done by the redfish object.
+                        valid_enumerate_status_code(resource, status)
+                    # Enumeration is done for available resources ignoring
+                    # the ones for which response is not obtained.
+                    if status != 200:
+                        continue
+
+                    self.walk_nested_dict(response_dict, url=resource)
+                    # Hand off the data collected for this resource.
+                    while self.__result:
+                        yield self.__result.popitem()
+
+                enumerated_resources.update(set(resources_to_be_enumerated))
+                resources_to_be_enumerated = \
+                    tuple(self.__pending_enumeration - enumerated_resources)
+        finally:
+            if session_pool is not None:
+                executor.shutdown()
+                session_pool.close()
+            self.__pending_enumeration = set()
+
+    def enumerate_request_to_file(self, resource_path, file_path,
+                                  max_workers=None):
+        r"""
+        Perform a GET enumerate request, write each resource to the given file
+        as it is obtained and return the number of resources written.
 
-                self._rest_response_ = \
-                    self._redfish_.get(resource, valid_status_codes=[200, 404, 500])
-                # Enumeration is done for available resources ignoring the
-                # ones for which response is not obtained.
-                if self._rest_response_.status != 200:
-                    continue
+        The file is written in newline-delimited JSON (NDJSON) format, i.e.
+        each line is a compact JSON object with "uri" and "payload" keys.  Use
+        read_enumeration_file to process such a file one resource at a time.
 
-                self.walk_nested_dict(self._rest_response_.dict, url=resource)
+        Description of argument(s):
+        resource_path               URI resource absolute path (e.g.
+                                    "/redfish/v1").
+        file_path                   The path of the file to be written.
+        max_workers                 The maximum number of concurrent requests
+                                    to make to the BMC (see
+                                    enumerate_request).
+        """
 
-            enumerated_resources.update(set(resources_to_be_enumerated))
-            resources_to_be_enumerated = \
-                tuple(self.__pending_enumeration - enumerated_resources)
+        gp.qprint_executing(style=gp.func_line_style_short)
 
-        if return_json:
-            return json.dumps(self.__result, sort_keys=True,
-                              indent=4, separators=(',', ': '))
-        else:
-            return self.__result
+        num_resources = 0
+        with open(file_path, 'w') as file:
+            for uri, payload in self.enumerate_request_iter(
+                    resource_path, max_workers=max_workers):
+                file.write(json.dumps({'uri': uri, 'payload': payload},
+                                      sort_keys=True,
+                                      separators=(',', ':')) + "\n")
+                num_resources += 1
+
+        return num_resources
+
+    def get_responses(self, resources):
+        r"""
+        Perform a GET request for each resource (one at a time) via the
+        redfish object and yield a tuple consisting of the resource path, the
+        HTTP status code and the response dictionary for each.
+
+        Description of argument(s):
+        resources                   A list of URI resource absolute paths.
+        """
+
+        for resource in resources:
+            self._rest_response_ = self._redfish_.get(
+                resource, valid_status_codes=ENUMERATE_VALID_STATUS_CODES)
+            if self._rest_response_.status != 200:
+                yield resource, self._rest_response_.status, {}
+                continue
+            yield resource, self._rest_response_.status, \
+                self._rest_response_.dict
 
     def walk_nested_dict(self, data, url=''):
         r"""
@@ -271,3 +546,46 @@ class bmc_redfish_utils(object):
 
             if k == key:
                 target_list.append(v)
+
+
+def valid_enumerate_status_code(resource_path,
+                                status):
+    r"""
+    Raise a ValueError if the status of a response obtained by the parallel
+    crawler is not in ENUMERATE_VALID_STATUS_CODES.
+
+    Description of argument(s):
+    resource_path                   The URI resource absolute path which was
+                                    requested.
+    status                          The HTTP status code or None if the
+                                    request failed with a connection error or
+                                    time-out.
+    """
+
+    if status in ENUMERATE_VALID_STATUS_CODES:
+        return
+
+    if status is None:
+        message = "The request failed with a connection error or time-out:\n"
+    else:
+        message = "The HTTP status code was not valid:\n"
+    valid_status_codes = ENUMERATE_VALID_STATUS_CODES
+    message += gp.sprint_vars(resource_path, status, valid_status_codes)
+    raise ValueError(message)
+
+
+def read_enumeration_file(file_path):
+    r"""
+    Read a newline-delimited JSON file written by enumerate_request_to_file
+    and yield a (uri, payload) tuple for each resource in it.
+
+    Description of argument(s):
+    file_path                       The path of the file to be read.
+    """
+
+    with open(file_path, 'r') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield record['uri'], record['payload']
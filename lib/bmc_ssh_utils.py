@@ -2,7 +2,7 @@
 
 r"""
 This module provides many valuable bmc ssh functions such as
-bmc_execute_command.
+bmc_execute_command and bmc_execute_commands.
 """
 
 import gen_valid as gv
@@ -136,6 +136,101 @@ def os_execute_command(cmd_buf,
                                    quiet, test_mode, time_out)
 
 
+def bmc_execute_commands(cmd_bufs,
+                         print_out=0,
+                         print_err=0,
+                         ignore_err=1,
+                         quiet=None,
+                         test_mode=None,
+                         time_out=None,
+                         max_workers=None):
+    r"""
+    Run the given commands concurrently in a BMC SSH session and return a list
+    of (stdout, stderr, rc) tuples in the same order as cmd_bufs.
+
+    This function will obtain the global values for OPENBMC_HOST,
+    OPENBMC_USERNAME, etc.
+
+    Description of arguments:
+    cmd_bufs                        A list of command strings to be run in an
+                                    SSH session.
+    max_workers                     The maximum number of commands to run at
+                                    once.
+
+    See gen_robot_ssh.execute_ssh_commands for a description of the other
+    arguments.
+    """
+
+    # Get global BMC variable values.
+    openbmc_host = BuiltIn().get_variable_value("${OPENBMC_HOST}", default="")
+    openbmc_username = BuiltIn().get_variable_value("${OPENBMC_USERNAME}",
+                                                    default="")
+    openbmc_password = BuiltIn().get_variable_value("${OPENBMC_PASSWORD}",
+                                                    default="")
+
+    if not gv.valid_value(openbmc_host):
+        return [("", "", 1)] * len(cmd_bufs)
+    if not gv.valid_value(openbmc_username):
+        return [("", "", 1)] * len(cmd_bufs)
+    if not gv.valid_value(openbmc_password):
+        return [("", "", 1)] * len(cmd_bufs)
+
+    open_connection_args = {'host': openbmc_host, 'timeout': '25.0'}
+    login_args = {'username': openbmc_username, 'password': openbmc_password}
+
+    return grs.execute_ssh_commands(cmd_bufs, open_connection_args,
+                                    login_args, print_out, print_err,
+                                    ignore_err, quiet, test_mode, time_out,
+                                    max_workers)
+
+
+def os_execute_commands(cmd_bufs,
+                        print_out=0,
+                        print_err=0,
+                        ignore_err=1,
+                        quiet=None,
+                        test_mode=None,
+                        time_out=None,
+                        max_workers=None):
+    r"""
+    Run the given commands concurrently in an OS SSH session and return a list
+    of (stdout, stderr, rc) tuples in the same order as cmd_bufs.
+
+    This function will obtain the global values for OS_HOST, OS_USERNAME, etc.
+
+    Description of arguments:
+    cmd_bufs                        A list of command strings to be run in an
+                                    SSH session.
+    max_workers                     The maximum number of commands to run at
+                                    once.
+
+    See gen_robot_ssh.execute_ssh_commands for a description of the other
+    arguments.
+    """
+
+    # Get global OS variable values.
+    os_host = BuiltIn().get_variable_value("${OS_HOST}", default="")
+    os_username = BuiltIn().get_variable_value("${OS_USERNAME}",
+                                               default="")
+    os_password = BuiltIn().get_variable_value("${OS_PASSWORD}",
+                                               default="")
+
+    if not gv.valid_value(os_host):
+        return [("", "", 1)] * len(cmd_bufs)
+    if not gv.valid_value(os_username):
+        return [("", "", 1)] * len(cmd_bufs)
+    if not gv.valid_value(os_password):
+        return [("", "", 1)] * len(cmd_bufs)
+
+    open_connection_args = {'host': os_host}
+    login_args = {'username': os_username, 'password': os_password}
+
+    return grs.execute_ssh_commands(cmd_bufs, open_connection_args,
+                                    login_args, print_out, print_err,
+                                    ignore_err, quiet, test_mode, time_out,
+                                    max_workers)
+
+
 def xcat_execute_command(cmd_buf,
                          print_out=0,
                          print_err=0,
@@ -247,10 +247,9 @@ class boot_results:
                boot_type,
                boot_status):
         r"""
-        Update our boot_results_table.  This includes:
-        - Updating the record for the given boot_type by incrementing the pass
-          or fail field.
-        - Calling the calc method to have the totals calculated.
+        Update our boot_results_table by incrementing the pass or fail field
+        of the record for the given boot_type.  The tally sheet keeps its
+        totals up to date as it goes.
 
         Description of argument(s):
         boot_type                   The type of boot test just done (e.g.
@@ -261,7 +260,21 @@ class boot_results:
         """
 
         self.__boot_results.inc_row_field(boot_type, boot_status.lower())
-        self.__boot_results.calc()
+
+    def merge(self,
+              other):
+        r"""
+        Add the results from another boot_results object (e.g. one obtained
+        from another BMC) to this one.
+
+        Description of argument(s):
+        other                       The boot_results object whose results are
+                                    to be added.
+        """
+
+        self.__boot_results.merge(other.__boot_results)
+        self.__initial_boot_pass += other.__initial_boot_pass
+        self.__initial_boot_fail += other.__initial_boot_fail
 
     def sprint_report(self,
                       header_footer="\n"):
@@ -325,7 +338,8 @@ class boot_results:
 
 def create_boot_results_file_path(pgm_name,
                                   openbmc_nickname,
-                                  master_pid):
+                                  master_pid,
+                                  file_suffix=":boot_results"):
     r"""
     Create a file path to be used to store a boot_results object.
 
@@ -337,6 +351,7 @@ def create_boot_results_file_path(pgm_name,
                                     will form part of the resulting file name.
     master_pid                      The master process id which will form part
                                     of the file name.
+    file_suffix                     The suffix of the file name.
    """
 
     USER = os.environ.get("USER", "")
@@ -346,19 +361,129 @@ def create_boot_results_file_path(pgm_name,
 
     file_name_dict = vf.create_var_dict(pgm_name, openbmc_nickname, master_pid)
     return vf.create_file_path(file_name_dict, dir_path=dir_path,
-                               file_suffix=":boot_results")
+                               file_suffix=file_suffix)
+
+
+def create_boot_journal_file_path(pgm_name,
+                                  openbmc_nickname,
+                                  master_pid):
+    r"""
+    Create a file path to be used for a boot journal (see
+    append_boot_journal).
+
+    Description of argument(s):
+    See create_boot_results_file_path for a description of all arguments.
+    """
+
+    return create_boot_results_file_path(pgm_name, openbmc_nickname,
+                                         master_pid,
+                                         file_suffix=":boot_journal")
+
+
+def append_boot_journal(file_path,
+                        record):
+    r"""
+    Append a record to the boot journal file.
+
+    The boot journal is a JSON lines file with one record per line.  Each
+    record is a dictionary whose "type" key is one of the following:
+    - "init": Records the initial boot_pass and boot_fail values.
+    - "history": Records a boot_history message (e.g. the message announcing
+      the start of a boot).
+    - "boot": Records a finished boot's boot_type, status, start_time,
+      end_time, ffdc_file_list and phase_times (see boot_latency.py).
+
+    The record is flushed and synced to disk before this function returns so
+    that it survives if the program is killed.  Since records are only ever
+    appended, the cost per boot stays constant however long the run.
+
+    Description of argument(s):
+    file_path                       The path of the boot journal file.
+    record                          The record dictionary.
+    """
+
+    with open(file_path, 'a') as journal_file:
+        journal_file.write(json.dumps(record, sort_keys=True) + "\n")
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+
+
+def read_boot_journal(file_path):
+    r"""
+    Read the boot journal file and return a list of its records (see
+    append_boot_journal).
+
+    A partially written last line (e.g. because the program was killed while
+    writing it) is ignored.
+
+    Description of argument(s):
+    file_path                       The path of the boot journal file.
+    """
+
+    records = []
+    with open(file_path, 'r') as journal_file:
+        for line in journal_file:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def load_boot_journal(file_path,
+                      boot_table,
+                      boot_pass=0,
+                      boot_fail=0,
+                      max_boot_history=10):
+    r"""
+    Rebuild the boot_results and boot_history objects from the boot journal
+    file and return them.
+
+    Description of argument(s):
+    file_path                       The path of the boot journal file.
+    boot_table                      See boot_results class.
+    boot_pass                       The initial boot_pass value to be used if
+                                    the journal has no "init" record.
+    boot_fail                       The initial boot_fail value to be used if
+                                    the journal has no "init" record.
+    max_boot_history                See update_boot_history.
+    """
+
+    records = read_boot_journal(file_path)
+    for record in records:
+        if record.get('type') == 'init':
+            boot_pass = record['boot_pass']
+            boot_fail = record['boot_fail']
+            break
+    results = boot_results(boot_table, boot_pass, boot_fail)
+    history = []
+    boot_types = set(boot_table)
+    for record in records:
+        if record.get('type') == 'history':
+            update_boot_history(history, record['message'], max_boot_history)
+        elif record.get('type') == 'boot':
+            if record['boot_type'] not in boot_types:
+                # The boot table has changed since the journal was written.
+                results.add_row(record['boot_type'])
+                boot_types.add(record['boot_type'])
+            results.update(record['boot_type'], record['status'])
+
+    return results, history
 
 
 def cleanup_boot_results_file():
     r"""
-    Delete all boot results files whose corresponding pids are no longer
-    active.
+    Delete all boot results files (and boot journal files) whose
+    corresponding pids are no longer active.
     """
 
     # Use create_boot_results_file_path to create a globex to find all of the
     # existing boot results files.
-    globex = create_boot_results_file_path("*", "*", "*")
-    file_list = sorted(glob.glob(globex))
+    file_list = []
+    for file_suffix in [":boot_results", ":boot_journal"]:
+        globex = create_boot_results_file_path("*", "*", "*", file_suffix)
+        file_list.extend(glob.glob(globex))
+    file_list = sorted(file_list)
     for file_path in file_list:
         # Use parse_file_path to extract info from the file path.
         file_dict = vf.parse_file_path(file_path)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+
+r"""
+This module provides functions which run obmc_boot_test against a fleet of
+BMCs from one controlling process.
+
+Each BMC's boot test loop is run by robot (via the robot.run API) in a
+worker process forked from the controller.  Since robot and its supporting
+libraries are imported once by the controller before the workers are forked,
+the workers do not each pay robot's start-up cost.  Each task runs in a
+fresh worker process (i.e. maxtasksperchild=1) because obmc_boot_test and its
+subordinate modules keep their state in module globals.
+
+Each BMC is given its own directory beneath the fleet directory, in which its
+FFDC, status (i.e. robot output) and plug-in save directories are created.
+The boot_results from every BMC are then merged into one tally.
+"""
+
+import os
+import multiprocessing
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+# Import robot and the modules which most of our libraries depend on before
+# any workers are forked so that the workers inherit them.
+import robot
+from robot.libraries.BuiltIn import BuiltIn
+import requests
+
+import gen_print as gp
+import gen_misc as gm
+from boot_data import create_boot_results_file_path, \
+    create_boot_journal_file_path, load_boot_journal, create_boot_table
+
+base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) \
+    + os.sep
+
+
+def create_host_list(openbmc_hosts,
+                     os_hosts=""):
+    r"""
+    Create and return a list of host dictionaries from colon-delimited lists
+    of BMC and OS hosts.
+
+    Each BMC host may be specified as "<nickname>=<host>".  Otherwise, the
+    nickname defaults to the host.
+
+    Example:
+
+    host_list = create_host_list("bmc1=9.1.1.1:bmc2=9.1.1.2", "os1:os2")
+
+    host_list:
+      host_list[0]:
+        [openbmc_host]:             9.1.1.1
+        [openbmc_nickname]:         bmc1
+        [os_host]:                  os1
+      host_list[1]:
+        [openbmc_host]:             9.1.1.2
+        [openbmc_nickname]:         bmc2
+        [os_host]:                  os2
+
+    Description of argument(s):
+    openbmc_hosts                   A colon-delimited list of BMC hosts.
+    os_hosts                        A colon-delimited list of OS hosts which
+                                    correspond to the BMC hosts.  This may be
+                                    shorter than openbmc_hosts or blank.
+    """
+
+    openbmc_hosts = list(filter(None, openbmc_hosts.split(":")))
+    os_hosts = os_hosts.split(":")
+    host_list = []
+    for ix, openbmc_host in enumerate(openbmc_hosts):
+        if "=" in openbmc_host:
+            openbmc_nickname, openbmc_host = openbmc_host.split("=", 1)
+        else:
+            openbmc_nickname = openbmc_host
+        os_host = os_hosts[ix] if ix < len(os_hosts) else ""
+        host_list.append({'openbmc_host': openbmc_host,
+                          'openbmc_nickname': openbmc_nickname,
+                          'os_host': os_host})
+    return host_list
+
+
+def run_host_boot_test(host_dict,
+                       fleet_dir_path,
+                       variables=[],
+                       robot_file_path=None):
+    r"""
+    Run obmc_boot_test against one BMC and return a dictionary describing the
+    outcome.  This function is intended to be run in a worker process.
+
+    The returned dictionary contains the following keys:
+    openbmc_nickname                The BMC's nickname.
+    rc                              The robot return code.
+    boot_results                    The BMC's boot_results object (or None if
+                                    none could be obtained).
+    host_dir_path                   The path of the BMC's directory.
+
+    Description of argument(s):
+    host_dict                       A host dictionary (see create_host_list).
+    fleet_dir_path                  The directory beneath which the BMC's own
+                                    directory is to be created.
+    variables                       A list of "<name>:<value>" robot variable
+                                    specifications to be passed to every BMC's
+                                    boot test.
+    robot_file_path                 The path of the robot file to run.  This
+                                    defaults to extended/obmc_boot_test.robot.
+    """
+
+    robot_file_path = gm.dft(robot_file_path,
+                             base_path + "extended/obmc_boot_test.robot")
+    nickname = host_dict['openbmc_nickname']
+    host_dir_path = gm.add_trailing_slash(fleet_dir_path) + nickname + "/"
+    status_dir_path = host_dir_path + "status/"
+    ffdc_dir_path = host_dir_path + "ffdc/"
+    for dir_path in (status_dir_path, ffdc_dir_path):
+        if not os.path.isdir(dir_path):
+            os.makedirs(dir_path)
+
+    # Isolate this BMC's state.  Each of these environment variables is
+    # consulted by obmc_boot_test or by the plug-in utilities.  The worker's
+    # pid serves as the master pid so that this BMC's boot_results and
+    # plug-in save files are distinct from those of every other BMC.
+    master_pid = os.getpid()
+    os.environ['AUTOBOOT_MASTER_PID'] = str(master_pid)
+    os.environ['AUTOBOOT_OPENBMC_NICKNAME'] = nickname
+    os.environ['AUTOBOOT_BASE_TOOL_DIR_PATH'] = host_dir_path
+    os.environ['FFDC_DIR_PATH'] = ffdc_dir_path
+    os.environ['STATUS_DIR_PATH'] = status_dir_path
+
+    host_variables = list(variables) + \
+        [key + ":" + value for key, value in host_dict.items()]
+
+    with open(host_dir_path + "console.txt", 'w') as console_file:
+        rc = robot.run(robot_file_path, variable=host_variables,
+                       outputdir=status_dir_path, loglevel="TRACE",
+                       consolecolors="off", stdout=console_file,
+                       stderr=console_file)
+
+    boot_results = None
+    boot_results_file_path = \
+        create_boot_results_file_path("obmc_boot_test", nickname, master_pid)
+    if os.path.isfile(boot_results_file_path):
+        with open(boot_results_file_path, 'rb') as file:
+            boot_results, boot_history = pickle.load(file)
+        os.remove(boot_results_file_path)
+    boot_journal_file_path = \
+        create_boot_journal_file_path("obmc_boot_test", nickname, master_pid)
+    if os.path.isfile(boot_journal_file_path):
+        if boot_results is None:
+            # The boot test was killed before it could save boot_results so
+            # rebuild them from its boot journal.
+            boot_table = create_boot_table(os_host=host_dict.get('os_host',
+                                                                 ""))
+            boot_results, boot_history = \
+                load_boot_journal(boot_journal_file_path, boot_table)
+        os.remove(boot_journal_file_path)
+
+    return {'openbmc_nickname': nickname, 'rc': rc,
+            'boot_results': boot_results, 'host_dir_path': host_dir_path}
+
+
+def run_fleet_boot_test(host_list,
+                        fleet_dir_path,
+                        variables=[],
+                        max_workers=None,
+                        robot_file_path=None):
+    r"""
+    Run obmc_boot_test against each BMC in host_list concurrently and return
+    a list of result dictionaries (see run_host_boot_test) in host_list order
+    along with the merged boot_results object.
+
+    Description of argument(s):
+    host_list                       A list of host dictionaries (see
+                                    create_host_list).
+    fleet_dir_path                  The directory beneath which each BMC's
+                                    directory is to be created.
+    variables                       A list of "<name>:<value>" robot variable
+                                    specifications to be passed to every BMC's
+                                    boot test.
+    max_workers                     The maximum number of BMCs to test at
+                                    once.  This defaults to the number of
+                                    BMCs.
+    robot_file_path                 See run_host_boot_test.
+    """
+
+    max_workers = int(gm.dft(max_workers, len(host_list)))
+    max_workers = max(1, min(max_workers, len(host_list)))
+
+    # Workers must be forked so that they inherit the modules imported
+    # above.
+    context = multiprocessing.get_context('fork')
+    pool = context.Pool(processes=max_workers, maxtasksperchild=1)
+    try:
+        async_results = [pool.apply_async(run_host_boot_test,
+                                          (host_dict, fleet_dir_path,
+                                           variables, robot_file_path))
+                         for host_dict in host_list]
+        results = []
+        for host_dict, async_result in zip(host_list, async_results):
+            try:
+                result = async_result.get()
+            except Exception as exception:
+                gp.print_error("The boot test for "
+                               + host_dict['openbmc_nickname']
+                               + " failed: " + str(exception) + "\n")
+                result = {'openbmc_nickname': host_dict['openbmc_nickname'],
+                          'rc': 1, 'boot_results': None,
+                          'host_dir_path': ""}
+            gp.qprint_timen("Finished boot test for "
+                            + result['openbmc_nickname'] + " with rc "
+                            + str(result['rc']) + ".")
+            results.append(result)
+    finally:
+        pool.close()
+        pool.join()
+
+    return results, merge_boot_results(results)
+
+
+def merge_boot_results(results):
+    r"""
+    Merge the boot_results objects from the given result dictionaries into one
+    and return it (or None if there are none).
+
+    Description of argument(s):
+    results                         A list of result dictionaries (see
+                                    run_host_boot_test).
+    """
+
+    merged_boot_results = None
+    for result in results:
+        if result['boot_results'] is None:
+            continue
+        if merged_boot_results is None:
+            merged_boot_results = result['boot_results']
+        else:
+            merged_boot_results.merge(result['boot_results'])
+    return merged_boot_results
@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+
+r"""
+Define the latency_histogram and boot_latency classes which track how long
+each phase of a boot test (e.g. a plug-in call point, the boot method, a
+wait_state stage, FFDC) takes, per boot type.
+
+Example code:
+
+boot_latencies = boot_latency()
+boot_latencies.start_boot("REST Power On")
+with boot_latencies.time_phase("pre_boot"):
+    ...
+boot_latencies.record("wait_os_ping", 42.7)
+phase_times = boot_latencies.end_boot()
+boot_latencies.print_report()
+boot_latencies.write_prometheus("/var/lib/node_exporter/obmc_boot.prom")
+
+Example report:
+
+Boot Type                                Phase                Count     P50 ...
+---------------------------------------- -------------------- ----- ------- ...
+REST Power On                            boot                     3  187.21 ...
+REST Power On                            pre_boot                 3    1.02 ...
+"""
+
+import os
+import time
+import bisect
+import contextlib
+import collections
+
+import gen_print as gp
+import gen_misc as gm
+
+# The default histogram bucket upper bounds in seconds.
+default_bucket_bounds = [1, 2, 5, 10, 20, 30, 60, 120, 180, 300, 600, 900,
+                         1200, 1800, 3600]
+
+# The percentiles shown in reports.
+report_percentiles = [50, 95, 99]
+
+
+class latency_histogram:
+
+    r"""
+    This class holds latency samples and reports their percentiles and their
+    distribution across histogram buckets.
+    """
+
+    def __init__(self,
+                 bucket_bounds=None):
+        r"""
+        Initialize the latency histogram.
+
+        Description of argument(s):
+        bucket_bounds               A sorted list of bucket upper bounds in
+                                    seconds.  This defaults to
+                                    default_bucket_bounds.
+        """
+
+        self.bucket_bounds = list(gm.dft(bucket_bounds, default_bucket_bounds))
+        # The last bucket holds samples exceeding every bound (i.e. +Inf).
+        self.bucket_counts = [0] * (len(self.bucket_bounds) + 1)
+        self.samples = []
+        self.sum = 0.0
+
+    def add(self,
+            seconds):
+        r"""
+        Add a latency sample.
+
+        Description of argument(s):
+        seconds                     The latency in seconds.
+        """
+
+        bisect.insort(self.samples, seconds)
+        self.bucket_counts[bisect.bisect_left(self.bucket_bounds,
+                                              seconds)] += 1
+        self.sum += seconds
+
+    def count(self):
+        r"""
+        Return the number of samples.
+        """
+
+        return len(self.samples)
+
+    def percentile(self,
+                   percent):
+        r"""
+        Return the given percentile of the samples (by the nearest-rank
+        method) or None if there are no samples.
+
+        Description of argument(s):
+        percent                     The percentile (e.g. 95).
+        """
+
+        if not self.samples:
+            return None
+        rank = max(1, int(-(-percent * len(self.samples) // 100)))
+        return self.samples[rank - 1]
+
+    def cumulative_bucket_counts(self):
+        r"""
+        Return a list of (upper bound, cumulative count) tuples, the last of
+        which has an upper bound of "+Inf".
+        """
+
+        cumulative_counts = []
+        count = 0
+        for bound, bucket_count in zip(self.bucket_bounds + ["+Inf"],
+                                       self.bucket_counts):
+            count += bucket_count
+            cumulative_counts.append((bound, count))
+        return cumulative_counts
+
+
+class boot_latency:
+
+    r"""
+    This class holds a latency_histogram for each boot type/phase combination.
+    """
+
+    def __init__(self,
+                 bucket_bounds=None,
+                 obj_name='boot_latency'):
+        r"""
+        Initialize the boot latency object.
+
+        Description of argument(s):
+        bucket_bounds               See latency_histogram.
+        obj_name                    The name of this object.
+        """
+
+        self.__obj_name = obj_name
+        self.__bucket_bounds = bucket_bounds
+        self.__histograms = collections.OrderedDict()
+        self.__boot_type = ""
+        self.__phase_times = collections.OrderedDict()
+
+    def start_boot(self,
+                   boot_type):
+        r"""
+        Start tracking the phases of a boot of the given type.  Phases timed or
+        recorded without an explicit boot type will be attributed to it.
+
+        Description of argument(s):
+        boot_type                   The type of boot about to be done (e.g.
+                                    "REST Power On").
+        """
+
+        self.__boot_type = boot_type
+        self.__phase_times = collections.OrderedDict()
+
+    def end_boot(self):
+        r"""
+        Stop tracking the current boot and return a dictionary of the phase
+        names/seconds recorded for it.
+        """
+
+        phase_times = self.__phase_times
+        self.__boot_type = ""
+        self.__phase_times = collections.OrderedDict()
+        return phase_times
+
+    def record(self,
+               phase,
+               seconds,
+               boot_type=None):
+        r"""
+        Record the latency of a phase.
+
+        Description of argument(s):
+        phase                       The name of the phase (e.g. "pre_boot",
+                                    "wait_os_ping").
+        seconds                     The number of seconds the phase took.
+        boot_type                   The boot type.  This defaults to the one
+                                    passed to start_boot.
+        """
+
+        boot_type = gm.dft(boot_type, self.__boot_type)
+        if boot_type == "":
+            return
+        key = (boot_type, phase)
+        if key not in self.__histograms:
+            self.__histograms[key] = latency_histogram(self.__bucket_bounds)
+        self.__histograms[key].add(seconds)
+        if boot_type == self.__boot_type:
+            self.__phase_times[phase] = \
+                self.__phase_times.get(phase, 0.0) + seconds
+
+    def add_phase_times(self,
+                        boot_type,
+                        phase_times):
+        r"""
+        Record the phase times of a past boot (e.g. as returned by end_boot
+        and saved in the boot journal).
+
+        Description of argument(s):
+        boot_type                   The boot type.
+        phase_times                 A dictionary of phase names/seconds.
+        """
+
+        for phase, seconds in phase_times.items():
+            self.record(phase, seconds, boot_type)
+
+    @contextlib.contextmanager
+    def time_phase(self,
+                   phase):
+        r"""
+        Return a context manager which records the time taken by the code
+        within its block as the latency of the given phase.  Nothing is
+        recorded if the block raises an exception.
+
+        Description of argument(s):
+        phase                       The name of the phase.
+        """
+
+        start_time = time.time()
+        yield
+        self.record(phase, time.time() - start_time)
+
+    def sprint_report(self):
+        r"""
+        sprint the latency percentiles for each boot type/phase in a
+        formatted way.
+        """
+
+        buffer = ""
+        num_values = len(report_percentiles) + 1
+        format_string = '{0:<40} {1:<20} {2:>5}' \
+            + ''.join([' {' + str(ix + 3) + ':>7}'
+                       for ix in range(num_values)])
+        dash_format_string = '{0:-<40} {1:-<20} {2:->5}' \
+            + ''.join([' {' + str(ix + 3) + ':->7}'
+                       for ix in range(num_values)])
+        col_names = ["Boot Type", "Phase", "Count"] \
+            + ["P" + str(percent) for percent in report_percentiles] \
+            + ["Max"]
+        buffer += format_string.format(*col_names) + "\n"
+        buffer += dash_format_string.format(*([''] * len(col_names))) + "\n"
+        for (boot_type, phase), histogram in sorted(self.__histograms.items()):
+            values = ["%.2f" % histogram.percentile(percent)
+                      for percent in report_percentiles]
+            values.append("%.2f" % histogram.samples[-1])
+            buffer += format_string.format(boot_type, phase,
+                                           histogram.count(), *values) + "\n"
+
+        return buffer
+
+    def print_report(self,
+                     quiet=None):
+        r"""
+        Print the latency report to the console.
+
+        Description of argument(s):
+        quiet                       Only print if this value is 0.  This
+                                    function will search upward in the stack
+                                    to get the default value.
+        """
+
+        quiet = int(gm.dft(quiet, gp.get_stack_var('quiet', 0)))
+
+        gp.qprint(self.sprint_report())
+
+    def write_csv(self,
+                  file_path):
+        r"""
+        Write the latency statistics for each boot type/phase to a CSV file.
+
+        Description of argument(s):
+        file_path                   The path of the CSV file.
+        """
+
+        lines = [",".join(["boot_type", "phase", "count", "sum"]
+                          + ["p" + str(percent)
+                             for percent in report_percentiles]
+                          + ["max"])]
+        for (boot_type, phase), histogram in sorted(self.__histograms.items()):
+            lines.append(",".join(
+                ['"' + boot_type + '"', phase, str(histogram.count()),
+                 "%.3f" % histogram.sum]
+                + ["%.3f" % histogram.percentile(percent)
+                   for percent in report_percentiles]
+                + ["%.3f" % histogram.samples[-1]]))
+        write_file_atomically(file_path, "\n".join(lines) + "\n")
+
+    def write_prometheus(self,
+                         file_path,
+                         labels={}):
+        r"""
+        Write the latency histograms to a file in the Prometheus text
+        exposition format (e.g. for the node_exporter textfile collector).
+
+        Description of argument(s):
+        file_path                   The path of the file.
+        labels                      A dictionary of extra labels (e.g.
+                                    {'openbmc_nickname': 'bmc1'}) to be
+                                    applied to every sample.
+        """
+
+        metric_name = "obmc_boot_phase_duration_seconds"
+        lines = ["# HELP " + metric_name + " The duration of each phase of"
+                 + " each boot test by boot type.",
+                 "# TYPE " + metric_name + " histogram"]
+        for (boot_type, phase), histogram in sorted(self.__histograms.items()):
+            base_labels = collections.OrderedDict(sorted(labels.items()))
+            base_labels['boot_type'] = boot_type
+            base_labels['phase'] = phase
+            for bound, count in histogram.cumulative_bucket_counts():
+                bucket_labels = collections.OrderedDict(base_labels)
+                bucket_labels['le'] = str(bound)
+                lines.append(metric_name + "_bucket"
+                             + sprint_prometheus_labels(bucket_labels)
+                             + " " + str(count))
+            lines.append(metric_name + "_sum"
+                         + sprint_prometheus_labels(base_labels)
+                         + " " + "%.3f" % histogram.sum)
+            lines.append(metric_name + "_count"
+                         + sprint_prometheus_labels(base_labels)
+                         + " " + str(histogram.count()))
+        write_file_atomically(file_path, "\n".join(lines) + "\n")
+
+    def sprint_obj(self):
+        r"""
+        sprint the fields of this object.  This would normally be for debug
+        purposes only.
+        """
+
+        buffer = ""
+
+        buffer += "class name: " + self.__class__.__name__ + "\n"
+        buffer += gp.sprint_var(self.__obj_name)
+        buffer += gp.sprint_var(self.__boot_type)
+        buffer += gp.sprint_var(self.__phase_times)
+        buffer += self.sprint_report()
+
+        return buffer
+
+    def print_obj(self):
+        r"""
+        Print the fields of this object to stdout.  This would normally be for
+        debug purposes.
+        """
+
+        gp.gp_print(self.sprint_obj())
+
+
+def sprint_prometheus_labels(labels):
+    r"""
+    Return the labels formatted for the Prometheus text exposition format
+    (e.g. '{boot_type="REST Power On",phase="pre_boot"}').
+
+    Description of argument(s):
+    labels                          An ordered dictionary of label names/
+                                    values.
+    """
+
+    return "{" + ",".join([name + '="' + str(value).replace('\\', '\\\\')
+                           .replace('"', '\\"').replace('\n', '\\n') + '"'
+                           for name, value in labels.items()]) + "}"
+
+
+def write_file_atomically(file_path,
+                          buffer):
+    r"""
+    Write the buffer to a temporary file and rename it to the file path so
+    that readers never see a partially written file.
+
+    Description of argument(s):
+    file_path                       The path of the file.
+    buffer                          The string to be written.
+    """
+
+    temp_file_path = file_path + "." + str(os.getpid()) + ".tmp"
+    with open(temp_file_path, 'w') as file:
+        file.write(buffer)
+    os.rename(temp_file_path, file_path)
@@ -75,6 +75,34 @@ class event_notification():
         enable_trace           Enable or disable trace.
         """
 
+        self.open_subscription(dbus_path, enable_trace)
+        event_notifications = self.receive_event()
+        self.close()
+        return event_notifications
+
+    def open_subscription(self, dbus_path, enable_trace=False):
+
+        r"""
+        Subscribe to the given path and leave the websocket open so that the
+        caller can receive a stream of event notifications by calling
+        receive_event.
+
+        Example code:
+        obj = event_notification(host, username, password)
+        obj.open_subscription("/xyz/openbmc_project/state")
+        while True:
+            event = obj.receive_event(time_out=10)
+            ...
+        obj.close()
+
+        Description of argument(s):
+        dbus_path              The subcribing event's path (e.g.
+                               "/xyz/openbmc_project/sensors").  Multiple
+                               paths may be specified as a comma-separated
+                               list.
+        enable_trace           Enable or disable trace.
+        """
+
         session = self.login()
         cookies = session.cookies.get_dict()
         # Convert from dictionary to a string of the following format:
@@ -91,6 +119,36 @@ class event_notification():
         dbus_path = {"paths": dbus_path}
 
         self.__websocket.send(json.dumps(dbus_path))
-        event_notifications = json.loads(self.__websocket.recv())
-        self.__websocket.close()
-        return event_notifications
+
+    def receive_event(self, time_out=None):
+
+        r"""
+        Receive the next event notification from the subscription opened by
+        open_subscription and return it.  Return None if time_out expires
+        before an event notification arrives.
+
+        If the websocket has been closed (e.g. because the BMC is rebooting),
+        a websocket.WebSocketConnectionClosedException is raised.
+
+        Description of argument(s):
+        time_out               The number of seconds to wait for an event
+                               notification.  A value of None means wait
+                               indefinitely.
+        """
+
+        self.__websocket.settimeout(time_out)
+        try:
+            return json.loads(self.__websocket.recv())
+        except websocket.WebSocketTimeoutException:
+            return None
+
+    def close(self):
+
+        r"""
+        Close the websocket opened by open_subscription.
+        """
+
+        try:
+            self.__websocket.close()
+        except AttributeError:
+            pass
@@ -2,17 +2,339 @@
 
 r"""
 Define the func_timer class.
+
+Time-outs are enforced without forking.  A single watchdog thread (started on
+first use) keeps the deadlines of all timed calls in a heap.  When a deadline
+passes, the watchdog interrupts the calling thread:
+
+- The main thread is sent a SIGUSR1 whose handler raises the interrupt.  This
+  also breaks the main thread out of blocking system calls (e.g. a socket
+  read), just as the SIGUSR1 formerly sent by the child timer process did.
+- Any other thread is sent an asynchronous exception which python raises in
+  that thread when it next executes python code.  A thread blocked in C code
+  (e.g. a socket read) will not see it until that code returns, so such
+  callers should also pass a cancel_func (e.g. one which closes the socket).
+
+Either way, the interrupted run call raises the same ValueError as before.
 """
 
 import os
 import sys
-import signal
 import time
+import heapq
+import atexit
+import ctypes
+import signal
+import itertools
+import threading
 import gen_print as gp
-import gen_misc as gm
 import gen_valid as gv
 
 
+class time_out_interrupt(BaseException):
+    r"""
+    The exception used to interrupt a function whose time_out has expired.
+
+    It is derived from BaseException so that it is not caught by functions
+    which catch and handle Exception.  The run method converts it to a
+    ValueError.
+    """
+
+    pass
+
+
+def is_main_thread():
+    r"""
+    Return True if the calling thread is the main thread.
+    """
+
+    if hasattr(threading, 'main_thread'):
+        return threading.current_thread() is threading.main_thread()
+    # python 2 has no threading.main_thread.
+    return threading.current_thread().name == "MainThread"
+
+
+class timed_call:
+    r"""
+    Hold the state of one function call being timed by the watchdog.
+    """
+
+    def __init__(self,
+                 time_out,
+                 cancel_func=None):
+        r"""
+        Initialize the timed call for the calling thread.
+
+        Description of argument(s):
+        time_out                    The number of seconds to allow for the
+                                    call.
+        cancel_func                 A function to be called (from the
+                                    watchdog thread) when the time_out
+                                    expires.  See func_timer_class.run.
+        """
+
+        self.deadline = time.time() + time_out
+        self.cancel_func = cancel_func
+        self.thread_ident = threading.current_thread().ident
+        self.is_main_thread = is_main_thread()
+        self.lock = threading.Lock()
+        # The state is one of "running", "done" or "timed_out".
+        self.state = "running"
+        # Set while a SIGUSR1 sent to the main thread on behalf of this call
+        # is to raise time_out_interrupt.
+        self.interrupt_armed = False
+
+    def expire(self):
+        r"""
+        Interrupt the call if it is still running.  This is called by the
+        watchdog thread.
+        """
+
+        with self.lock:
+            if self.state != "running":
+                return
+            self.state = "timed_out"
+            if self.is_main_thread:
+                self.interrupt_armed = True
+                main_thread_pending_signals.append(self)
+                if hasattr(signal, 'pthread_kill'):
+                    signal.pthread_kill(self.thread_ident, signal.SIGUSR1)
+                else:
+                    # In python 2, signal handlers always run in the main
+                    # thread.
+                    os.kill(os.getpid(), signal.SIGUSR1)
+            else:
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                    ctypes.c_ulong(self.thread_ident),
+                    ctypes.py_object(time_out_interrupt))
+        if self.cancel_func is not None:
+            try:
+                self.cancel_func()
+            except Exception:
+                # The watchdog thread must survive a failing cancel_func and
+                # the interrupt has been sent regardless.
+                pass
+
+    def finish(self):
+        r"""
+        Mark the call as finished so that the watchdog will no longer
+        interrupt it.  This is called by the calling thread and may safely be
+        called more than once.
+        """
+
+        global watchdog_num_done
+
+        with self.lock:
+            if self.state == "running":
+                # watchdog_num_done must agree with the states seen by
+                # add_timed_call.
+                with watchdog_condition:
+                    self.state = "done"
+                    watchdog_num_done += 1
+            elif not self.is_main_thread:
+                # Cancel the asynchronous exception if it has not yet been
+                # raised.
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                    ctypes.c_ulong(self.thread_ident), None)
+            self.interrupt_armed = False
+        if self.is_main_thread and self in main_thread_calls:
+            # Any nested calls left on the stack were interrupted on our
+            # behalf, so they are removed as well.
+            del main_thread_calls[main_thread_calls.index(self):]
+            if not main_thread_calls:
+                restore_time_out_signal_handler()
+
+
+# The heap of (deadline, sequence number, timed_call) tuples watched by the
+# watchdog thread.
+watchdog_deadlines = []
+watchdog_sequence = itertools.count()
+# The number of calls in watchdog_deadlines which have finished in time.
+watchdog_num_done = 0
+watchdog_condition = threading.Condition()
+watchdog_thread = None
+watchdog_pid = None
+# Set at exit to stop the watchdog thread.
+watchdog_stopping = False
+
+# The stack of timed calls being run by the main thread.
+main_thread_calls = []
+# One entry per SIGUSR1 sent to the main thread by the watchdog and not yet
+# handled.  List append and pop are atomic, which a shared counter would not
+# be.
+main_thread_pending_signals = []
+original_SIGUSR1_handler = None
+
+
+def watchdog():
+    r"""
+    Expire timed calls as their deadlines pass.  This is the target of the
+    watchdog thread.
+    """
+
+    global watchdog_num_done
+
+    while True:
+        with watchdog_condition:
+            while True:
+                if watchdog_stopping:
+                    return
+                current_time = time.time()
+                if watchdog_deadlines \
+                   and watchdog_deadlines[0][0] <= current_time:
+                    break
+                wait_time = None
+                if watchdog_deadlines:
+                    wait_time = watchdog_deadlines[0][0] - current_time
+                watchdog_condition.wait(wait_time)
+            call = heapq.heappop(watchdog_deadlines)[2]
+            if call.state == "done":
+                watchdog_num_done -= 1
+        call.expire()
+
+
+def stop_watchdog():
+    r"""
+    Stop the watchdog thread.  In python 2, a daemon thread which is still
+    running at interpreter shutdown can fail noisily.
+    """
+
+    global watchdog_stopping
+
+    with watchdog_condition:
+        watchdog_stopping = True
+        watchdog_condition.notify()
+    if watchdog_thread is not None and watchdog_pid == os.getpid():
+        watchdog_thread.join(1)
+
+
+atexit.register(stop_watchdog)
+
+
+def add_timed_call(call):
+    r"""
+    Add the call to the calls watched by the watchdog thread, starting the
+    thread if necessary.
+
+    Description of argument(s):
+    call                            A timed_call object.
+    """
+
+    global watchdog_deadlines
+    global watchdog_num_done
+    global watchdog_thread
+    global watchdog_pid
+
+    with watchdog_condition:
+        # Threads do not survive a fork so the child needs its own watchdog.
+        if watchdog_pid != os.getpid():
+            del watchdog_deadlines[:]
+            watchdog_num_done = 0
+            watchdog_thread = threading.Thread(target=watchdog,
+                                               name="func_timer_watchdog")
+            watchdog_thread.daemon = True
+            watchdog_thread.start()
+            watchdog_pid = os.getpid()
+        # Calls which finished in time stay in the heap until their deadlines
+        # pass.  When they are the majority, weed them out so that the heap
+        # doesn't grow with the call rate.
+        if watchdog_num_done > 64 \
+           and watchdog_num_done * 2 > len(watchdog_deadlines):
+            watchdog_deadlines = [entry for entry in watchdog_deadlines
+                                  if entry[2].state != "done"]
+            heapq.heapify(watchdog_deadlines)
+            watchdog_num_done = 0
+        heapq.heappush(watchdog_deadlines,
+                       (call.deadline, next(watchdog_sequence), call))
+        if watchdog_deadlines[0][2] is call:
+            watchdog_condition.notify()
+
+
+def reset_watchdog():
+    r"""
+    Reset the watchdog state in a child process.  The watchdog thread does not
+    survive a fork and may have been holding watchdog_condition at the time.
+    """
+
+    global watchdog_deadlines
+    global watchdog_num_done
+    global watchdog_condition
+    global watchdog_thread
+    global watchdog_pid
+
+    watchdog_deadlines = []
+    watchdog_num_done = 0
+    watchdog_condition = threading.Condition()
+    watchdog_thread = None
+    watchdog_pid = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_watchdog)
+
+
+def time_out_signal_handler(signal_number,
+                            frame):
+    r"""
+    Handle a SIGUSR1 sent to the main thread.  If it was sent by the watchdog
+    for a call which is still armed, raise time_out_interrupt.  If it was not
+    sent by the watchdog, pass it on to the original SIGUSR1 handler.
+
+    Description of argument(s):
+    signal_number                   The signal_number of the signal causing
+                                    this function to get invoked.  This
+                                    should always be 10 (SIGUSR1).
+    frame                           The stack frame associated with the
+                                    function that was interrupted.
+    """
+
+    try:
+        main_thread_pending_signals.pop()
+    except IndexError:
+        if callable(original_SIGUSR1_handler):
+            original_SIGUSR1_handler(signal_number, frame)
+        elif original_SIGUSR1_handler == signal.SIG_DFL:
+            # Let the default action (i.e. termination) take place.
+            signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+            os.kill(os.getpid(), signal.SIGUSR1)
+        return
+
+    armed_calls = [call for call in main_thread_calls if call.interrupt_armed]
+    if not armed_calls:
+        # The call finished before the signal arrived.
+        return
+    for call in armed_calls:
+        call.interrupt_armed = False
+    raise time_out_interrupt()
+
+
+def install_time_out_signal_handler():
+    r"""
+    Save the current SIGUSR1 handler and install time_out_signal_handler.
+    """
+
+    global original_SIGUSR1_handler
+
+    original_SIGUSR1_handler = signal.getsignal(signal.SIGUSR1)
+    signal.signal(signal.SIGUSR1, time_out_signal_handler)
+
+
+def restore_time_out_signal_handler():
+    r"""
+    Restore the SIGUSR1 handler saved by install_time_out_signal_handler.
+    """
+
+    # A SIGUSR1 sent by the watchdog just as the call finished may not have
+    # been handled yet.  Give it a chance to arrive so that it is not passed
+    # to the original handler.
+    end_time = time.time() + 1
+    while main_thread_pending_signals and time.time() < end_time:
+        time.sleep(0.001)
+    del main_thread_pending_signals[:]
+    if original_SIGUSR1_handler is not None:
+        signal.signal(signal.SIGUSR1, original_SIGUSR1_handler)
+
+
 class func_timer_class:
     r"""
     Define the func timer class.
@@ -22,6 +344,8 @@ class func_timer_class:
     function fails to complete before the timer expires, a ValueError
     exception will be raised along with a detailed error message.
 
+    A func timer object may be used by any number of threads at once.
+
     Example code:
 
     func_timer = func_timer_class()
@@ -37,15 +361,9 @@ class func_timer_class:
 
         # Initialize object variables.
         self.__obj_name = obj_name
+        # The func and time_out of the most recent call (for sprint_obj).
         self.__func = None
         self.__time_out = None
-        self.__child_pid = 0
-        # Save the original SIGUSR1 handler for later restoration by this
-        # class' methods.
-        self.__original_SIGUSR1_handler = signal.getsignal(signal.SIGUSR1)
-
-    def __del__(self):
-        self.cleanup()
 
     def sprint_obj(self):
         r"""
@@ -62,10 +380,10 @@ class func_timer_class:
             func_name = ""
         buffer += gp.sprint_var(func_name, indent=indent)
         buffer += gp.sprint_varx("time_out", self.__time_out, indent=indent)
-        buffer += gp.sprint_varx("child_pid", self.__child_pid, indent=indent)
+        buffer += gp.sprint_varx("num_watched_calls",
+                                 len(watchdog_deadlines), indent=indent)
         buffer += gp.sprint_varx("original_SIGUSR1_handler",
-                                 self.__original_SIGUSR1_handler,
-                                 indent=indent)
+                                 original_SIGUSR1_handler, indent=indent)
         return buffer
 
     def print_obj(self):
@@ -76,76 +394,6 @@ class func_timer_class:
 
         sys.stdout.write(self.sprint_obj())
 
-    def cleanup(self):
-        r"""
-        Cleanup after the run method.
-        """
-
-        try:
-            gp.lprint_executing()
-            gp.lprint_var(self.__child_pid)
-        except (AttributeError, KeyError, TypeError):
-            # NOTE: In python 3, this code fails with "KeyError:
-            # ('__main__',)" when calling functions like lprint_executing that
-            # use inspect.stack() during object destruction.  No fixes found
-            # so tolerating the error.  In python 2.x, it may fail with
-            # TypeError.  This seems to happen when cleaning up after an
-            # exception was raised.
-            pass
-
-        # If self.__child_pid is 0, then we are either running as the child
-        # or we've already cleaned up.
-        # If self.__time_out is None, then no child process would have been
-        # spawned.
-        if self.__child_pid == 0 or self.__time_out is None:
-            return
-
-        # Restore the original SIGUSR1 handler.
-        if self.__original_SIGUSR1_handler != 0:
-            signal.signal(signal.SIGUSR1, self.__original_SIGUSR1_handler)
-        try:
-            gp.lprint_timen("Killing child pid " + str(self.__child_pid)
-                            + ".")
-            os.kill(self.__child_pid, signal.SIGKILL)
-        except OSError:
-            gp.lprint_timen("Tolerated kill failure.")
-        try:
-            gp.lprint_timen("os.waitpid(" + str(self.__child_pid) + ")")
-            os.waitpid(self.__child_pid, 0)
-        except OSError:
-            gp.lprint_timen("Tolerated waitpid failure.")
-        self.__child_pid = 0
-        # For debug purposes, prove that the child pid was killed.
-        children = gm.get_child_pids()
-        gp.lprint_var(children)
-
-    def timed_out(self,
-                  signal_number,
-                  frame):
-        r"""
-        Handle a SIGUSR1 generated by the child process after the time_out has
-        expired.
-
-        signal_number               The signal_number of the signal causing
-                                    this method to get invoked.  This should
-                                    always be 10 (SIGUSR1).
-        frame                       The stack frame associated with the
-                                    function that times out.
-        """
-
-        gp.lprint_executing()
-
-        self.cleanup()
-
-        # Compose an error message.
-        err_msg = "The " + self.__func.__name__
-        err_msg += " function timed out after " + str(self.__time_out)
-        err_msg += " seconds.\n"
-        if not gp.robot_env:
-            err_msg += gp.sprint_call_stack()
-
-        raise ValueError(err_msg)
-
     def run(self, func, *args, **kwargs):
 
         r"""
@@ -153,12 +401,15 @@ class func_timer_class:
         the value that the function returns.  If the time_out value expires,
         raise a ValueError exception with a detailed error message.
 
-        This method passes all of the args and kwargs directly to the child
-        function with the following important exception: If kwargs contains a
-        'time_out' value, it will be used to set the func timer object's
+        This method passes all of the args and kwargs directly to the
+        function with the following important exceptions: If kwargs contains
+        a 'time_out' value, it will be used to set the func timer object's
         time_out value and then the kwargs['time_out'] entry will be removed.
         If the time-out expires before the function finishes running, this
-        method will raise a ValueError.
+        method will raise a ValueError.  Likewise, a 'cancel_func' value is
+        removed from kwargs and is called (with no arguments, from the
+        watchdog thread) when the time-out expires.  It is intended to unblock
+        the function (e.g. by closing the socket it is reading).
 
         Example:
         func_timer = func_timer_class()
@@ -177,74 +428,68 @@ class func_timer_class:
                                     the function object.
         kwargs                      The keyword arguments which are to be
                                     passed to the function object.  As noted
-                                    above, kwargs['time_out'] will get special
+                                    above, kwargs['time_out'] and
+                                    kwargs['cancel_func'] will get special
                                     treatment.
         """
 
-        gp.lprint_executing()
+        # Get the time_out value from kwargs.  If kwargs['time_out'] is not
+        # present, time_out will default to None.
+        time_out = kwargs.pop('time_out', None)
+        cancel_func = kwargs.pop('cancel_func', None)
+        # Convert "none" string to None.
+        try:
+            if time_out.lower() == "none":
+                time_out = None
+        except AttributeError:
+            pass
+        if time_out is not None:
+            time_out = int(time_out)
+            # Ensure that time_out is non-negative.  valid_range is only
+            # called to compose the error message since it is costly.
+            if time_out < 0:
+                message = gv.valid_range(time_out, 0, var_name="time_out")
+                raise ValueError("\n"
+                                 + gp.sprint_error_report(message,
+                                                          format='long'))
 
         # Store method parms as object parms.
         self.__func = func
+        self.__time_out = time_out
+
+        if time_out is None:
+            return func(*args, **kwargs)
+
+        call = timed_call(time_out, cancel_func)
+        if call.is_main_thread:
+            if not main_thread_calls:
+                install_time_out_signal_handler()
+            main_thread_calls.append(call)
+        add_timed_call(call)
 
-        # Get self.__time_out value from kwargs.  If kwargs['time_out'] is
-        # not present, self.__time_out will default to None.
-        self.__time_out = None
-        if 'time_out' in kwargs:
-            self.__time_out = kwargs['time_out']
-            del kwargs['time_out']
-            # Convert "none" string to None.
-            try:
-                if self.__time_out.lower() == "none":
-                    self.__time_out = None
-            except AttributeError:
-                pass
-            if self.__time_out is not None:
-                self.__time_out = int(self.__time_out)
-                # Ensure that time_out is non-negative.
-                message = gv.valid_range(self.__time_out, 0,
-                                         var_name="time_out")
-                if message != "":
-                    raise ValueError("\n"
-                                     + gp.sprint_error_report(message,
-                                                              format='long'))
-
-        gp.lprint_varx("time_out", self.__time_out)
-        self.__child_pid = 0
-        if self.__time_out is not None:
-            # Save the original SIGUSR1 handler for later restoration by this
-            # class' methods.
-            self.__original_SIGUSR1_handler = signal.getsignal(signal.SIGUSR1)
-            # Designate a SIGUSR1 handling function.
-            signal.signal(signal.SIGUSR1, self.timed_out)
-            parent_pid = os.getpid()
-            self.__child_pid = os.fork()
-            if self.__child_pid == 0:
-                gp.dprint_timen("Child timer pid " + str(os.getpid())
-                                + ": Sleeping for " + str(self.__time_out)
-                                + " seconds.")
-                time.sleep(self.__time_out)
-                gp.dprint_timen("Child timer pid " + str(os.getpid())
-                                + ": Sending SIGUSR1 to parent pid "
-                                + str(parent_pid) + ".")
-                os.kill(parent_pid, signal.SIGUSR1)
-                os._exit(0)
-
-        # Call the user's function with the user's arguments.
-        children = gm.get_child_pids()
-        gp.lprint_var(children)
-        gp.lprint_timen("Calling the user's function.")
-        gp.lprint_varx("func_name", func.__name__)
-        gp.lprint_vars(args, kwargs)
         try:
-            result = func(*args, **kwargs)
-        except Exception as func_exception:
-            # We must handle all exceptions so that we have the chance to
-            # cleanup before re-raising the exception.
-            gp.lprint_timen("Encountered exception in user's function.")
-            self.cleanup()
-            raise(func_exception)
-        gp.lprint_timen("Returned from the user's function.")
-
-        self.cleanup()
-
-        return result
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                call.finish()
+        except BaseException:
+            # The interrupt may have cut the first finish short.
+            call.finish()
+            # Exceptions raised after our time-out expired (e.g. by a function
+            # whose socket was closed by cancel_func) are reported as a
+            # time-out.  A time_out_interrupt meant for an outer call on this
+            # thread is passed on.
+            if call.state != "timed_out":
+                raise
+
+        if call.state != "timed_out":
+            return result
+
+        # Compose an error message.
+        err_msg = "The " + func.__name__
+        err_msg += " function timed out after " + str(time_out)
+        err_msg += " seconds.\n"
+        if not gp.robot_env:
+            err_msg += gp.sprint_call_stack()
+
+        raise ValueError(err_msg)
@@ -11,6 +11,13 @@ import subprocess
 import re
 import time
 import imp
+import gzip
+import shutil
+import functools
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 import gen_print as gp
 import gen_valid as gv
@@ -291,14 +298,159 @@ gcr_last_robot_cmd_buf = ""
 gcr_last_robot_rc = 0
 
 
+# The file name extensions for the supported compression types.
+compression_extensions = {'gzip': ".gz", 'zstd': ".zst"}
+
+
+def compress_file(source_file_path,
+                  target_file_path,
+                  compression="gzip",
+                  level=6):
+    r"""
+    Compress the source file, streaming the compressed data to the target file
+    path, remove the source file and return a dictionary of statistics (i.e.
+    original_size, compressed_size, elapsed_time).
+
+    If compression fails, the partially written target file is removed, the
+    source file is left in place and the exception is re-raised.
+
+    Description of argument(s):
+    source_file_path                The path of the file to be compressed.
+    target_file_path                The path of the compressed file to be
+                                    written.
+    compression                     The type of compression ("gzip" or
+                                    "zstd").
+    level                           The compression level.
+    """
+
+    start_time = time.time()
+    try:
+        with open(source_file_path, 'rb') as source_file:
+            if compression == "zstd":
+                compressor = zstandard.ZstdCompressor(level=level)
+                with open(target_file_path, 'wb') as target_file:
+                    compressor.copy_stream(source_file, target_file)
+            else:
+                with gzip.open(target_file_path, 'wb',
+                               compresslevel=level) as target_file:
+                    shutil.copyfileobj(source_file, target_file, 1024 * 1024)
+    except BaseException:
+        if os.path.exists(target_file_path):
+            os.remove(target_file_path)
+        raise
+    shutil.copystat(source_file_path, target_file_path)
+    original_size = os.path.getsize(source_file_path)
+    os.remove(source_file_path)
+
+    return {'original_size': original_size,
+            'compressed_size': os.path.getsize(target_file_path),
+            'elapsed_time': time.time() - start_time}
+
+
+def compress_files(source_file_paths,
+                   target_dir_path,
+                   compression="gzip",
+                   level=6,
+                   max_workers=None):
+    r"""
+    Compress the source files in parallel, writing the compressed files to the
+    target directory, print a report of each file's compression ratio and
+    time and return a list of the target file paths.
+
+    Description of argument(s):
+    source_file_paths               A list of the paths of the files to be
+                                    compressed.
+    target_dir_path                 The directory to which the compressed
+                                    files are to be written.
+    compression                     The type of compression ("gzip" or
+                                    "zstd").  If "zstd" is requested but the
+                                    zstandard python module is not installed
+                                    or if any other value is specified, gzip
+                                    is used instead.
+    level                           The compression level.
+    max_workers                     The maximum number of files to be
+                                    compressed at once.  This defaults to the
+                                    number of source files.
+    """
+
+    if compression == "zstd" and zstandard is None:
+        gp.qprint_timen("The zstandard python module is not installed."
+                        + "  Using gzip compression instead.")
+        compression = "gzip"
+        level = min(level, 9)
+    if not gv.valid_value(compression,
+                          valid_values=list(compression_extensions)):
+        gp.qprint_timen("Using gzip compression instead.")
+        compression = "gzip"
+        level = min(level, 9)
+
+    target_dir_path = gm.add_trailing_slash(target_dir_path)
+    if not os.path.isdir(target_dir_path):
+        os.makedirs(target_dir_path)
+    target_file_paths = [target_dir_path + os.path.basename(file_path)
+                         + compression_extensions[compression]
+                         for file_path in source_file_paths]
+
+    # zlib and zstandard release the GIL while compressing so threads give
+    # real parallelism here.  concurrent.futures is imported here rather than
+    # at module level because python 2 only has it if the "futures" backport
+    # is installed.  Without it, the files are compressed one at a time.
+    max_workers = int(gm.dft(max_workers, len(source_file_paths)))
+    try:
+        from concurrent import futures
+    except ImportError:
+        futures = None
+    if futures is not None and max_workers > 1:
+        with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_list = \
+                [executor.submit(compress_file, source_file_path,
+                                 target_file_path, compression, level)
+                 for source_file_path, target_file_path
+                 in zip(source_file_paths, target_file_paths)]
+        get_stats_funcs = [future.result for future in future_list]
+    else:
+        get_stats_funcs = \
+            [functools.partial(compress_file, source_file_path,
+                               target_file_path, compression, level)
+             for source_file_path, target_file_path
+             in zip(source_file_paths, target_file_paths)]
+
+    compressed_file_paths = []
+    for source_file_path, target_file_path, get_stats in \
+            zip(source_file_paths, target_file_paths, get_stats_funcs):
+        try:
+            stats = get_stats()
+        except Exception as exception:
+            gp.print_error("Failed to compress " + source_file_path + ": "
+                           + str(exception) + "\n")
+            continue
+        ratio = float(stats['original_size']) \
+            / max(1, stats['compressed_size'])
+        gp.qprint_timen("Compressed " + source_file_path + " to "
+                        + target_file_path + ": "
+                        + str(stats['original_size']) + " -> "
+                        + str(stats['compressed_size']) + " bytes, ratio "
+                        + "%.2f" % ratio + ", "
+                        + "%.2f" % stats['elapsed_time'] + " seconds.")
+        compressed_file_paths.append(target_file_path)
+
+    return compressed_file_paths
+
+
 def process_robot_output_files(robot_cmd_buf=None,
                                robot_rc=None,
-                               gzip=None):
+                               gzip=None,
+                               compression=None,
+                               level=None,
+                               max_workers=None):
     r"""
     Process robot output files which can involve several operations:
     - If the files are in a temporary location, using SAVE_STATUS_POLICY to
       decide whether to move them to a permanent location or to delete them.
-    - Gzipping them.
+    - Compressing them.
+
+    The files are compressed in parallel and the compressed data is written
+    directly to the permanent location (if any).
 
     Description of argument(s):
     robot_cmd_buf                   The complete command string used to invoke
@@ -306,12 +458,35 @@ def process_robot_output_files(robot_cmd_buf=None,
     robot_rc                        The return code from running the robot
                                     command string.
     gzip                            Indicates whether robot-generated output
-                                    should be gzipped.
+                                    should be compressed.
+    compression                     The type of compression ("gzip" or
+                                    "zstd").  This defaults to the value of
+                                    environment variable
+                                    ROBOT_OUTPUT_COMPRESSION or "gzip".
+    level                           The compression level.  This defaults to
+                                    the value of environment variable
+                                    ROBOT_OUTPUT_COMPRESSION_LEVEL or to 6 for
+                                    gzip and 3 for zstd.
+    max_workers                     The maximum number of files to be
+                                    compressed at once.  This defaults to the
+                                    value of environment variable
+                                    ROBOT_OUTPUT_COMPRESSION_WORKERS or to the
+                                    number of files.
     """
 
     robot_cmd_buf = gm.dft(robot_cmd_buf, gcr_last_robot_cmd_buf)
     robot_rc = gm.dft(robot_rc, gcr_last_robot_rc)
     gzip = gm.dft(gzip, int(os.environ.get("GZIP_ROBOT", "1")))
+    compression = gm.dft(compression,
+                         os.environ.get("ROBOT_OUTPUT_COMPRESSION", "gzip"))
+    level = int(gm.dft(level,
+                       os.environ.get("ROBOT_OUTPUT_COMPRESSION_LEVEL",
+                                      3 if compression == "zstd" else 6)))
+    max_workers = gm.dft(max_workers,
+                         os.environ.get("ROBOT_OUTPUT_COMPRESSION_WORKERS",
+                                        None))
+    if max_workers is not None:
+        max_workers = int(max_workers)
 
     if robot_cmd_buf == "":
         # This can legitimately occur if this function is called from an
@@ -330,16 +505,14 @@ def process_robot_output_files(robot_cmd_buf=None,
     robot_cmd_buf_dict = gc.parse_command_string(robot_cmd_buf)
     outputdir = robot_cmd_buf_dict['outputdir']
     outputdir = gm.add_trailing_slash(outputdir)
-    file_list = outputdir + robot_cmd_buf_dict['output'] + " " + outputdir\
-        + robot_cmd_buf_dict['log'] + " " + outputdir\
-        + robot_cmd_buf_dict['report']
+    file_list = [outputdir + robot_cmd_buf_dict[parm_name]
+                 for parm_name in ['output', 'log', 'report']]
 
     # Double checking that files are present.
-    shell_rc, out_buf = gc.shell_cmd("ls -1 " + file_list + " 2>/dev/null",
-                                     show_err=0)
-    file_list = re.sub("\n", " ", out_buf.rstrip("\n"))
+    file_list = [file_path for file_path in file_list
+                 if os.path.isfile(file_path)]
 
-    if file_list == "":
+    if not file_list:
         gp.qprint_timen("No robot output files were found in " + outputdir
                         + ".")
         return
@@ -347,19 +520,17 @@ def process_robot_output_files(robot_cmd_buf=None,
     if SAVE_STATUS_POLICY == "FAIL" and robot_rc == 0:
         gp.qprint_timen("The call to robot produced no failures."
                         + "  Deleting robot output files.")
-        gc.shell_cmd("rm -rf " + file_list)
+        for file_path in file_list:
+            os.remove(file_path)
         return
 
-    if gzip:
-        gc.shell_cmd("gzip -f " + file_list)
-        # Update the values in file_list.
-        file_list = re.sub(" ", ".gz ", file_list) + ".gz"
-
     # It TMP_ROBOT_DIR_PATH is set, it means the caller wanted the robot
     # output initially directed to TMP_ROBOT_DIR_PATH but later moved to
-    # FFDC_DIR_PATH.  Otherwise, we're done.
-
-    if os.environ.get("TMP_ROBOT_DIR_PATH", "") is "":
+    # FFDC_DIR_PATH.  Otherwise, the files stay where they are.
+    if os.environ.get("TMP_ROBOT_DIR_PATH", "") == "":
+        if gzip:
+            compress_files(file_list, outputdir, compression, level,
+                           max_workers)
         return
 
     # We're directing these to the FFDC dir path so that they'll be subjected
@@ -369,11 +540,18 @@ def process_robot_output_files(robot_cmd_buf=None,
                                      + "/ffdc")
     target_dir_path = gm.add_trailing_slash(target_dir_path)
 
-    targ_file_list = [re.sub(".*/", target_dir_path, x)
-                      for x in file_list.split(" ")]
-
-    gc.shell_cmd("mv " + file_list + " " + target_dir_path + " >/dev/null",
-                 time_out=600)
+    if not os.path.isdir(target_dir_path):
+        os.makedirs(target_dir_path)
+    targ_file_list = []
+    if gzip:
+        targ_file_list = compress_files(file_list, target_dir_path,
+                                        compression, level, max_workers)
+    # Move any files which were not compressed (e.g. because compression
+    # failed).
+    for file_path in [x for x in file_list if os.path.exists(x)]:
+        targ_file_path = re.sub(".*/", target_dir_path, file_path)
+        shutil.move(file_path, targ_file_path)
+        targ_file_list.append(targ_file_path)
 
     gp.qprint_timen("New robot log file locations:")
     gp.qprintn('\n'.join(targ_file_list))
@@ -475,6 +653,7 @@ def robot_cmd_fnc(robot_cmd_buf,
         stdout = DEVNULL
     else:
         stdout = None
+    gp.flush_print_sink()
     sub_proc = subprocess.Popen(robot_cmd_buf, stdout=stdout, shell=True)
     sub_proc.communicate()
     shell_rc = sub_proc.returncode
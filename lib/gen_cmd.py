@@ -10,8 +10,10 @@ import subprocess
 import collections
 import signal
 import time
+import threading
 import re
 import inspect
+import codecs
 
 import gen_print as gp
 import gen_valid as gv
@@ -282,6 +284,89 @@ def shell_cmd_timed_out(signal_number,
     return
 
 
+def stream_sub_proc_lines(sub_proc,
+                          time_out=None):
+    r"""
+    Read the stdout and stderr of the given subprocess and yield each line as
+    it arrives in the form of a (stream_name, line) tuple, where stream_name
+    is either "stdout" or "stderr".  When the subprocess has closed its
+    output streams, wait for it to finish and return.
+
+    The subprocess must have been created with bytes (rather than text) output
+    pipes.  The output is decoded as utf-8.
+
+    Time-outs are enforced without signals.  If the subprocess has not
+    finished within time_out seconds, its process group is killed.  When the
+    generator is exhausted, sub_proc.timed_out indicates whether this
+    happened.
+
+    Description of argument(s):
+    sub_proc                        A Popen object created with
+                                    stdout=subprocess.PIPE and, optionally,
+                                    stderr=subprocess.PIPE.  If the process
+                                    was not started with preexec_fn=os.setsid,
+                                    killing its process group would kill our
+                                    own, so the process alone is killed.
+    time_out                        A time-out value expressed in seconds.  A
+                                    value of None means no limit.
+    """
+
+    # selectors is imported here rather than at module level because it is not
+    # available in python 2, where the rest of this module must still work.
+    import selectors
+
+    sub_proc.timed_out = False
+    end_time = None if not time_out else time.time() + float(time_out)
+    selector = selectors.DefaultSelector()
+    pending = {}
+    for stream_name, file in (('stdout', sub_proc.stdout),
+                              ('stderr', sub_proc.stderr)):
+        if file is not None:
+            selector.register(file, selectors.EVENT_READ, stream_name)
+            pending[stream_name] = \
+                [codecs.getincrementaldecoder('utf-8')('replace'), ""]
+
+    try:
+        while selector.get_map():
+            if end_time is None:
+                events = selector.select()
+            else:
+                remaining_time = end_time - time.time()
+                events = selector.select(max(remaining_time, 0))
+                if not events and remaining_time <= 0:
+                    sub_proc.timed_out = True
+                    try:
+                        if os.getpgid(sub_proc.pid) == sub_proc.pid:
+                            os.killpg(sub_proc.pid, signal.SIGKILL)
+                        else:
+                            sub_proc.kill()
+                    except OSError:
+                        # The process has already ended.
+                        pass
+                    break
+            for key, mask in events:
+                stream_name = key.data
+                decoder, partial_line = pending[stream_name]
+                data = os.read(key.fileobj.fileno(), 65536)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    partial_line += decoder.decode(b"", final=True)
+                    if partial_line:
+                        yield stream_name, partial_line
+                    pending[stream_name][1] = ""
+                    continue
+                lines = (partial_line + decoder.decode(data)).split("\n")
+                pending[stream_name][1] = lines.pop()
+                for line in lines:
+                    yield stream_name, line + "\n"
+    finally:
+        selector.close()
+        for file in (sub_proc.stdout, sub_proc.stderr):
+            if file is not None:
+                file.close()
+        sub_proc.wait()
+
+
 def shell_cmd(command_string,
               quiet=None,
               print_output=None,
@@ -293,7 +378,10 @@ def shell_cmd(command_string,
               valid_rcs=[0],
               ignore_err=None,
               return_stderr=0,
-              fork=0):
+              fork=0,
+              stream_output=0,
+              line_callback=None,
+              tail_lines=100):
     r"""
     Run the given command string in a shell and return a tuple consisting of
     the shell return code and the output.
@@ -363,6 +451,27 @@ def shell_cmd(command_string,
                                     created by the subprocess.popen()
                                     function.  See the kill_cmd function for
                                     details on how to process the popen object.
+    stream_output                   Process the output of the command string
+                                    line by line as it arrives rather than
+                                    all at once when the command string has
+                                    finished.  If print_output is set, each
+                                    line is printed as it arrives (including
+                                    lines from attempts which ultimately
+                                    fail).  Only the last tail_lines lines of
+                                    output are kept, so the stdout and stderr
+                                    values returned by this function consist
+                                    of at most tail_lines lines each.  This is
+                                    useful for long-running commands which
+                                    produce a great deal of output.  This
+                                    requires python 3.
+    line_callback                   A function to be called with each line of
+                                    output (including the line feed) as it
+                                    arrives (e.g. line_callback(line)).
+                                    Specifying a line_callback implies
+                                    stream_output=1.
+    tail_lines                      The number of lines of stdout and of
+                                    stderr to be kept when stream_output is
+                                    set.
     """
 
     err_msg = gv.valid_value(command_string)
@@ -394,39 +503,71 @@ def shell_cmd(command_string,
     global command_timed_out
     command_timed_out = False
     func_out_history_buf = ""
+    stream_output = int(stream_output) or line_callback is not None
     for attempt_num in range(1, max_attempts + 1):
-        sub_proc = subprocess.Popen(command_string,
-                                    preexec_fn=os.setsid,
-                                    bufsize=1,
-                                    shell=True,
-                                    universal_newlines=True,
-                                    executable='/bin/bash',
-                                    stdout=subprocess.PIPE,
-                                    stderr=stderr)
-        if fork:
-            return sub_proc
-
-        if time_out:
-            command_timed_out = False
-            # Designate a SIGALRM handling function and set alarm.
-            signal.signal(signal.SIGALRM, shell_cmd_timed_out)
-            signal.alarm(time_out)
-        try:
-            stdout_buf, stderr_buf = sub_proc.communicate()
-        except IOError:
-            command_timed_out = True
-        # Restore the original SIGALRM handler and clear the alarm.
-        signal.signal(signal.SIGALRM, original_sigalrm_handler)
-        signal.alarm(0)
-
-        # Output from this loop iteration is written to func_out_buf for
-        # later processing.  This can include stdout, stderr and our own error
-        # messages.
-        func_out_buf = ""
-        if print_output:
-            if return_stderr:
-                func_out_buf += stderr_buf
-            func_out_buf += stdout_buf
+        if stream_output:
+            # Read the output as bytes so that it can be processed as soon as
+            # it arrives (see stream_sub_proc_lines).
+            sub_proc = subprocess.Popen(command_string,
+                                        preexec_fn=os.setsid,
+                                        bufsize=0,
+                                        shell=True,
+                                        executable='/bin/bash',
+                                        stdout=subprocess.PIPE,
+                                        stderr=stderr)
+            if fork:
+                return sub_proc
+
+            stdout_tail = collections.deque(maxlen=tail_lines)
+            stderr_tail = collections.deque(maxlen=tail_lines)
+            for stream_name, line in stream_sub_proc_lines(sub_proc,
+                                                           time_out):
+                if stream_name == 'stdout':
+                    stdout_tail.append(line)
+                else:
+                    stderr_tail.append(line)
+                if print_output:
+                    gp.gp_print(line)
+                if line_callback is not None:
+                    line_callback(line)
+            command_timed_out = sub_proc.timed_out
+            stdout_buf = "".join(stdout_tail)
+            stderr_buf = "".join(stderr_tail)
+            # The output has already been printed.
+            func_out_buf = ""
+        else:
+            sub_proc = subprocess.Popen(command_string,
+                                        preexec_fn=os.setsid,
+                                        bufsize=1,
+                                        shell=True,
+                                        universal_newlines=True,
+                                        executable='/bin/bash',
+                                        stdout=subprocess.PIPE,
+                                        stderr=stderr)
+            if fork:
+                return sub_proc
+
+            if time_out:
+                command_timed_out = False
+                # Designate a SIGALRM handling function and set alarm.
+                signal.signal(signal.SIGALRM, shell_cmd_timed_out)
+                signal.alarm(time_out)
+            try:
+                stdout_buf, stderr_buf = sub_proc.communicate()
+            except IOError:
+                command_timed_out = True
+            # Restore the original SIGALRM handler and clear the alarm.
+            signal.signal(signal.SIGALRM, original_sigalrm_handler)
+            signal.alarm(0)
+
+            # Output from this loop iteration is written to func_out_buf for
+            # later processing.  This can include stdout, stderr and our own
+            # error messages.
+            func_out_buf = ""
+            if print_output:
+                if return_stderr:
+                    func_out_buf += stderr_buf
+                func_out_buf += stdout_buf
         shell_rc = sub_proc.returncode
         if shell_rc in valid_rcs:
             break
@@ -471,6 +612,258 @@ def shell_cmd(command_string,
         else (shell_rc, stdout_buf)
 
 
+def shell_cmd_attempt(command_string,
+                      time_out=None,
+                      return_stderr=0):
+    r"""
+    Run the given command string in a shell once and return a tuple
+    consisting of the shell return code, the stdout, the stderr, a
+    command_timed_out indicator and the child pid.
+
+    Unlike shell_cmd, this function does not use signals to enforce time_out
+    so it may safely be called from a worker thread.  If the command string
+    has not finished executing within time_out seconds, its process group is
+    killed.
+
+    Description of argument(s):
+    command_string                  The command string to be run in a shell
+                                    (e.g. "ls /tmp").
+    time_out                        A time-out value expressed in seconds.  A
+                                    value of None means no limit.
+    return_stderr                   If return_stderr is set, the stdout and
+                                    stderr streams are processed separately.
+                                    Otherwise, stderr is merged into stdout
+                                    and the stderr returned is "".
+    """
+
+    stderr = subprocess.PIPE if return_stderr else subprocess.STDOUT
+    sub_proc = subprocess.Popen(command_string,
+                                preexec_fn=os.setsid,
+                                shell=True,
+                                universal_newlines=True,
+                                executable='/bin/bash',
+                                stdout=subprocess.PIPE,
+                                stderr=stderr)
+    command_timed_out = False
+    if time_out is None:
+        stdout_buf, stderr_buf = sub_proc.communicate()
+    elif hasattr(subprocess, 'TimeoutExpired'):
+        try:
+            stdout_buf, stderr_buf = sub_proc.communicate(timeout=time_out)
+        except subprocess.TimeoutExpired:
+            command_timed_out = True
+            os.killpg(sub_proc.pid, signal.SIGKILL)
+            stdout_buf, stderr_buf = sub_proc.communicate()
+    else:
+        # Python 2's communicate has no timeout parameter.  Have a timer
+        # thread kill the process group at the deadline while this thread
+        # continues to drain the pipes.
+        timed_out = []
+
+        def kill_sub_proc():
+            timed_out.append(True)
+            try:
+                os.killpg(sub_proc.pid, signal.SIGKILL)
+            except OSError:
+                # The process group has already exited.
+                pass
+        timer = threading.Timer(float(time_out), kill_sub_proc)
+        timer.start()
+        try:
+            stdout_buf, stderr_buf = sub_proc.communicate()
+        finally:
+            timer.cancel()
+        command_timed_out = bool(timed_out)
+
+    return sub_proc.returncode, stdout_buf, stderr_buf or "", \
+        command_timed_out, sub_proc.pid
+
+
+def shell_cmd_attempts(command_string,
+                       time_out=None,
+                       max_attempts=1,
+                       retry_sleep_time=5,
+                       valid_rcs=[0],
+                       return_stderr=0):
+    r"""
+    Run the given command string via shell_cmd_attempt until it succeeds or
+    max_attempts have been made and return a list of attempt tuples (see
+    shell_cmd_attempt for the contents of each tuple).
+
+    This function makes no print or robot calls and so may be run in a
+    worker thread.
+
+    Description of argument(s):
+    command_string                  See shell_cmd_attempt.
+    time_out                        See shell_cmd_attempt.
+    max_attempts                    The max number of attempts that should be
+                                    made to run the command string.
+    retry_sleep_time                The number of seconds to sleep between
+                                    attempts.
+    valid_rcs                       A list of integers indicating which
+                                    shell_rc values are not to be considered
+                                    errors.
+    return_stderr                   See shell_cmd_attempt.
+    """
+
+    attempts = []
+    for attempt_num in range(1, max_attempts + 1):
+        attempts.append(shell_cmd_attempt(command_string, time_out,
+                                          return_stderr))
+        if attempts[-1][0] in valid_rcs:
+            break
+        if attempt_num < max_attempts:
+            time.sleep(retry_sleep_time)
+
+    return attempts
+
+
+def shell_cmds(command_strings,
+               quiet=None,
+               print_output=None,
+               show_err=1,
+               test_mode=0,
+               time_out=None,
+               max_attempts=1,
+               retry_sleep_time=5,
+               valid_rcs=[0],
+               ignore_err=None,
+               return_stderr=0,
+               max_workers=None):
+    r"""
+    Run the given command strings concurrently in shells and return a list of
+    result tuples in the same order as command_strings.  Each result tuple is
+    what shell_cmd would have returned for the corresponding command string
+    (i.e. shell_rc, stdout and, if return_stderr is set, stderr).
+
+    Each command string is run in a worker thread and is given its own
+    time_out (which is enforced without signals).  The output of each command
+    string is printed in command_strings order once all of the command
+    strings have finished.
+
+    Example:
+
+    results = shell_cmds(["ping -c 1 -w 2 bmc1", "date"], time_out=10)
+    (ping_rc, ping_out), (date_rc, date_out) = results
+
+    Description of argument(s):
+    command_strings                 A list of command strings to be run in
+                                    shells.
+    time_out                        A time-out value expressed in seconds or
+                                    a list of such values (one per command
+                                    string).
+    max_workers                     The maximum number of command strings to
+                                    be run at once.  This defaults to the
+                                    number of command strings.
+    All other arguments             See shell_cmd.  Each argument applies to
+                                    each command string.
+    """
+
+    # concurrent.futures is imported here rather than at module level because
+    # python 2 only has it if the "futures" backport is installed.
+    try:
+        from concurrent import futures
+    except ImportError:
+        raise ImportError("shell_cmds requires the concurrent.futures module"
+                          + " (i.e. python 3 or the python 2 futures"
+                          + " backport).")
+
+    for command_string in command_strings:
+        err_msg = gv.valid_value(command_string)
+        if err_msg:
+            raise ValueError(err_msg)
+
+    # Assign default values to some of the arguments to this function.
+    quiet = int(gm.dft(quiet, gp.get_stack_var('quiet', 0)))
+    print_output = int(gm.dft(print_output, not quiet))
+    show_err = int(show_err)
+    ignore_err = int(gm.dft(ignore_err, gp.get_stack_var('ignore_err', 1)))
+
+    for command_string in command_strings:
+        gp.qprint_issuing(command_string, test_mode)
+    if test_mode or not command_strings:
+        return [(0, "", "") if return_stderr else (0, "")
+                for command_string in command_strings]
+
+    # Convert a string python dictionary definition to a dictionary.
+    valid_rcs = fa.source_to_object(valid_rcs)
+    # Convert each list entry to a signed value.
+    valid_rcs = [gm.to_signed(x) for x in valid_rcs]
+    if isinstance(time_out, list):
+        time_outs = time_out
+    else:
+        time_outs = [time_out] * len(command_strings)
+
+    max_workers = int(gm.dft(max_workers, len(command_strings)))
+    executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        cmd_futures = [executor.submit(shell_cmd_attempts, command_string,
+                                       cmd_time_out, max_attempts,
+                                       retry_sleep_time, valid_rcs,
+                                       return_stderr)
+                       for command_string, cmd_time_out
+                       in zip(command_strings, time_outs)]
+        cmd_attempts = [cmd_future.result() for cmd_future in cmd_futures]
+    finally:
+        executor.shutdown(wait=True)
+
+    # Print the output and compose the error reports on the main thread, in
+    # order.
+    results = []
+    failed_command_strings = []
+    for command_string, cmd_time_out, attempts \
+            in zip(command_strings, time_outs, cmd_attempts):
+        func_out_history_buf = ""
+        for attempt_num, attempt in enumerate(attempts, start=1):
+            shell_rc, stdout_buf, stderr_buf, command_timed_out, child_pid = \
+                attempt
+            func_out_buf = ""
+            if print_output:
+                if return_stderr:
+                    func_out_buf += stderr_buf
+                func_out_buf += stdout_buf
+            if shell_rc in valid_rcs:
+                break
+            err_msg = "The prior shell command failed.\n"
+            err_msg += gp.sprint_var(attempt_num)
+            err_msg += gp.sprint_vars(command_string, command_timed_out)
+            err_msg += gp.sprint_varx("time_out", cmd_time_out)
+            err_msg += gp.sprint_var(child_pid)
+            err_msg += gp.sprint_vars(shell_rc, valid_rcs, fmt=gp.hexa())
+            if not print_output:
+                if return_stderr:
+                    err_msg += "stderr_buf:\n" + stderr_buf
+                err_msg += "stdout_buf:\n" + stdout_buf
+            if show_err:
+                func_out_buf += gp.sprint_error_report(err_msg)
+            if attempt_num < max_attempts:
+                cmd_buf = "time.sleep(" + str(retry_sleep_time) + ")"
+                if show_err:
+                    func_out_buf += gp.sprint_issuing(cmd_buf)
+            func_out_history_buf += func_out_buf
+
+        if shell_rc in valid_rcs:
+            gp.gp_print(func_out_buf)
+        else:
+            failed_command_strings.append(command_string)
+            if show_err:
+                gp.gp_print(func_out_history_buf, stream='stderr')
+            else:
+                gp.gp_print(func_out_buf)
+        results.append((shell_rc, stdout_buf, stderr_buf) if return_stderr
+                       else (shell_rc, stdout_buf))
+
+    if failed_command_strings and not ignore_err:
+        err_msg = "The following shell commands failed:\n" \
+            + gp.sprint_var(failed_command_strings)
+        if robot_env:
+            BuiltIn().fail(err_msg)
+        else:
+            raise ValueError(err_msg)
+
+    return results
+
+
 def t_shell_cmd(command_string, **kwargs):
     r"""
     Search upward in the the call stack to obtain the test_mode argument, add
@@ -196,8 +196,130 @@ def return_plug_in_packages_list(plug_in_dir_paths,
 
     plug_in_packages_list = plug_in_packages_list + integrated_plug_ins_list
 
-    plug_in_packages_list = \
-        list(set([validate_plug_in_package(path, mch_class)
-                  for path in plug_in_packages_list]))
+    # Remove duplicates while preserving order so that the plug-ins are
+    # always processed in the same order.
+    validated_packages_list = []
+    for path in plug_in_packages_list:
+        path = validate_plug_in_package(path, mch_class)
+        if path not in validated_packages_list:
+            validated_packages_list.append(path)
 
-    return plug_in_packages_list
+    return validated_packages_list
+
+
+def get_plug_in_name(plug_in_dir_path):
+    r"""
+    Return the plug-in name (i.e. the base name of the plug-in directory)
+    given its directory path.
+
+    Description of argument(s):
+    plug_in_dir_path                The path to a plug-in package directory.
+    """
+
+    return os.path.basename(os.path.normpath(plug_in_dir_path))
+
+
+def is_parallel_safe(plug_in_dir_path,
+                     call_point):
+    r"""
+    Return True if the given plug-in declares that its call point program may
+    be run concurrently with other plug-ins' call point programs.
+
+    A plug-in makes this declaration by containing a file named
+    "parallel_safe".  If the file is empty, the declaration applies to all of
+    the plug-in's call points.  Otherwise, the file is a list of call points
+    (e.g. "post_test_case"), one per line, to which the declaration applies.
+
+    Description of argument(s):
+    plug_in_dir_path                The path to a plug-in package directory.
+    call_point                      The call point (e.g. "setup").
+    """
+
+    parallel_safe_file_path = gm.add_trailing_slash(plug_in_dir_path) \
+        + "parallel_safe"
+    if not os.path.exists(parallel_safe_file_path):
+        return False
+    call_points = list(filter(None, gm.file_to_list(parallel_safe_file_path,
+                                                    newlines=0, comments=0,
+                                                    trim=1)))
+    return not call_points or call_point in call_points
+
+
+def get_plug_in_dependencies(plug_in_dir_path):
+    r"""
+    Return a list of the names of the plug-ins whose call point programs must
+    finish before the given plug-in's call point program may be run.
+
+    A plug-in declares its dependencies by containing a file named
+    "depends_on" which lists plug-in names, one per line.
+
+    Description of argument(s):
+    plug_in_dir_path                The path to a plug-in package directory.
+    """
+
+    depends_on_file_path = gm.add_trailing_slash(plug_in_dir_path) \
+        + "depends_on"
+    if not os.path.exists(depends_on_file_path):
+        return []
+    return list(filter(None, gm.file_to_list(depends_on_file_path, newlines=0,
+                                             comments=0, trim=1)))
+
+
+def create_plug_in_schedule(plug_in_packages_list,
+                            call_point):
+    r"""
+    Return a list of plug-in groups in the order in which they are to be run
+    for the given call point.  Each group is a list of plug-in directory
+    paths.  The plug-ins within a group may be run concurrently.  Each group
+    must finish before the next group is started.
+
+    The plug-ins are first ordered so that each plug-in follows the plug-ins
+    it depends on (see get_plug_in_dependencies).  Otherwise, the order of
+    plug_in_packages_list is preserved.  Each consecutive run of parallel-safe
+    plug-ins (see is_parallel_safe) then forms one group.  Every other plug-in
+    is a group by itself.  A parallel-safe plug-in may be grouped with the
+    plug-ins it depends on, so the caller must still see that it is not
+    started until they have finished.
+
+    A ValueError is raised if the dependencies are circular.
+
+    Description of argument(s):
+    plug_in_packages_list           A list of plug-in directory paths (see
+                                    return_plug_in_packages_list).
+    call_point                      The call point (e.g. "setup").
+    """
+
+    names = [get_plug_in_name(path) for path in plug_in_packages_list]
+    # Dependencies on plug-ins which are not in the list are ignored.
+    dependencies = dict((name, [dependency for dependency
+                                in get_plug_in_dependencies(path)
+                                if dependency in names])
+                        for name, path in zip(names, plug_in_packages_list))
+
+    ordered_paths = []
+    ordered_names = []
+    remaining_paths = list(plug_in_packages_list)
+    while remaining_paths:
+        for path in remaining_paths:
+            name = get_plug_in_name(path)
+            if not [dependency for dependency in dependencies[name]
+                    if dependency not in ordered_names]:
+                break
+        else:
+            raise ValueError("The plug-in dependencies are circular.\n"
+                             + gp.sprint_var(dependencies))
+        remaining_paths.remove(path)
+        ordered_paths.append(path)
+        ordered_names.append(name)
+
+    schedule = []
+    last_parallel_safe = False
+    for path in ordered_paths:
+        parallel_safe = is_parallel_safe(path, call_point)
+        if parallel_safe and last_parallel_safe:
+            schedule[-1].append(path)
+        else:
+            schedule.append([path])
+        last_parallel_safe = parallel_safe
+
+    return schedule
@@ -12,6 +12,7 @@ import collections
 import gen_print as gp
 import gen_misc as gm
 import gen_cmd as gc
+import kv_store as kvs
 
 PLUG_VAR_PREFIX = os.environ.get("PLUG_VAR_PREFIX", "AUTOBOOT")
 
@@ -416,10 +417,32 @@ def create_plug_in_save_dir(plug_in_package_name=None):
     plug_in_save_dir_path = compose_plug_in_save_dir_path(plug_in_package_name)
     if os.path.isdir(plug_in_save_dir_path):
         return plug_in_save_dir_path
-    gc.shell_cmd("mkdir -p " + plug_in_save_dir_path)
+    try:
+        os.makedirs(plug_in_save_dir_path)
+    except OSError:
+        # Another process may have created it.
+        if not os.path.isdir(plug_in_save_dir_path):
+            raise
     return plug_in_save_dir_path
 
 
+def get_plug_in_store(plug_in_package_name=None):
+    r"""
+    Return the kv_store object (see kv_store.py) in which the plug-in's save
+    values are kept.
+
+    The store is a single SQLite file named "plug_in_values.db" in the plug-in
+    save directory.  See compose_plug_in_save_dir_path for details.
+
+    Description of argument(s):
+    plug_in_package_name            See compose_plug_in_save_dir_path for
+                                    details.
+    """
+
+    return kvs.get_kv_store(create_plug_in_save_dir(plug_in_package_name)
+                            + "plug_in_values.db")
+
+
 def delete_plug_in_save_dir(plug_in_package_name=None):
     r"""
     Delete the plug_in save directory.  See compose_plug_in_save_dir_path for
@@ -430,56 +453,118 @@ def delete_plug_in_save_dir(plug_in_package_name=None):
                                     details.
     """
 
-    gc.shell_cmd("rm -rf "
-                 + compose_plug_in_save_dir_path(plug_in_package_name))
+    plug_in_save_dir_path = compose_plug_in_save_dir_path(plug_in_package_name)
+    kvs.close_kv_store(plug_in_save_dir_path + "plug_in_values.db")
+    gc.shell_cmd("rm -rf " + plug_in_save_dir_path)
+
+
+def write_plug_in_save_files(values,
+                             plug_in_package_name=None):
+    r"""
+    Write each of the given values, as a string, to a file named for the
+    value in the plug-in save directory (e.g. <save dir>/my_var1).
+
+    These files are what earlier versions of this module used to save values.
+    They are still written alongside the plug-in save store so that programs
+    which read them directly continue to work.
+
+    Description of argument(s):
+    values                          A dictionary of the names and values to be
+                                    written.
+    plug_in_package_name            See compose_plug_in_save_dir_path for
+                                    details.
+    """
+
+    plug_in_save_dir_path = create_plug_in_save_dir(plug_in_package_name)
+    for var_name, value in values.items():
+        with open(plug_in_save_dir_path + var_name, 'w') as save_file:
+            save_file.write(str(value) + "\n")
 
 
 def save_plug_in_value(value, plug_in_package_name=None):
     r"""
-    Save a value in a plug-in save file.  The value may be retrieved later via
-    a call to the restore_plug_in_value function.
+    Save a value in the plug-in save store.  The value may be retrieved later
+    via a call to the restore_plug_in_value function.
 
     This function will figure out the variable name of the value passed and
-    use that name in creating the plug-in save file.
+    use that name as the key in the plug-in save store.
 
     Example call:
 
     my_var1 = 5
     save_plug_in_value(my_var1)
 
-    In this example, the value "5" would be saved to the "my_var1" file in the
-    plug-in save directory.
+    In this example, the value 5 would be saved as "my_var1" in the plug-in
+    save store.  The value "5" would also be written to the "my_var1" file in
+    the plug-in save directory (see write_plug_in_save_files).
 
     Description of argument(s):
-    value                           The value to be saved.
+    value                           The value to be saved.  Its type (e.g.
+                                    int, bool, str, list, dict) is preserved.
+                                    A value which cannot be represented in
+                                    JSON (e.g. a set, a dict with tuple keys
+                                    or a custom object) is saved as its str()
+                                    representation, as earlier versions of
+                                    this module saved every value, and so is
+                                    restored as a string.
     plug_in_package_name            See compose_plug_in_save_dir_path for
                                     details.
     """
 
     # Get the name of the variable used as argument one to this function.
     var_name = gp.get_arg_name(0, 1, stack_frame_ix=2)
-    plug_in_save_dir_path = create_plug_in_save_dir(plug_in_package_name)
-    save_file_path = plug_in_save_dir_path + var_name
     gp.qprint_timen("Saving \"" + var_name + "\" value.")
-    gc.shell_cmd("echo '" + str(value) + "' > " + save_file_path)
+    get_plug_in_store(plug_in_package_name).set(var_name, value)
+    write_plug_in_save_files({var_name: value}, plug_in_package_name)
+
+
+def save_plug_in_values(plug_in_package_name=None, **kwargs):
+    r"""
+    Atomically save one or more values in the plug-in save store.  Either all
+    of the values are saved or none are.  The values may be retrieved later
+    via calls to the restore_plug_in_value function.  Once the values are
+    saved, they are also written to files in the plug-in save directory (see
+    write_plug_in_save_files).
+
+    Example call:
+
+    save_plug_in_values(boot_count=boot_count, boot_success=boot_success)
+
+    Description of argument(s):
+    plug_in_package_name            See compose_plug_in_save_dir_path for
+                                    details.
+    kwargs                          The names and values to be saved.  See
+                                    save_plug_in_value regarding values which
+                                    cannot be represented in JSON.
+    """
+
+    gp.qprint_timen("Saving " + ", ".join(["\"" + var_name + "\""
+                                           for var_name in kwargs])
+                    + " values.")
+    get_plug_in_store(plug_in_package_name).update(kwargs)
+    write_plug_in_save_files(kwargs, plug_in_package_name)
 
 
 def restore_plug_in_value(default="", plug_in_package_name=None):
     r"""
-    Return a value from a plug-in save file.
+    Return a value from the plug-in save store.
 
     The name of the value to be restored will be determined by this function
     based on the lvalue being assigned.  Consider the following example:
 
     my_var1 = restore_plug_in_value(2)
 
-    In this example, this function would look for the "my_var1" file in the
-    plug-in save directory, read its value and return it.  If no such file
-    exists, the default value of 2 would be returned.
+    In this example, this function would look for "my_var1" in the plug-in
+    save store and return its value.  If there is no such value, the default
+    value of 2 would be returned.
+
+    For compatibility with values saved by earlier versions of this module,
+    if the value is not in the store but there is a "my_var1" file in the
+    plug-in save directory, the value is read from that file.
 
     Description of argument(s):
     default                         The default value to be returned if there
-                                    is no plug-in save file for the value in
+                                    is no saved value for the value in
                                     question.
     plug_in_package_name            See compose_plug_in_save_dir_path for
                                     details.
@@ -487,8 +572,15 @@ def restore_plug_in_value(default="", plug_in_package_name=None):
 
     # Get the lvalue from the caller's invocation of this function.
     lvalue = gp.get_arg_name(0, -1, stack_frame_ix=2)
-    plug_in_save_dir_path = create_plug_in_save_dir(plug_in_package_name)
-    save_file_path = plug_in_save_dir_path + lvalue
+    plug_in_store = get_plug_in_store(plug_in_package_name)
+    if lvalue in plug_in_store:
+        gp.qprint_timen("Restoring " + lvalue + " value from "
+                        + plug_in_store.file_path + ".")
+        value = plug_in_store.get(lvalue)
+        gp.qprint_varx(lvalue, value)
+        return value
+
+    save_file_path = os.path.dirname(plug_in_store.file_path) + "/" + lvalue
     if os.path.isfile(save_file_path):
         gp.qprint_timen("Restoring " + lvalue + " value from "
                         + save_file_path + ".")
@@ -503,8 +595,9 @@ def restore_plug_in_value(default="", plug_in_package_name=None):
         gp.qprint_varx(lvalue, value)
         return value
     else:
-        gp.qprint_timen("Save file " + save_file_path
-                        + " does not exist so returning default value.")
+        gp.qprint_timen("No saved value for " + lvalue + " exists in "
+                        + plug_in_store.file_path
+                        + " so returning default value.")
         gp.qprint_var(default)
         return default
 
@@ -20,7 +20,9 @@ except ImportError:
     import builtins as __builtin__
 import logging
 import collections
+import atexit
 from wrap_utils import *
+import print_sink as ps
 
 try:
     robot_env = 1
@@ -176,6 +178,13 @@ def get_line_indent(line):
 
 # get_arg_name is not a print function per se.  It has been included in this
 # module because it is used by sprint_var which is defined in this module.
+# call_site_cache is a dictionary whose keys are (code object, line number,
+# called function name) tuples and whose values are the (lvalues,
+# called_func_name, args_list) tuples parsed from the corresponding call site
+# by get_arg_name.
+call_site_cache = {}
+
+
 def get_arg_name(var,
                  arg_num=1,
                  stack_frame_ix=1):
@@ -281,10 +290,12 @@ def get_arg_name(var,
 
     work_around_inspect_stack_cwd_failure()
     for count in range(0, 2):
+        # Note: Walking the frames directly is much cheaper than calling
+        # inspect.stack(), which reads source context for every frame on the
+        # stack.
         try:
-            frame, filename, cur_line_no, function_name, lines, index = \
-                inspect.stack()[stack_frame_ix]
-        except IndexError:
+            frame = sys._getframe(stack_frame_ix)
+        except ValueError:
             print_error("Programmer error - The caller has asked for"
                         + " information about the stack frame at index \""
                         + str(stack_frame_ix) + "\".  However, the stack"
@@ -292,6 +303,9 @@ def get_arg_name(var,
                         + " entries.  Therefore the stack frame index is out"
                         + " of range.\n")
             return
+        filename = frame.f_code.co_filename
+        cur_line_no = frame.f_lineno
+        function_name = frame.f_code.co_name
         if filename != "<string>":
             break
         # filename of "<string>" may mean that the function in question was
@@ -305,6 +319,13 @@ def get_arg_name(var,
 
     real_called_func_name = sprint_func_name(stack_frame_ix)
 
+    # The result of parsing a given call site never changes so it is cached
+    # by code object, line number and called function name.
+    call_site_key = (frame.f_code, cur_line_no, real_called_func_name)
+    if call_site_key in call_site_cache and not local_debug:
+        lvalues, called_func_name, args_list = call_site_cache[call_site_key]
+        return select_arg_name(arg_num, lvalues, called_func_name, args_list)
+
     module = inspect.getmodule(frame)
 
     # Though one would expect inspect.getsourcelines(frame) to get all module
@@ -320,7 +341,8 @@ def get_arg_name(var,
         line_ix = cur_line_no - source_line_num
 
     if local_debug:
-        print("\n  Variables retrieved from inspect.stack() function:")
+        lines, index = inspect.getframeinfo(frame)[3:5]
+        print("\n  Variables retrieved from the stack frame:")
         print_varx("frame", frame, indent=debug_indent + 2)
         print_varx("filename", filename, indent=debug_indent + 2)
         print_varx("cur_line_no", cur_line_no, indent=debug_indent + 2)
@@ -487,18 +509,9 @@ def get_arg_name(var,
     # Trim whitespace from each list entry.
     args_list = [arg.strip() for arg in args_list]
 
-    if arg_num < 0:
-        if abs(arg_num) > len(lvalues):
-            argument = lvalues
-        else:
-            argument = lvalues[arg_num]
-    elif arg_num == 0:
-        argument = called_func_name
-    else:
-        if arg_num > len(args_list):
-            argument = args_list
-        else:
-            argument = args_list[arg_num - 1]
+    call_site_cache[call_site_key] = (lvalues, called_func_name, args_list)
+
+    argument = select_arg_name(arg_num, lvalues, called_func_name, args_list)
 
     if local_debug:
         print_varx("args_list", args_list, indent=debug_indent)
@@ -508,6 +521,38 @@ def get_arg_name(var,
     return argument
 
 
+def select_arg_name(arg_num,
+                    lvalues,
+                    called_func_name,
+                    args_list):
+    r"""
+    Return the argument name indicated by arg_num from the parsed call site
+    data.  See get_arg_name for details.
+
+    Description of argument(s):
+    arg_num                         See get_arg_name for details.
+    lvalues                         A dictionary of the lvalue names from the
+                                    call site, keyed by negative index.
+    called_func_name                The name of the called function as
+                                    specified at the call site.
+    args_list                       A list of the argument names from the call
+                                    site.
+    """
+
+    if arg_num < 0:
+        if abs(arg_num) > len(lvalues):
+            # Return a copy so that the cached value can't be modified by the
+            # caller.
+            return copy.copy(lvalues)
+        return lvalues[arg_num]
+    elif arg_num == 0:
+        return called_func_name
+    else:
+        if arg_num > len(args_list):
+            return list(args_list)
+        return args_list[arg_num - 1]
+
+
 def sprint_time(buffer=""):
     r"""
     Return the time in the following format.
@@ -1809,12 +1854,165 @@ def sprintn(buffer=""):
     return buffer
 
 
+def gp_write(buffer,
+             stream='stdout'):
+    r"""
+    Write the buffer to the indicated stream without flushing it.
+
+    In a robot environment, stdout and stderr are robot's console streams
+    (i.e. the streams written to by BuiltIn().log_to_console).
+
+    This function is intended for use only by other functions in this module.
+
+    Description of argument(s):
+    buffer                          The string to be written.
+    stream                          Either "stdout", "stderr" or "log" (i.e.
+                                    python logging).
+    """
+
+    if stream == "log":
+        logging.warning(buffer)
+    elif robot_env:
+        if stream == "stdout":
+            sys.__stdout__.write(buffer)
+        else:
+            sys.__stderr__.write(buffer)
+    elif stream == "stdout":
+        sys.stdout.write(buffer)
+    else:
+        sys.stderr.write(buffer)
+
+
+def gp_flush(stream='stdout'):
+    r"""
+    Flush the indicated stream.
+
+    This function is intended for use only by other functions in this module.
+
+    Description of argument(s):
+    stream                          Either "stdout", "stderr" or "log".
+    """
+
+    if stream == "log":
+        return
+    if robot_env:
+        if stream == "stdout":
+            sys.__stdout__.flush()
+        else:
+            sys.__stderr__.flush()
+    elif stream == "stdout":
+        sys.stdout.flush()
+    else:
+        sys.stderr.flush()
+
+
+# print_sink_obj, when not None, is the asynchronous print sink through which
+# gp_print and gp_log send their output (see start_print_sink).
+print_sink_obj = None
+
+
+def start_print_sink(max_queue_size=None,
+                     batch_size=None,
+                     flush_interval=None):
+    r"""
+    Start sending the output of the print functions in this module through an
+    asynchronous print sink (see print_sink.py).
+
+    With the print sink, the print functions queue their output and return
+    rather than waiting for the output to be written and flushed.  Output to
+    stderr (e.g. from print_error) is still flushed before the print function
+    returns.  All queued output is flushed when the program exits.
+
+    Description of argument(s):
+    max_queue_size                  The maximum number of buffers which may be
+                                    queued.  This defaults to environment
+                                    variable GEN_PRINT_QUEUE_SIZE or 10000.
+    batch_size                      The maximum number of buffers to be
+                                    written per batch.  This defaults to
+                                    environment variable GEN_PRINT_BATCH_SIZE
+                                    or 500.
+    flush_interval                  The maximum number of seconds between
+                                    flushes while output is pending.  This
+                                    defaults to environment variable
+                                    GEN_PRINT_FLUSH_INTERVAL or 0.5.
+    """
+
+    global print_sink_obj
+
+    if print_sink_obj is not None:
+        return
+    if max_queue_size is None:
+        max_queue_size = int(os.environ.get('GEN_PRINT_QUEUE_SIZE', 10000))
+    if batch_size is None:
+        batch_size = int(os.environ.get('GEN_PRINT_BATCH_SIZE', 500))
+    if flush_interval is None:
+        flush_interval = \
+            float(os.environ.get('GEN_PRINT_FLUSH_INTERVAL', 0.5))
+    print_sink_obj = ps.print_sink(gp_write, gp_flush, max_queue_size,
+                                   batch_size, flush_interval)
+
+
+def stop_print_sink():
+    r"""
+    Write all queued output and stop sending output through the print sink.
+    """
+
+    global print_sink_obj
+
+    if print_sink_obj is None:
+        return
+    sink = print_sink_obj
+    print_sink_obj = None
+    sink.close()
+
+
+def flush_print_sink():
+    r"""
+    Wait until all output queued by the print functions has been written and
+    flushed.  This should be called before running a sub-process which writes
+    to our stdout or stderr so that the output is not interleaved.
+    """
+
+    if print_sink_obj is not None:
+        print_sink_obj.flush()
+
+
+def reset_print_sink():
+    r"""
+    Start a new print sink in a forked child process.  The child does not
+    inherit the parent's writer thread.
+    """
+
+    global print_sink_obj
+
+    if print_sink_obj is None:
+        return
+    print_sink_obj = None
+    start_print_sink()
+
+
+atexit.register(stop_print_sink)
+if hasattr(os, 'register_at_fork'):
+    # Empty the queue before forking so that the child doesn't re-print the
+    # parent's output.
+    os.register_at_fork(before=flush_print_sink,
+                        after_in_child=reset_print_sink)
+
+# The user can set environment variable "GEN_PRINT_ASYNC" to have the print
+# functions in this module use an asynchronous print sink.
+if int(os.environ.get('GEN_PRINT_ASYNC', 0)):
+    start_print_sink()
+
+
 def gp_print(buffer,
              stream='stdout'):
     r"""
     Print the buffer using either sys.stdout.write or BuiltIn().log_to_console
     depending on whether we are running in a robot environment.
 
+    If the print sink is active (see start_print_sink), the buffer is queued
+    instead.
+
     This function is intended for use only by other functions in this module.
 
     Description of argument(s):
@@ -1822,6 +2020,12 @@ def gp_print(buffer,
     stream                          Either "stdout" or "stderr".
     """
 
+    if print_sink_obj is not None:
+        print_sink_obj.write(buffer, stream)
+        if stream != "stdout":
+            print_sink_obj.flush()
+        return
+
     if robot_env:
         BuiltIn().log_to_console(buffer, stream=stream, no_newline=True)
     else:
@@ -1838,6 +2042,10 @@ def gp_log(buffer):
     Log the buffer using either python logging or BuiltIn().log depending on
     whether we are running in a robot environment.
 
+    If the print sink is active (see start_print_sink) and we are not running
+    in a robot environment, the buffer is queued instead.  Robot's log may
+    only be written from the main thread.
+
     This function is intended for use only by other functions in this module.
 
     Description of argument(s):
@@ -1846,6 +2054,8 @@ def gp_log(buffer):
 
     if robot_env:
         BuiltIn().log(buffer)
+    elif print_sink_obj is not None:
+        print_sink_obj.write(buffer, "log")
     else:
         logging.warning(buffer)
 
@@ -1970,11 +2180,26 @@ def get_stack_var(var_name,
                                     function, etc.
     """
 
-    work_around_inspect_stack_cwd_failure()
-    default = get_var_value(var_name=var_name, default=default)
-    return next((frame[0].f_locals[var_name]
-                 for frame in inspect.stack()[init_stack_ix:]
-                 if var_name in frame[0].f_locals), default)
+    # Note: This function is called by every qprint and dprint function, so
+    # it walks the frames directly rather than calling inspect.stack() (which
+    # reads source context for every frame on the stack).  Likewise, it only
+    # materializes the locals of a function frame if the function's code
+    # object actually has a variable by that name.
+    try:
+        frame = sys._getframe(init_stack_ix)
+    except ValueError:
+        frame = None
+    while frame is not None:
+        code = frame.f_code
+        if not code.co_flags & inspect.CO_OPTIMIZED\
+           or var_name in code.co_varnames or var_name in code.co_cellvars\
+           or var_name in code.co_freevars:
+            f_locals = frame.f_locals
+            if var_name in f_locals:
+                return f_locals[var_name]
+        frame = frame.f_back
+
+    return get_var_value(var_name=var_name, default=default)
 
 
 # hidden_text is a list of passwords which are to be replaced with asterisks
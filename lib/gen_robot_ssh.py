@@ -6,6 +6,7 @@ execute_ssh_command, etc.
 """
 
 import sys
+import os
 import traceback
 import re
 import socket
@@ -23,6 +24,10 @@ from robot.libraries.BuiltIn import BuiltIn
 from SSHLibrary import SSHLibrary
 sshlib = SSHLibrary()
 
+# If SSH_SESSION_POOL is set, execute_ssh_command will run commands via the
+# thread-safe ssh_session_pool module rather than via SSHLibrary.
+SSH_SESSION_POOL = int(os.environ.get('SSH_SESSION_POOL', 0))
+
 
 def sprint_connection(connection,
                       indent=0):
@@ -230,6 +235,14 @@ def execute_ssh_command(cmd_buf,
     if test_mode:
         return "", "", 0
 
+    if SSH_SESSION_POOL and not fork\
+       and open_connection_args['alias'] != "device_connection":
+        results = execute_ssh_commands([cmd_buf], open_connection_args,
+                                       login_args, print_out, print_err,
+                                       ignore_err, quiet=1, test_mode=0,
+                                       time_out=time_out, max_workers=1)
+        return results[0]
+
     global sshlib
 
     max_exec_cmd_attempts = 2
@@ -358,3 +371,113 @@ def execute_ssh_command(cmd_buf,
     if open_connection_args['alias'] == "device_connection":
         return stdout
     return stdout, stderr, rc
+
+
+def execute_ssh_commands(cmd_bufs,
+                         open_connection_args={},
+                         login_args={},
+                         print_out=0,
+                         print_err=0,
+                         ignore_err=1,
+                         quiet=None,
+                         test_mode=None,
+                         time_out=None,
+                         max_workers=None):
+    r"""
+    Run the given commands concurrently in one SSH session and return a list
+    of (stdout, stderr, rc) tuples in the same order as cmd_bufs.
+
+    The commands are run via a persistent, pooled SSH session (see the
+    ssh_session_pool module) with each command on its own channel.  The
+    session remains open for use by subsequent calls.
+
+    Description of arguments:
+    cmd_bufs                        A list of command strings to be run in an
+                                    SSH session.
+    open_connection_args            A dictionary of arg names and values such
+                                    as would be passed to the SSHLibrary
+                                    open_connection function.  Only the
+                                    'host', 'port' and 'timeout' entries are
+                                    used.
+    login_args                      A dictionary containing 'username' and
+                                    'password' entries.
+    print_out                       If this is set, this function will print
+                                    the stdout/stderr generated by each
+                                    command.
+    print_err                       If show_err is set, this function will
+                                    print a standardized error report for
+                                    each command that returns non-zero.
+    ignore_err                      Indicates that non-zero return codes are
+                                    to be ignored.  If this is not set, a
+                                    non-zero return code from any command
+                                    will cause a failure once all commands
+                                    have completed.
+    quiet                           Indicates whether this function should run
+                                    the pissuing() function which prints an
+                                    "Issuing: <cmd string>" to stdout.  This
+                                    defaults to the global quiet value.
+    test_mode                       If test_mode is set, this function will
+                                    not actually run the commands.  This
+                                    defaults to the global test_mode value.
+    time_out                        The amount of time to allow for the
+                                    execution of each command.  A value of
+                                    None means that there is no limit to how
+                                    long a command may take.
+    max_workers                     The maximum number of commands to run at
+                                    once.  This defaults to the
+                                    SSH_MAX_CHANNELS environment variable or
+                                    to 4.
+    """
+
+    gp.lprint_executing()
+
+    # Obtain default values.
+    quiet = int(gp.get_var_value(quiet, 0))
+    test_mode = int(gp.get_var_value(test_mode, 0))
+
+    for cmd_buf in cmd_bufs:
+        if not quiet:
+            gp.pissuing(cmd_buf, test_mode)
+        gp.lpissuing(cmd_buf, test_mode)
+
+    if test_mode:
+        return [("", "", 0)] * len(cmd_bufs)
+
+    # ssh_session_pool (and therefore paramiko) is imported here rather than
+    # at module level so that users of execute_ssh_command which have not
+    # set SSH_SESSION_POOL don't depend on it.
+    import ssh_session_pool as ssp
+
+    try:
+        results = ssp.pool_execute_commands(
+            cmd_bufs, open_connection_args['host'], login_args['username'],
+            login_args['password'], open_connection_args.get('port', 22),
+            float(open_connection_args.get('timeout', 25.0)), time_out,
+            max_workers)
+    except Exception:
+        # The connection or login has failed.
+        except_type, except_value, except_traceback = sys.exc_info()
+        gp.lprint_var(except_type)
+        gp.lprint_varx("except_value", str(except_value))
+        results = [("", str(except_value), 1)] * len(cmd_bufs)
+
+    failed_cmd_bufs = []
+    for cmd_buf, (stdout, stderr, rc) in zip(cmd_bufs, results):
+        if rc != 0:
+            failed_cmd_bufs.append(cmd_buf)
+            if print_err:
+                gp.print_var(cmd_buf)
+                gp.print_var(rc, gp.hexa())
+                if not print_out:
+                    gp.print_var(stderr)
+                    gp.print_var(stdout)
+        if print_out:
+            gp.printn(stderr + stdout)
+
+    if failed_cmd_bufs and not ignore_err:
+        message = gp.sprint_error("The following SSH commands returned a"
+                                  + " non-zero return code:\n"
+                                  + gp.sprint_var(failed_cmd_bufs))
+        BuiltIn().fail(message)
+
+    return results
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+
+r"""
+This module provides functions for incremental capture of a BMC's systemd
+journal.
+
+Rather than dumping the entire journal on each FFDC, only the entries which
+have been logged since the previous capture are fetched (via journalctl
+--after-cursor).  The entries are fetched in compact JSON format (one entry
+per line) and are appended to a local store for the BMC, so the complete
+journal can still be rebuilt at any time via rebuild_journal.
+
+The store for each BMC consists of the following files in
+JOURNAL_STORE_DIR_PATH/<host>/:
+journal.json                        All captured entries, one JSON object per
+                                    line, in the order captured.
+cursor                              The __CURSOR value of the last captured
+                                    entry.
+"""
+
+import os
+import json
+import time
+import fcntl
+
+import gen_print as gp
+import gen_misc as gm
+import ssh_session_pool as ssp
+
+from robot.libraries.BuiltIn import BuiltIn
+
+# The directory beneath which the journal store for each BMC is kept.
+JOURNAL_STORE_DIR_PATH = \
+    gm.add_trailing_slash(os.environ.get('JOURNAL_STORE_DIR_PATH',
+                                         "/tmp/" + gm.username()
+                                         + "/journal_store/"))
+
+# The line written to stdout ahead of the journal entries when the saved
+# cursor is not recognized and the entire journal is fetched instead.
+full_journal_marker = "__FULL_JOURNAL__"
+
+
+def get_journal_store_dir_path(host):
+    r"""
+    Return the path of the journal store directory for the given host,
+    creating it if necessary.
+
+    Description of argument(s):
+    host                            The BMC host name or IP address.
+    """
+
+    store_dir_path = JOURNAL_STORE_DIR_PATH + host + "/"
+    if not os.path.isdir(store_dir_path):
+        try:
+            os.makedirs(store_dir_path)
+        except OSError:
+            # Another process may have created it.
+            if not os.path.isdir(store_dir_path):
+                raise
+    return store_dir_path
+
+
+def parse_cursor(cursor):
+    r"""
+    Return the seqnum ID and the sequence number (as an int) encoded in the
+    given journal cursor or None, None if they cannot be found.
+
+    A journal cursor is a string of the following form:
+
+    s=<seqnum ID>;i=<seqnum (hex)>;b=<boot ID>;m=<monotonic (hex)>;...
+
+    Entries written to the same journal (i.e. with the same seqnum ID) have
+    increasing sequence numbers.  A new seqnum ID is assigned when the
+    journal is started afresh (e.g. when a BMC with a volatile journal is
+    rebooted).
+
+    Description of argument(s):
+    cursor                          A journal cursor string (i.e. a __CURSOR
+                                    value).
+    """
+
+    fields = dict(field.split("=", 1) for field in cursor.split(";")
+                  if "=" in field)
+    try:
+        return fields['s'], int(fields['i'], 16)
+    except (KeyError, ValueError):
+        return None, None
+
+
+def get_last_cursor(host):
+    r"""
+    Return the cursor of the last journal entry captured from the given host
+    or "" if none has been captured.
+
+    Description of argument(s):
+    host                            The BMC host name or IP address.
+    """
+
+    try:
+        with open(get_journal_store_dir_path(host) + "cursor", 'r') as file:
+            return file.read().strip()
+    except IOError:
+        return ""
+
+
+def set_last_cursor(host,
+                    cursor):
+    r"""
+    Atomically record the cursor of the last journal entry captured from the
+    given host.
+
+    Description of argument(s):
+    host                            The BMC host name or IP address.
+    cursor                          The __CURSOR value to be recorded.
+    """
+
+    cursor_file_path = get_journal_store_dir_path(host) + "cursor"
+    temp_file_path = cursor_file_path + "." + str(os.getpid())
+    with open(temp_file_path, 'w') as file:
+        file.write(cursor + "\n")
+    os.rename(temp_file_path, cursor_file_path)
+
+
+def format_journal_entry(entry):
+    r"""
+    Return the given journal entry as a line in the format of journalctl's
+    default ("short") output.
+
+    Example result:
+
+    Oct 18 20:03:37 witherspoon systemd[1]: Started Phosphor Host State
+    Manager.
+
+    Description of argument(s):
+    entry                           A journal entry dictionary (as produced
+                                    by "journalctl -o json").
+    """
+
+    try:
+        timestamp = int(entry['__REALTIME_TIMESTAMP']) / 1000000.0
+        timestamp = time.strftime("%b %d %H:%M:%S",
+                                  time.localtime(timestamp))
+    except (KeyError, ValueError):
+        timestamp = ""
+    identifier = entry.get('SYSLOG_IDENTIFIER', entry.get('_COMM', ""))
+    if '_PID' in entry:
+        identifier += "[" + str(entry['_PID']) + "]"
+    message = entry.get('MESSAGE', "")
+    if isinstance(message, list):
+        # journalctl represents non-UTF-8 messages as arrays of byte values.
+        message = bytearray(message).decode('utf-8', 'replace')
+    return timestamp + " " + entry.get('_HOSTNAME', "") + " " + identifier \
+        + ": " + str(message)
+
+
+def capture_journal(host_args,
+                    log_prefix=None,
+                    time_out=None):
+    r"""
+    Fetch the journal entries logged on the BMC since the last capture,
+    append them to the BMC's journal store and return a list of generated
+    FFDC files.
+
+    If log_prefix is specified, the new entries are also written to the
+    following FFDC files:
+    <log_prefix>BMC_journalctl.json     The new entries in compact JSON format.
+    <log_prefix>BMC_journalctl_nopager.txt
+                                    The new entries in journalctl's default
+                                    format.
+
+    If the BMC does not recognize the saved cursor (e.g. the BMC has been
+    rebooted or its journal has been rotated), the entire journal is fetched
+    and any entries already in the store are skipped.  An entry is
+    considered to be already stored if it has the seqnum ID of the saved
+    cursor and a sequence number no greater than that of the saved cursor
+    (see parse_cursor).  This requires no reading of the store.
+
+    A ValueError is raised if the journalctl command fails, in which case
+    nothing is stored and the saved cursor is left as it was.
+
+    This function makes no robot calls and so may be run in a worker thread.
+
+    Description of argument(s):
+    host_args                       A dictionary of host, username and
+                                    password values for the BMC.
+    log_prefix                      The prefix to be given to each FFDC file
+                                    path.
+    time_out                        The number of seconds to allow for the
+                                    journalctl command.
+    """
+
+    host = host_args['host']
+    store_dir_path = get_journal_store_dir_path(host)
+
+    # Serialize captures from the same host by different processes.
+    with open(store_dir_path + "lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+        last_cursor = get_last_cursor(host)
+        cursor = last_cursor
+        cmd_buf = "journalctl -o json --no-pager"
+        if cursor:
+            # The marker line tells us that the entire journal is being
+            # fetched.
+            cmd_buf = cmd_buf + " --after-cursor='" + cursor + "' || { echo " \
+                + full_journal_marker + "; " + cmd_buf + "; }"
+
+        new_file_path = store_dir_path + "new.json." + str(os.getpid())
+        try:
+            with open(new_file_path, 'w+b') as new_file:
+                stdout, stderr, rc = \
+                    ssp.pool_execute_command(cmd_buf, time_out=time_out,
+                                             stdout_file=new_file,
+                                             **host_args)
+                if rc != 0:
+                    raise ValueError("The journalctl command failed on "
+                                     + host + " with return code " + str(rc)
+                                     + ": " + stderr + "\n")
+                new_file.seek(0)
+
+                ffdc_file_list = []
+                json_file = None
+                text_file = None
+                if log_prefix is not None:
+                    ffdc_file_list = [log_prefix + "BMC_journalctl.json",
+                                      log_prefix
+                                      + "BMC_journalctl_nopager.txt"]
+                    json_file = open(ffdc_file_list[0], 'w')
+                    text_file = open(ffdc_file_list[1], 'w')
+
+                num_entries = 0
+                # When the entire journal is fetched, entries with this
+                # seqnum ID and with sequence numbers up to last_seqnum are
+                # already stored.
+                full_journal = False
+                last_seqnum_id, last_seqnum = parse_cursor(last_cursor)
+                with open(store_dir_path + "journal.json", 'a') as store_file:
+                    for line in new_file:
+                        line = line.decode('utf-8', 'replace').strip()
+                        if line == full_journal_marker:
+                            full_journal = True
+                            continue
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # Skip blank lines and any partial entry left by
+                            # a time out.
+                            continue
+                        cursor = entry.get('__CURSOR', cursor)
+                        if full_journal and last_seqnum_id is not None:
+                            seqnum_id, seqnum = \
+                                parse_cursor(entry.get('__CURSOR', ""))
+                            if seqnum_id == last_seqnum_id \
+                               and seqnum <= last_seqnum:
+                                continue
+                        store_file.write(line + "\n")
+                        if json_file is not None:
+                            json_file.write(line + "\n")
+                            text_file.write(format_journal_entry(entry) + "\n")
+                        num_entries += 1
+                    store_file.flush()
+                    os.fsync(store_file.fileno())
+
+                if json_file is not None:
+                    json_file.close()
+                    text_file.close()
+        finally:
+            if os.path.exists(new_file_path):
+                os.remove(new_file_path)
+
+        # Record the cursor only once the entries are safely stored.
+        if cursor != last_cursor:
+            set_last_cursor(host, cursor)
+
+    gp.lprint_timen("Captured " + str(num_entries) + " new journal entries"
+                    + " from " + host + ".")
+
+    return ffdc_file_list
+
+
+def rebuild_journal(host,
+                    file_path,
+                    output_format="short"):
+    r"""
+    Write the complete journal captured from the given host to the given file
+    and return the number of entries written.
+
+    Description of argument(s):
+    host                            The BMC host name or IP address.
+    file_path                       The path of the file to be written.
+    output_format                   The output format: "short" (i.e.
+                                    journalctl's default format) or "json".
+    """
+
+    store_file_path = get_journal_store_dir_path(host) + "journal.json"
+    num_entries = 0
+    with open(file_path, 'w') as file:
+        if not os.path.exists(store_file_path):
+            return num_entries
+        with open(store_file_path, 'r') as store_file:
+            for line in store_file:
+                if output_format == "json":
+                    file.write(line)
+                else:
+                    file.write(format_journal_entry(json.loads(line)) + "\n")
+                num_entries += 1
+
+    return num_entries
+
+
+def collect_bmc_journal(log_prefix=None):
+    r"""
+    Capture the new BMC journal entries as FFDC and return a list of
+    generated files.
+
+    This function obtains the global values for OPENBMC_HOST,
+    OPENBMC_USERNAME, etc. and is intended to be called from robot (e.g. by
+    the "BMC FFDC Journal" keyword).
+
+    Description of argument(s):
+    log_prefix                      The prefix to be given to each FFDC file
+                                    path.  This defaults to the global
+                                    LOG_PREFIX value.
+    """
+
+    host_args = {}
+    for key, var_name in (('host', "OPENBMC_HOST"),
+                          ('username', "OPENBMC_USERNAME"),
+                          ('password', "OPENBMC_PASSWORD")):
+        host_args[key] = BuiltIn().get_variable_value("${" + var_name + "}",
+                                                      default="")
+        if host_args[key] in ("", None):
+            return []
+    log_prefix = gm.dft(log_prefix,
+                        BuiltIn().get_variable_value("${LOG_PREFIX}"))
+    time_out = int(BuiltIn().get_variable_value("${FFDC_CMD_TIMEOUT}",
+                                                default=240))
+
+    return capture_journal(host_args, log_prefix, time_out)
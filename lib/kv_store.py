@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+
+r"""
+This module provides a small transactional key-value store kept in a single
+SQLite database file.
+
+Values are stored as JSON so they keep their types (e.g. an int saved is an
+int restored).  A value which cannot be represented in JSON (e.g. a set or a
+custom object) is stored as its str() representation, and so is restored as a
+string.  Multi-key updates are atomic.  SQLite's own file locking
+makes the store safe for use by concurrent processes (e.g. plug-ins run in
+parallel).  Each process caches the store's contents and re-reads them only
+when another process has changed the file.
+"""
+
+import os
+import json
+import sqlite3
+
+# The number of seconds to wait for another process's lock on the store.
+KV_STORE_LOCK_TIME_OUT = int(os.environ.get('KV_STORE_LOCK_TIME_OUT', 60))
+
+
+class kv_store:
+    r"""
+    Provide get, set, update and delete access to an SQLite key-value store.
+    """
+
+    def __init__(self,
+                 file_path):
+        r"""
+        Open the store, creating it if necessary.
+
+        Description of argument(s):
+        file_path                   The path of the SQLite database file.
+        """
+
+        self.file_path = file_path
+        self.__connection = sqlite3.connect(file_path,
+                                            timeout=KV_STORE_LOCK_TIME_OUT,
+                                            isolation_level=None,
+                                            check_same_thread=False)
+        self.__connection.execute("create table if not exists kv"
+                                  + " (key text primary key, value text)")
+        self.__cache = None
+        self.__data_version = None
+
+    def __get_cache(self):
+        r"""
+        Return a dictionary of the store's contents, re-reading them if the
+        store has been changed by another connection since they were last
+        read.
+        """
+
+        data_version = \
+            self.__connection.execute("pragma data_version").fetchone()[0]
+        if self.__cache is None or data_version != self.__data_version:
+            self.__cache = \
+                dict((key, json.loads(value)) for key, value in
+                     self.__connection.execute("select key, value from kv"))
+            self.__data_version = data_version
+        return self.__cache
+
+    def get(self,
+            key,
+            default=None):
+        r"""
+        Return the value stored for the key or default if there is none.
+
+        Description of argument(s):
+        key                         The key whose value is to be returned.
+        default                     The value to return if the key is not in
+                                    the store.
+        """
+
+        return self.__get_cache().get(key, default)
+
+    def __contains__(self,
+                     key):
+        return key in self.__get_cache()
+
+    def items(self):
+        r"""
+        Return a list of (key, value) tuples for the entire store.
+        """
+
+        return sorted(self.__get_cache().items())
+
+    def update(self,
+               values,
+               delete_keys=[]):
+        r"""
+        Atomically store the given values and delete the given keys.
+
+        Description of argument(s):
+        values                      A dictionary of the key/value pairs to be
+                                    stored.  Values which are not JSON
+                                    serializable are stored as strings (see
+                                    the module prolog).
+        delete_keys                 A list of keys to be removed from the
+                                    store.
+        """
+
+        rows = [(key, dump_value(value)) for key, value in values.items()]
+        cache = self.__get_cache()
+        # "begin immediate" takes the write lock at once so that no other
+        # process can change the store between our read and our write.
+        self.__connection.execute("begin immediate")
+        try:
+            self.__connection.executemany("insert or replace into kv"
+                                          + " (key, value) values (?, ?)",
+                                          rows)
+            self.__connection.executemany("delete from kv where key = ?",
+                                          [(key,) for key in delete_keys])
+            self.__connection.execute("commit")
+        except BaseException:
+            self.__connection.execute("rollback")
+            raise
+        # Our own commits do not change data_version, so update the cache.
+        for key, value in rows:
+            cache[key] = json.loads(value)
+        for key in delete_keys:
+            cache.pop(key, None)
+
+    def set(self,
+            key,
+            value):
+        r"""
+        Store the value for the key.
+
+        Description of argument(s):
+        key                         The key.
+        value                       The value to be stored.  See update for
+                                    details.
+        """
+
+        self.update({key: value})
+
+    def delete(self,
+               key):
+        r"""
+        Remove the key from the store.
+
+        Description of argument(s):
+        key                         The key to be removed.
+        """
+
+        self.update({}, [key])
+
+    def close(self):
+        r"""
+        Close the store.
+        """
+
+        self.__connection.close()
+        self.__cache = None
+
+
+def dump_value(value):
+    r"""
+    Return the value as a JSON string or, if it is not JSON serializable, its
+    str() representation as a JSON string.
+
+    Description of argument(s):
+    value                           The value to be converted.
+    """
+
+    try:
+        return json.dumps(value)
+    except (TypeError, ValueError):
+        # Non-string dictionary keys, sets, circular references, etc.
+        return json.dumps(str(value))
+
+
+# The stores opened by this process, keyed by file path.
+open_stores = {}
+open_stores_pid = os.getpid()
+
+
+def get_kv_store(file_path):
+    r"""
+    Return a kv_store object for the given file path, re-using one already
+    opened by this process if possible.
+
+    Description of argument(s):
+    file_path                       The path of the SQLite database file.
+    """
+
+    global open_stores
+    global open_stores_pid
+
+    # SQLite connections must not be used across a fork.
+    if open_stores_pid != os.getpid():
+        open_stores = {}
+        open_stores_pid = os.getpid()
+    file_path = os.path.abspath(file_path)
+    if file_path not in open_stores:
+        open_stores[file_path] = kv_store(file_path)
+    return open_stores[file_path]
+
+
+def close_kv_store(file_path):
+    r"""
+    Close the kv_store object for the given file path if this process has one
+    open (e.g. before the file is deleted).
+
+    Description of argument(s):
+    file_path                       The path of the SQLite database file.
+    """
+
+    file_path = os.path.abspath(file_path)
+    if open_stores_pid == os.getpid() and file_path in open_stores:
+        open_stores.pop(file_path).close()
@@ -21,6 +21,7 @@ from robot.utils import DotDict
 from robot.libraries.BuiltIn import BuiltIn
 
 from boot_data import *
+import boot_latency as bl
 import gen_print as gp
 import gen_robot_plug_in as grpi
 import gen_valid as gv
@@ -47,6 +48,13 @@ pgm_name = re.sub('\\.py$', '', os.path.basename(__file__))
 os_host = BuiltIn().get_variable_value("${OS_HOST}", default="")
 boot_table = create_boot_table(os_host=os_host)
 valid_boot_types = create_valid_boot_list(boot_table)
+# Compile the start and end states of every boot type once.  select_boot
+# consults these indexes rather than re-processing each boot type's regular
+# expressions on every boot.
+boot_start_index = st.match_state_index(
+    dict((boot, boot_table[boot]['start']) for boot in boot_table))
+boot_end_index = st.match_state_index(
+    dict((boot, boot_table[boot]['end']) for boot in boot_table))
 
 boot_lists = read_boot_lists()
 
@@ -54,6 +62,16 @@ boot_lists = read_boot_lists()
 max_boot_history = 10
 boot_history = []
 
+# Per-boot-type latency histograms for each phase of a boot test (e.g.
+# plug-in call points, the boot method, wait_state stages, FFDC).  If set,
+# BOOT_LATENCY_CSV_FILE_PATH and BOOT_LATENCY_PROM_FILE_PATH name files to
+# which the latency statistics are exported (as CSV and in Prometheus text
+# format respectively) after each boot.
+boot_latencies = bl.boot_latency()
+BOOT_LATENCY_CSV_FILE_PATH = os.environ.get('BOOT_LATENCY_CSV_FILE_PATH', '')
+BOOT_LATENCY_PROM_FILE_PATH = os.environ.get('BOOT_LATENCY_PROM_FILE_PATH',
+                                             '')
+
 state = st.return_state_constant('default_state')
 cp_setup_called = 0
 next_boot = ""
@@ -79,6 +97,7 @@ AUTOBOOT_FFDC_PREFIX = os.environ.get('AUTOBOOT_FFDC_PREFIX', '')
 ffdc_prefix = AUTOBOOT_FFDC_PREFIX
 boot_start_time = ""
 boot_end_time = ""
+boot_ffdc_file_list = []
 save_stack = vs.var_stack('save_stack')
 main_func_parm_list = ['boot_stack', 'stack_mode', 'quiet']
 
@@ -185,6 +204,7 @@ def process_pgm_parms():
     global boot_list
     global boot_stack
     global boot_results_file_path
+    global boot_journal_file_path
     global boot_results
     global boot_history
     global ffdc_list_file_path
@@ -203,13 +223,31 @@ def process_pgm_parms():
                                                            openbmc_nickname,
                                                            master_pid)
 
-    if os.path.isfile(boot_results_file_path):
+    boot_journal_file_path = create_boot_journal_file_path(pgm_name,
+                                                           openbmc_nickname,
+                                                           master_pid)
+
+    if os.path.isfile(boot_journal_file_path):
+        # We've been called before in this run (possibly by a call that was
+        # killed) so we'll rebuild the boot_results and boot_history objects
+        # from the boot journal.
+        boot_results, boot_history =\
+            load_boot_journal(boot_journal_file_path, boot_table, boot_pass,
+                              boot_fail, max_boot_history)
+        for record in read_boot_journal(boot_journal_file_path):
+            if record.get('type') == 'boot':
+                boot_latencies.add_phase_times(record['boot_type'],
+                                               record.get('phase_times', {}))
+    elif os.path.isfile(boot_results_file_path):
         # We've been called before in this run so we'll load the saved
         # boot_results and boot_history objects.
         boot_results, boot_history =\
             pickle.load(open(boot_results_file_path, 'rb'))
     else:
         boot_results = boot_results(boot_table, boot_pass, boot_fail)
+        append_boot_journal(boot_journal_file_path,
+                            {'type': 'init', 'boot_pass': boot_pass,
+                             'boot_fail': boot_fail})
 
     ffdc_list_file_path = base_tool_dir_path + openbmc_nickname +\
         "/FFDC_FILE_LIST"
@@ -578,7 +616,7 @@ def select_boot():
             if stack_mode == 'normal':
                 break
             else:
-                if st.compare_states(state, boot_table[boot_candidate]['end']):
+                if boot_candidate in boot_end_index.matches(state):
                     if not skip_boot_printed:
                         gp.qprint_var(stack_mode)
                         gp.qprintn()
@@ -594,7 +632,7 @@ def select_boot():
             gp.qprint_var(boot_stack)
             gp.qprint_dashes()
             return boot_candidate
-        if st.compare_states(state, boot_table[boot_candidate]['start']):
+        if boot_candidate in boot_start_index.matches(state):
             gp.qprint_timen("The machine state is valid for a '"
                             + boot_candidate + "' boot test.")
             gp.qprint_dashes()
@@ -612,12 +650,13 @@ def select_boot():
             popped_boot = boot_candidate
 
     # Loop through your list selecting a boot_candidates
+    valid_boots = boot_start_index.matches(state)
     boot_candidates = []
     for boot_candidate in boot_list:
-        if st.compare_states(state, boot_table[boot_candidate]['start']):
+        if boot_candidate in valid_boots:
             if stack_popped:
                 if st.compare_states(boot_table[boot_candidate]['end'],
-                                     boot_table[popped_boot]['start']):
+                                     boot_start_index[popped_boot]):
                     boot_candidates.append(boot_candidate)
             else:
                 boot_candidates.append(boot_candidate)
@@ -626,7 +665,7 @@ def select_boot():
         gp.qprint_timen("The user's boot list contained no boot tests"
                         + " which are valid for the current machine state.")
         boot_candidate = default_power_on
-        if not st.compare_states(state, boot_table[default_power_on]['start']):
+        if default_power_on not in valid_boots:
             boot_candidate = default_power_off
         boot_candidates.append(boot_candidate)
         gp.qprint_timen("Using default '" + boot_candidate
@@ -648,6 +687,8 @@ def print_defect_report(ffdc_file_list):
     ffdc_file_list  A list of files which were collected by our ffdc functions.
     """
 
+    global boot_ffdc_file_list
+
     # Making deliberate choice to NOT run plug_in_setup().  We don't want
     # ffdc_prefix updated.
     rc, shell_rc, failed_plug_in_name = grpi.rprocess_plug_in_packages(
@@ -685,6 +726,9 @@ def print_defect_report(ffdc_file_list):
     if status_file_path != "":
         ffdc_file_list.insert(0, status_file_path)
 
+    # Save the list to be recorded in the boot journal.
+    boot_ffdc_file_list = ffdc_file_list
+
     # Convert the list to a printable list.
     printable_ffdc_file_list = "\n".join(ffdc_file_list)
 
@@ -777,7 +821,21 @@ def print_test_start_message(boot_keyword):
 
     gp.qprint(doing_msg)
 
+    add_boot_history(doing_msg)
+
+
+def add_boot_history(doing_msg):
+    r"""
+    Add the message to boot_history and record it in the boot journal.
+
+    Description of arguments:
+    doing_msg  The message to be added (e.g. "#(CDT) 2019/02/26
+               10:13:03.383480 -    0.000000 - Doing "REST Power On".").
+    """
+
     update_boot_history(boot_history, doing_msg, max_boot_history)
+    append_boot_journal(boot_journal_file_path,
+                        {'type': 'history', 'message': doing_msg})
 
 
 def stop_boot_test(signal_number=0,
@@ -823,8 +881,9 @@ def run_boot(boot):
     print_test_start_message(boot)
 
     plug_in_setup()
-    rc, shell_rc, failed_plug_in_name = \
-        grpi.rprocess_plug_in_packages(call_point="pre_boot")
+    with boot_latencies.time_phase("pre_boot"):
+        rc, shell_rc, failed_plug_in_name = \
+            grpi.rprocess_plug_in_packages(call_point="pre_boot")
     if rc != 0:
         error_message = "Plug-in failed with non-zero return code.\n" +\
             gp.sprint_var(rc, fmt=gp.hexa())
@@ -842,15 +901,18 @@ def run_boot(boot):
         gp.qprintn()
 
         if boot_table[boot]['method_type'] == "keyword":
-            rk.my_run_keywords(boot_table[boot].get('lib_file_path', ''),
-                               boot_table[boot]['method'],
-                               quiet=quiet)
+            with boot_latencies.time_phase("boot_method"):
+                rk.my_run_keywords(boot_table[boot].get('lib_file_path', ''),
+                                   boot_table[boot]['method'],
+                                   quiet=quiet)
 
         if boot_table[boot]['bmc_reboot']:
-            st.wait_for_comm_cycle(int(state['epoch_seconds']))
+            with boot_latencies.time_phase("wait_comm_cycle"):
+                st.wait_for_comm_cycle(int(state['epoch_seconds']))
             plug_in_setup()
-            rc, shell_rc, failed_plug_in_name = \
-                grpi.rprocess_plug_in_packages(call_point="post_reboot")
+            with boot_latencies.time_phase("post_reboot"):
+                rc, shell_rc, failed_plug_in_name = \
+                    grpi.rprocess_plug_in_packages(call_point="post_reboot")
             if rc != 0:
                 error_message = "Plug-in failed with non-zero return code.\n"
                 error_message += gp.sprint_var(rc, fmt=gp.hexa())
@@ -860,20 +922,28 @@ def run_boot(boot):
             match_state = st.anchor_state(state)
             del match_state['epoch_seconds']
             # Wait for the state to change in any way.
-            st.wait_state(match_state, wait_time=state_change_timeout,
-                          interval="10 seconds", invert=1)
+            with boot_latencies.time_phase("wait_state_change"):
+                st.wait_state(match_state, wait_time=state_change_timeout,
+                              interval="10 seconds", invert=1)
 
         gp.qprintn()
         if boot_table[boot]['end']['chassis'] == "Off":
             boot_timeout = power_off_timeout
         else:
             boot_timeout = power_on_timeout
-        st.wait_state(boot_table[boot]['end'], wait_time=boot_timeout,
-                      interval="10 seconds")
+        # Record how long each stage of the end state (e.g. chassis on, host
+        # running, OS ping, OS login) took to be reached.
+        stage_times = {}
+        with boot_latencies.time_phase("wait_end_state"):
+            st.wait_state(boot_table[boot]['end'], wait_time=boot_timeout,
+                          interval="10 seconds", stage_times=stage_times)
+        for key, seconds in stage_times.items():
+            boot_latencies.record("wait_" + key, seconds)
 
     plug_in_setup()
-    rc, shell_rc, failed_plug_in_name = \
-        grpi.rprocess_plug_in_packages(call_point="post_boot")
+    with boot_latencies.time_phase("post_boot"):
+        rc, shell_rc, failed_plug_in_name = \
+            grpi.rprocess_plug_in_packages(call_point="post_boot")
     if rc != 0:
         error_message = "Plug-in failed with non-zero return code.\n" +\
             gp.sprint_var(rc, fmt=gp.hexa())
@@ -897,6 +967,7 @@ def test_loop_body():
     global next_boot
     global boot_success
     global boot_end_time
+    global boot_ffdc_file_list
 
     gp.qprintn()
 
@@ -905,14 +976,19 @@ def test_loop_body():
         return True
 
     boot_count += 1
+    boot_ffdc_file_list = []
     gp.qprint_timen("Starting boot " + str(boot_count) + ".")
 
     pre_boot_plug_in_setup()
 
+    boot_latencies.start_boot(next_boot)
+    boot_start_seconds = time.time()
     cmd_buf = ["run_boot", next_boot]
     boot_status, msg = BuiltIn().run_keyword_and_ignore_error(*cmd_buf)
     if boot_status == "FAIL":
         gp.qprint(msg)
+    else:
+        boot_latencies.record("boot", time.time() - boot_start_seconds)
 
     gp.qprintn()
     if boot_status == "PASS":
@@ -935,27 +1011,40 @@ def test_loop_body():
     plug_in_setup()
     # NOTE: A post_test_case call point failure is NOT counted as a boot
     # failure.
-    rc, shell_rc, failed_plug_in_name = grpi.rprocess_plug_in_packages(
-        call_point='post_test_case', stop_on_plug_in_failure=0)
+    with boot_latencies.time_phase("post_test_case"):
+        rc, shell_rc, failed_plug_in_name = grpi.rprocess_plug_in_packages(
+            call_point='post_test_case', stop_on_plug_in_failure=0)
 
     plug_in_setup()
-    rc, shell_rc, failed_plug_in_name = grpi.rprocess_plug_in_packages(
-        call_point='ffdc_check', shell_rc=dump_ffdc_rc(),
-        stop_on_plug_in_failure=1, stop_on_non_zero_rc=1)
+    with boot_latencies.time_phase("ffdc_check"):
+        rc, shell_rc, failed_plug_in_name = grpi.rprocess_plug_in_packages(
+            call_point='ffdc_check', shell_rc=dump_ffdc_rc(),
+            stop_on_plug_in_failure=1, stop_on_non_zero_rc=1)
     if ffdc_check == "All" or\
        shell_rc == dump_ffdc_rc():
-        status, ret_values = grk.run_key_u("my_ffdc", ignore=1)
+        with boot_latencies.time_phase("ffdc"):
+            status, ret_values = grk.run_key_u("my_ffdc", ignore=1)
         if status != 'PASS':
             gp.qprint_error("Call to my_ffdc failed.\n")
             # Leave a record for caller that "soft" errors occurred.
             soft_errors = 1
             gpu.save_plug_in_value(soft_errors, pgm_name)
 
+    append_boot_journal(boot_journal_file_path,
+                        {'type': 'boot', 'boot_type': next_boot,
+                         'status': boot_status,
+                         'start_time': boot_start_time,
+                         'end_time': boot_end_time,
+                         'ffdc_file_list': boot_ffdc_file_list,
+                         'phase_times': boot_latencies.end_boot()})
+
     if delete_errlogs:
         # We need to purge error logs between boots or they build up.
         grk.run_key("Delete Error logs", ignore=1)
 
     boot_results.print_report()
+    boot_latencies.print_report()
+    export_boot_latencies()
     gp.qprint_timen("Finished boot " + str(boot_count) + ".")
 
     plug_in_setup()
@@ -973,6 +1062,24 @@ def test_loop_body():
     return True
 
 
+def export_boot_latencies():
+    r"""
+    Write the boot latency statistics to the files named by
+    BOOT_LATENCY_CSV_FILE_PATH and BOOT_LATENCY_PROM_FILE_PATH (if set).
+    """
+
+    try:
+        if BOOT_LATENCY_CSV_FILE_PATH != "":
+            boot_latencies.write_csv(BOOT_LATENCY_CSV_FILE_PATH)
+        if BOOT_LATENCY_PROM_FILE_PATH != "":
+            boot_latencies.write_prometheus(
+                BOOT_LATENCY_PROM_FILE_PATH,
+                {'openbmc_nickname': openbmc_nickname})
+    except (IOError, OSError) as exception:
+        gp.qprint_error("Failed to export boot latencies: " + str(exception)
+                        + "\n")
+
+
 def obmc_boot_test_teardown():
     r"""
     Clean up after the Main keyword.
@@ -1045,7 +1152,7 @@ def post_stack():
                                        stop_on_plug_in_failure=0,
                                        return_history=True)
     for doing_msg in history:
-        update_boot_history(boot_history, doing_msg, max_boot_history)
+        add_boot_history(doing_msg)
     if rc != 0:
         boot_success = 0
 
@@ -13,6 +13,11 @@ import state as st
 
 from robot.libraries.BuiltIn import BuiltIn
 
+# FFDC_PARALLEL indicates whether the ffdc function should use the
+# parallel_ffdc module to collect the kinds of FFDC listed in
+# parallel_ffdc.parallel_ffdc_methods.  This is off by default.
+FFDC_PARALLEL = int(os.environ.get('FFDC_PARALLEL', 0))
+
 
 def ffdc(ffdc_dir_path=None,
          ffdc_prefix=None,
@@ -83,12 +88,24 @@ def ffdc(ffdc_dir_path=None,
     BuiltIn().set_global_variable("${FFDC_FILE_PATH}", FFDC_FILE_PATH)
 
     status, ffdc_file_list = grk.run_key_u("Header Message")
-    status, ffdc_file_sub_list = \
-        grk.run_key_u("Call FFDC Methods  ffdc_function_list="
-                      + ffdc_function_list)
+    if FFDC_PARALLEL:
+        # Collect the SSH-based FFDC from the BMC and OS concurrently and
+        # leave the rest to Call FFDC Methods.  parallel_ffdc (and therefore
+        # paramiko) is imported here so that it is only required when it is
+        # used.
+        import parallel_ffdc as pf
+        ffdc_file_sub_list, remaining_function_list = \
+            pf.parallel_ffdc(ffdc_function_list)
+        ffdc_file_list += ffdc_file_sub_list
+        ffdc_function_list = ":".join(remaining_function_list)
+    if not FFDC_PARALLEL or ffdc_function_list != "":
+        status, ffdc_file_sub_list = \
+            grk.run_key_u("Call FFDC Methods  ffdc_function_list="
+                          + ffdc_function_list)
+        ffdc_file_list += ffdc_file_sub_list
 
     # Combine lists, remove duplicates and sort.
-    ffdc_file_list = sorted(set(ffdc_file_list + ffdc_file_sub_list))
+    ffdc_file_list = sorted(set(ffdc_file_list))
 
     gp.qprint_timen("Finished collecting FFDC.")
 
@@ -0,0 +1,368 @@
+#!/usr/bin/env python
+
+r"""
+This module provides functions which collect the SSH-based kinds of FFDC data
+(see FFDC_METHOD_CALL in openbmc_ffdc_list.py) from the BMC and from the OS
+concurrently.
+
+Rather than running each FFDC command in turn and then copying each
+resulting /tmp file back via scp, the commands of each group are run in
+parallel over one persistent SSH session (see ssh_session_pool.py), each
+with its own time budget.  The resulting files are then gathered remotely
+into a single tar stream which is pulled back in one transfer and unpacked
+into the FFDC directory.
+"""
+
+import os
+import tarfile
+import functools
+import collections
+
+import gen_print as gp
+import state as st
+import ssh_session_pool as ssp
+import openbmc_ffdc_list as ffdc_list
+import journal_capture as jc
+
+from robot.libraries.BuiltIn import BuiltIn
+
+# The FFDC_METHOD_CALL descriptions which are handled by this module.
+parallel_ffdc_methods = ['FFDC Generic Report', 'BMC Specific Files',
+                         'BMC Journal', 'OS FFDC']
+
+# The value of FOOTER_MSG from openbmc_ffdc_utils.robot.
+footer_msg = "\n" + "-" * 72 + " \n"
+
+
+def get_host_args(host_var_name,
+                  username_var_name,
+                  password_var_name):
+    r"""
+    Return a dictionary of host, username and password values obtained from
+    the given robot global variables or None if any of them are blank.
+
+    Description of argument(s):
+    host_var_name                   The name of the robot variable containing
+                                    the host name (e.g. "OPENBMC_HOST").
+    username_var_name               The name of the robot variable containing
+                                    the user name.
+    password_var_name               The name of the robot variable containing
+                                    the password.
+    """
+
+    host_args = collections.OrderedDict()
+    for key, var_name in (('host', host_var_name),
+                          ('username', username_var_name),
+                          ('password', password_var_name)):
+        host_args[key] = BuiltIn().get_variable_value("${" + var_name + "}",
+                                                      default="")
+        if host_args[key] in ("", None):
+            return None
+    return host_args
+
+
+def run_ffdc_cmds(host_args,
+                  cmd_bufs,
+                  time_out=None):
+    r"""
+    Run the given FFDC commands concurrently on the given host and return a
+    list of (stdout, stderr, rc) tuples in the same order as cmd_bufs.
+
+    Description of argument(s):
+    host_args                       A dictionary of host, username and
+                                    password values (see get_host_args).
+    cmd_bufs                        A list of command strings to be run.
+    time_out                        The number of seconds to allow for each
+                                    command.
+    """
+
+    return ssp.pool_execute_commands(cmd_bufs, time_out=time_out, **host_args)
+
+
+def pull_remote_files(host_args,
+                      file_names,
+                      local_prefix,
+                      remote_dir_path="/tmp",
+                      time_out=None,
+                      local_name_prefixes={}):
+    r"""
+    Copy the given remote files to the local system via a single tar stream
+    and return a list of the local file paths created.
+
+    Remote files which do not exist are skipped.
+
+    Description of argument(s):
+    host_args                       A dictionary of host, username and
+                                    password values (see get_host_args).
+    file_names                      A list of the names of the files to be
+                                    copied.  These may contain shell wildcards
+                                    (e.g. "sosreport*FFDC*.tar.xz").
+    local_prefix                    The prefix to be given to each local file
+                                    path (e.g. LOG_PREFIX).
+    remote_dir_path                 The remote directory containing the files.
+    time_out                        The number of seconds to allow for the
+                                    transfer.
+    local_name_prefixes             A dictionary mapping remote file name
+                                    prefixes to additional local file name
+                                    prefixes (e.g. {'sosreport': 'OS_'}).
+    """
+
+    if not file_names:
+        return []
+
+    cmd_buf = "cd " + remote_dir_path + " && tar -cf - " \
+        + " ".join(file_names) + " 2>/dev/null"
+    tar_file_path = local_prefix + "ffdc_files." + str(os.getpid()) + "." \
+        + host_args['host'] + ".tar"
+
+    local_file_paths = []
+    try:
+        with open(tar_file_path, 'w+b') as tar_file:
+            ssp.pool_execute_command(cmd_buf, time_out=time_out,
+                                     stdout_file=tar_file, **host_args)
+            tar_file.seek(0)
+            try:
+                tar = tarfile.open(fileobj=tar_file, mode='r|')
+            except tarfile.ReadError:
+                # None of the files exist.
+                return local_file_paths
+            with tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    file_name = os.path.basename(member.name)
+                    for name_prefix, local_name_prefix \
+                            in local_name_prefixes.items():
+                        if file_name.startswith(name_prefix):
+                            file_name = local_name_prefix + file_name
+                            break
+                    local_file_path = local_prefix + file_name
+                    with open(local_file_path, 'wb') as local_file:
+                        buffer = tar.extractfile(member)
+                        for data in iter(lambda: buffer.read(65536), b""):
+                            local_file.write(data)
+                    local_file_paths.append(local_file_path)
+    finally:
+        if os.path.exists(tar_file_path):
+            os.remove(tar_file_path)
+
+    return local_file_paths
+
+
+def bmc_ffdc_manifest(host_args,
+                      ffdc_file_path,
+                      time_out=None):
+    r"""
+    Run the commands from FFDC_BMC_CMD concurrently and append their output
+    to the FFDC report file in list order.  Return a list of generated files.
+
+    This is the parallel counterpart to the "BMC FFDC Manifest" keyword.
+
+    Description of argument(s):
+    host_args                       A dictionary of host, username and
+                                    password values for the BMC.
+    ffdc_file_path                  The path of the FFDC report file.
+    time_out                        The number of seconds to allow for each
+                                    command.
+    """
+
+    cmd_list = [(index, name_str, cmd_buf)
+                for index in ffdc_list.FFDC_BMC_CMD
+                for name_str, cmd_buf in ffdc_list.FFDC_BMC_CMD[index].items()]
+    results = run_ffdc_cmds(host_args, [cmd[2] for cmd in cmd_list],
+                            time_out)
+
+    with open(ffdc_file_path, 'a') as ffdc_file:
+        for (index, name_str, cmd_buf), (stdout, stderr, rc) \
+                in zip(cmd_list, results):
+            ffdc_file.write(footer_msg + index.upper() + " : " + name_str
+                            + "\t" + "Executed : " + cmd_buf + footer_msg)
+            if stderr == "":
+                ffdc_file.write(stdout + "\n")
+            else:
+                ffdc_file.write("ERROR output:\n" + stderr + "\nOutput:\n"
+                                + stdout + "\n")
+
+    return [ffdc_file_path]
+
+
+def bmc_ffdc_files(host_args,
+                   log_prefix,
+                   time_out=None):
+    r"""
+    Run the commands from FFDC_BMC_FILE concurrently, copy the resulting files
+    from the BMC and return a list of generated files.
+
+    This is the parallel counterpart to the "BMC FFDC Files" keyword.
+
+    Description of argument(s):
+    host_args                       A dictionary of host, username and
+                                    password values for the BMC.
+    log_prefix                      The prefix to be given to each FFDC file
+                                    path.
+    time_out                        The number of seconds to allow for each
+                                    command.
+    """
+
+    cmd_list = [cmd for index in ffdc_list.FFDC_BMC_FILE
+                for cmd in ffdc_list.FFDC_BMC_FILE[index].items()]
+    run_ffdc_cmds(host_args, [cmd[1] for cmd in cmd_list], time_out)
+    try:
+        return pull_remote_files(host_args,
+                                 [cmd[0] + ".txt" for cmd in cmd_list],
+                                 log_prefix, time_out=time_out)
+    finally:
+        ssp.pool_execute_command("rm -rf /tmp/BMC_*", **host_args)
+
+
+def os_ffdc_files(host_args,
+                  log_prefix,
+                  linux_distro="",
+                  time_out=None):
+    r"""
+    Run the commands from FFDC_OS_ALL_DISTROS_FILE and FFDC_OS_<distro>_FILE
+    concurrently, copy the resulting files (including any sosreport) from the
+    OS and return a list of generated files.
+
+    This is the parallel counterpart to the "OS FFDC Files" keyword.
+
+    Description of argument(s):
+    host_args                       A dictionary of host, username and
+                                    password values for the OS.
+    log_prefix                      The prefix to be given to each FFDC file
+                                    path.
+    linux_distro                    The OS's linux distro (e.g. "ubuntu",
+                                    "rhel").
+    time_out                        The number of seconds to allow for each
+                                    command.
+    """
+
+    ffdc_dicts = [ffdc_list.FFDC_OS_ALL_DISTROS_FILE]
+    if linux_distro not in ("", None, "None"):
+        ffdc_dicts.append(getattr(ffdc_list, "FFDC_OS_"
+                                  + str(linux_distro).upper() + "_FILE", {}))
+    cmd_list = [cmd for ffdc_dict in ffdc_dicts for index in ffdc_dict
+                for cmd in ffdc_dict[index].items()]
+    run_ffdc_cmds(host_args, [cmd[1] for cmd in cmd_list], time_out)
+    try:
+        return pull_remote_files(host_args,
+                                 [cmd[0] + ".txt" for cmd in cmd_list]
+                                 + ["sosreport*FFDC*.tar.xz"],
+                                 log_prefix, time_out=time_out,
+                                 local_name_prefixes={'sosreport': 'OS_'})
+    finally:
+        ssp.pool_execute_command("rm -rf /tmp/OS_* /tmp/sosreport*FFDC*",
+                                 **host_args)
+
+
+def parallel_ffdc(ffdc_function_list=""):
+    r"""
+    Collect the kinds of FFDC listed in parallel_ffdc_methods concurrently and
+    return a list of generated files along with a list of the requested FFDC
+    descriptions which remain to be collected by "Call FFDC Methods".
+
+    The BMC and OS groups run at the same time.  Within each group, the
+    commands run in parallel with each being allowed FFDC_CMD_TIMEOUT
+    seconds.
+
+    The caller must have set the LOG_PREFIX and FFDC_FILE_PATH global
+    variables (see openbmc_ffdc.ffdc).
+
+    Description of argument(s):
+    ffdc_function_list              A colon-delimited list of the kinds of
+                                    FFDC to be collected.  A blank value
+                                    means that all kinds of FFDC are to be
+                                    collected.
+    """
+
+    if ffdc_function_list == "":
+        ffdc_function_list = [description
+                              for index in ffdc_list.FFDC_METHOD_CALL
+                              for description in
+                              ffdc_list.FFDC_METHOD_CALL[index]]
+    else:
+        ffdc_function_list = ffdc_function_list.split(":")
+
+    remaining_function_list = [description
+                               for description in ffdc_function_list
+                               if description not in parallel_ffdc_methods]
+
+    log_prefix = BuiltIn().get_variable_value("${LOG_PREFIX}")
+    ffdc_file_path = BuiltIn().get_variable_value("${FFDC_FILE_PATH}")
+    time_out = int(BuiltIn().get_variable_value("${FFDC_CMD_TIMEOUT}",
+                                                default=240))
+
+    # All robot interaction is done here, in the main thread, before the
+    # groups are started.
+    groups = collections.OrderedDict()
+    bmc_host_args = get_host_args("OPENBMC_HOST", "OPENBMC_USERNAME",
+                                  "OPENBMC_PASSWORD")
+    if bmc_host_args is not None:
+        if 'FFDC Generic Report' in ffdc_function_list:
+            groups['FFDC Generic Report'] = \
+                (bmc_ffdc_manifest, (bmc_host_args, ffdc_file_path, time_out))
+        if 'BMC Specific Files' in ffdc_function_list:
+            groups['BMC Specific Files'] = \
+                (bmc_ffdc_files, (bmc_host_args, log_prefix, time_out))
+        if 'BMC Journal' in ffdc_function_list:
+            groups['BMC Journal'] = \
+                (jc.capture_journal, (bmc_host_args, log_prefix, time_out))
+
+    if 'OS FFDC' in ffdc_function_list:
+        os_host_args = get_host_args("OS_HOST", "OS_USERNAME", "OS_PASSWORD")
+        if os_host_args is None:
+            gp.qprint_timen("No OS Host provided so no OS FFDC will be done.")
+        else:
+            state = st.get_state(req_states=['os_ping', 'os_login',
+                                             'os_run_cmd'], quiet=1)
+            if not (int(state['os_ping']) and int(state['os_login'])
+                    and int(state['os_run_cmd'])):
+                gp.qprint_timen("The OS is not communicating so no OS FFDC"
+                                + " will be done.\n")
+            else:
+                linux_distro, stderr, rc = ssp.pool_execute_command(
+                    ". /etc/os-release; echo $ID", **os_host_args)
+                BuiltIn().set_global_variable("${linux_distro}",
+                                              linux_distro)
+                gp.qprint_var(linux_distro)
+                groups['OS FFDC'] = \
+                    (os_ffdc_files, (os_host_args, log_prefix, linux_distro,
+                                     time_out))
+
+    ffdc_file_list = []
+    if not groups:
+        return ffdc_file_list, remaining_function_list
+
+    # concurrent.futures is imported here rather than at module level because
+    # python 2 only has it if the "futures" backport is installed.  Without
+    # it, the groups are collected one at a time.
+    try:
+        from concurrent import futures
+    except ImportError:
+        futures = None
+
+    def add_results(description, get_results):
+        try:
+            ffdc_file_list.extend(get_results())
+        except Exception as exception:
+            # Don't let one failure prevent the collection of the rest.
+            gp.print_error("Collection of \"" + description + "\" FFDC"
+                           + " failed: " + str(exception) + "\n")
+
+    if futures is None:
+        gp.qprint_timen("Collecting the following FFDC: "
+                        + ", ".join(groups.keys()) + ".")
+        for description, (func, args) in groups.items():
+            add_results(description, functools.partial(func, *args))
+        return ffdc_file_list, remaining_function_list
+
+    gp.qprint_timen("Collecting the following FFDC concurrently: "
+                    + ", ".join(groups.keys()) + ".")
+    with futures.ThreadPoolExecutor(max_workers=len(groups)) as executor:
+        group_futures = collections.OrderedDict(
+            (description, executor.submit(func, *args))
+            for description, (func, args) in groups.items())
+        for description, future in group_futures.items():
+            add_results(description, future.result)
+
+    return ffdc_file_list, remaining_function_list
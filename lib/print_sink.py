@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+r"""
+This module provides a buffered, asynchronous output sink for the print
+functions in gen_print.py.
+
+When active, the print functions merely place their output on a bounded queue
+and return.  A background writer thread takes the output from the queue,
+batches consecutive output bound for the same stream into a single write and
+flushes the streams periodically.  Thus, the print path does not block on a
+slow console, pipe or NFS-mounted log file (unless the writer has fallen so
+far behind that the queue is full).
+
+Since all output (stdout, stderr and log) passes through one queue, the order
+of the output is preserved.
+"""
+
+import sys
+import time
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class print_sink:
+    r"""
+    Write output to streams via a background writer thread.
+    """
+
+    def __init__(self,
+                 write_func,
+                 flush_func,
+                 max_queue_size=10000,
+                 batch_size=500,
+                 flush_interval=0.5):
+        r"""
+        Create and start the print sink.
+
+        Description of argument(s):
+        write_func                  The function to be called to write a
+                                    buffer to a stream.  It will be called as
+                                    write_func(buffer, stream).
+        flush_func                  The function to be called to flush a
+                                    stream.  It will be called as
+                                    flush_func(stream).
+        max_queue_size              The maximum number of buffers which may
+                                    be queued.  When the queue is full, the
+                                    caller will wait for the writer to make
+                                    room.
+        batch_size                  The maximum number of buffers to be
+                                    written per batch.
+        flush_interval              The maximum number of seconds which may
+                                    elapse between flushes of the streams
+                                    while the writer is busy.  The writer
+                                    always flushes when the queue is empty.
+        """
+
+        self.__write_func = write_func
+        self.__flush_func = flush_func
+        self.__batch_size = batch_size
+        self.__flush_interval = flush_interval
+        self.__queue = queue.Queue(max_queue_size)
+        self.__thread = threading.Thread(target=self.__writer,
+                                         name="print_sink")
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def is_active(self):
+        r"""
+        Return True if the writer thread is running.
+        """
+
+        return self.__thread.is_alive()
+
+    def write(self,
+              buffer,
+              stream='stdout'):
+        r"""
+        Queue the buffer to be written to the stream.
+
+        If the writer thread is not running (e.g. after close), the buffer is
+        written directly.
+
+        Description of argument(s):
+        buffer                      The string to be written.
+        stream                      The name of the stream (e.g. "stdout",
+                                    "stderr", "log").  This is passed to
+                                    write_func and flush_func.
+        """
+
+        if not self.__thread.is_alive():
+            self.__write_func(buffer, stream)
+            self.__flush_func(stream)
+            return
+        self.__queue.put((stream, buffer))
+
+    def flush(self):
+        r"""
+        Wait until all queued output has been written and flushed.
+        """
+
+        if threading.current_thread() is self.__thread:
+            return
+        if self.__thread.is_alive():
+            self.__queue.join()
+        else:
+            self.__drain()
+
+    def close(self):
+        r"""
+        Write all queued output and stop the writer thread.
+        """
+
+        if threading.current_thread() is self.__thread:
+            return
+        if self.__thread.is_alive():
+            self.__queue.put(None)
+            self.__thread.join()
+        self.__drain()
+
+    def __drain(self):
+        r"""
+        Write any output remaining in the queue from the calling thread.
+        """
+
+        while True:
+            try:
+                item = self.__queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                for stream in self.__write_batch([item]):
+                    self.__flush_func(stream)
+            self.__queue.task_done()
+
+    def __write_batch(self,
+                      batch):
+        r"""
+        Write the batch of queued items and return a list of the streams
+        written to.
+
+        Consecutive items for the same stream (other than "log", whose
+        buffers must remain separate records) are combined into one write.
+
+        Description of argument(s):
+        batch                       A list of (stream, buffer) tuples.
+        """
+
+        streams = []
+        ix = 0
+        while ix < len(batch):
+            stream = batch[ix][0]
+            end_ix = ix + 1
+            if stream != 'log':
+                while end_ix < len(batch) and batch[end_ix][0] == stream:
+                    end_ix += 1
+            self.__write_func("".join([item[1] for item in batch[ix:end_ix]]),
+                              stream)
+            if stream not in streams:
+                streams.append(stream)
+            ix = end_ix
+        return streams
+
+    def __writer(self):
+        r"""
+        Take output from the queue and write it until close is called.
+        """
+
+        last_flush_time = time.time()
+        unflushed_streams = []
+        while True:
+            item = self.__queue.get()
+            batch = [item]
+            while item is not None and len(batch) < self.__batch_size:
+                try:
+                    item = self.__queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+            done = batch[-1] is None
+            if done:
+                batch.pop()
+
+            try:
+                for stream in self.__write_batch(batch):
+                    if stream not in unflushed_streams:
+                        unflushed_streams.append(stream)
+                # Flush if the queue has run dry, the flush interval has
+                # elapsed or we are done.  Otherwise, the next batch can be
+                # written without the cost of a flush.
+                if done or self.__queue.empty() \
+                   or time.time() - last_flush_time >= self.__flush_interval:
+                    for stream in unflushed_streams:
+                        self.__flush_func(stream)
+                    unflushed_streams = []
+                    last_flush_time = time.time()
+            except Exception as exception:
+                sys.__stderr__.write("print_sink: " + str(exception) + "\n")
+            for item in batch:
+                self.__queue.task_done()
+            if done:
+                self.__queue.task_done()
+                return
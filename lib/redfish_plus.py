@@ -4,10 +4,20 @@ r"""
 See redfish_plus class prolog below for details.
 """
 
+import os
+import re
+import time
+import threading
+import collections
 from redfish.rest.v1 import HttpClient
 import gen_print as gp
 import func_args as fa
 
+# Setting REDFISH_RESPONSE_CACHE to 1 causes every redfish_plus object to
+# enable its response cache when it is created.  See redfish_response_cache
+# for details.
+REDFISH_RESPONSE_CACHE = int(os.environ.get('REDFISH_RESPONSE_CACHE', 0))
+
 
 def valid_http_status_code(status, valid_status_codes):
     r"""
@@ -37,6 +47,168 @@ def valid_http_status_code(status, valid_status_codes):
     raise ValueError(message)
 
 
+class redfish_response_cache(object):
+    r"""
+    Define the redfish response cache class.
+
+    A redfish response cache holds the responses to GET requests keyed by
+    URI.  It has the following features:
+    - Each cached response is considered fresh for a time-to-live (TTL) which
+      is determined by the first matching regex in the ttl_patterns list.
+      Fresh responses are returned without contacting the BMC.
+    - Once a response is stale, the GET is re-issued with an If-None-Match
+      header containing the response's ETag (if it had one).  If the BMC
+      replies with 304 (Not Modified), the cached response is returned and
+      is considered fresh again.
+    - When the cache is full, the least recently used response is evicted.
+    - A POST, PATCH, PUT or DELETE request for a URI invalidates the cached
+      responses for that URI, for any URI under it and for any URI above it
+      (e.g. a collection whose Members list may have changed).
+    - Hit, revalidation, miss and invalidation counts are kept (see
+      get_stats).
+    """
+
+    def __init__(self,
+                 max_entries=256,
+                 ttl_patterns=None,
+                 default_ttl=0):
+        r"""
+        Initialize the cache.
+
+        Description of argument(s):
+        max_entries                 The maximum number of responses to be
+                                    held in the cache.
+        ttl_patterns                A list of (regex, ttl) tuples or an
+                                    ordered dictionary of regex/ttl pairs
+                                    (e.g. [('^/redfish/v1/Systems/system$',
+                                    10)]).
+                                    The ttl of the first regex which matches
+                                    a URI is the number of seconds for which
+                                    a response for that URI is considered
+                                    fresh.
+        default_ttl                 The ttl for URIs which match none of the
+                                    ttl_patterns.  The default value of 0
+                                    means that every GET is revalidated with
+                                    the BMC.
+        """
+
+        self.__max_entries = int(max_entries)
+        # Note that source_to_object converts a string such as "[('regex',
+        # 10)]" to an OrderedDict.
+        ttl_patterns = fa.source_to_object(ttl_patterns) or []
+        if isinstance(ttl_patterns, dict):
+            ttl_patterns = list(ttl_patterns.items())
+        self.__ttl_patterns = [(re.compile(regex), float(ttl))
+                               for regex, ttl in ttl_patterns]
+        self.__default_ttl = float(default_ttl)
+        # Each entry is a [response, etag, expiration_time] list.
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+        self.__stats = collections.OrderedDict([('hits', 0),
+                                                ('revalidations', 0),
+                                                ('misses', 0),
+                                                ('invalidations', 0),
+                                                ('evictions', 0)])
+
+    def get_ttl(self, uri):
+        r"""
+        Return the time-to-live for responses for the given URI.
+
+        Description of argument(s):
+        uri                         A URI (e.g. "/redfish/v1/Systems/system").
+        """
+
+        for regex, ttl in self.__ttl_patterns:
+            if regex.search(uri):
+                return ttl
+        return self.__default_ttl
+
+    def get(self, func, path, **kwargs):
+        r"""
+        Return the response for a GET of path, either from the cache or by
+        calling func.
+
+        Description of argument(s):
+        func                        The parent class get function.
+        path                        The URI to be gotten.
+        kwargs                      Any additional keyword arguments to be
+                                    passed to func (e.g. headers).
+        """
+
+        uri = path.rstrip('/')
+        with self.__lock:
+            entry = self.__entries.get(uri)
+            if entry is not None:
+                self.__entries.move_to_end(uri)
+                if time.time() < entry[2]:
+                    self.__stats['hits'] += 1
+                    return entry[0]
+
+        if entry is not None and entry[1] is not None:
+            headers = dict(kwargs.get('headers') or {})
+            headers['If-None-Match'] = entry[1]
+            kwargs['headers'] = headers
+        response = func(path, **kwargs)
+
+        with self.__lock:
+            if entry is not None and response.status == 304:
+                self.__stats['revalidations'] += 1
+                entry[2] = time.time() + self.get_ttl(uri)
+                return entry[0]
+            self.__stats['misses'] += 1
+            if response.status != 200:
+                self.__entries.pop(uri, None)
+                return response
+            try:
+                etag = response.getheader('ETag')
+            except (AttributeError, KeyError):
+                etag = None
+            self.__entries[uri] = [response, etag,
+                                   time.time() + self.get_ttl(uri)]
+            self.__entries.move_to_end(uri)
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+                self.__stats['evictions'] += 1
+
+        return response
+
+    def invalidate(self, path):
+        r"""
+        Remove the cached responses for the given URI, for any URIs under it
+        and for any URIs above it.
+
+        Description of argument(s):
+        path                        The URI which has been modified (e.g.
+                                    "/redfish/v1/Systems/system").
+        """
+
+        uri = path.rstrip('/')
+        with self.__lock:
+            for cached_uri in list(self.__entries):
+                if cached_uri == uri or cached_uri.startswith(uri + '/') \
+                        or uri.startswith(cached_uri + '/'):
+                    del self.__entries[cached_uri]
+                    self.__stats['invalidations'] += 1
+
+    def clear(self):
+        r"""
+        Remove all responses from the cache.
+        """
+
+        with self.__lock:
+            self.__entries.clear()
+
+    def get_stats(self):
+        r"""
+        Return a dictionary of the cache's statistics.
+        """
+
+        with self.__lock:
+            stats = collections.OrderedDict(self.__stats)
+            stats['entries'] = len(self.__entries)
+        return stats
+
+
 class redfish_plus(HttpClient):
     r"""
     redfish_plus is a wrapper for redfish rest that provides the following
@@ -47,10 +219,65 @@ class redfish_plus(HttpClient):
         - Automatic valid_status_codes processing (i.e. an exception will be
           raised if the rest response status code is not as expected.
         - Easily used from robot programs.
+        - An optional response cache (see enable_cache).
     """
 
     ROBOT_LIBRARY_SCOPE = 'TEST SUITE'
 
+    # This is set by enable_cache.
+    response_cache = None
+
+    def __init__(self, *args, **kwargs):
+        r"""
+        Do redfish_plus initialization.
+
+        Description of argument(s):
+        args                        See parent class __init__ for details.
+        kwargs                      See parent class __init__ for details.
+        """
+
+        super(redfish_plus, self).__init__(*args, **kwargs)
+        if REDFISH_RESPONSE_CACHE:
+            self.enable_cache()
+
+    def enable_cache(self, max_entries=256, ttl_patterns=None, default_ttl=0):
+        r"""
+        Enable caching of GET responses.  See redfish_response_cache for
+        details.
+
+        Example robot code:
+
+        Redfish.Enable Cache  ttl_patterns=[('/Systems/system$', 10)]
+        ...
+        ${stats}=  Redfish.Get Cache Stats
+        Rprint Vars  stats
+
+        Description of argument(s):
+        max_entries                 See redfish_response_cache for details.
+        ttl_patterns                See redfish_response_cache for details.
+        default_ttl                 See redfish_response_cache for details.
+        """
+
+        self.response_cache = redfish_response_cache(max_entries, ttl_patterns,
+                                                     default_ttl)
+
+    def disable_cache(self):
+        r"""
+        Disable caching of GET responses.
+        """
+
+        self.response_cache = None
+
+    def get_cache_stats(self):
+        r"""
+        Return a dictionary of response cache statistics (e.g. hits, misses,
+        etc.).  An empty dictionary is returned if the cache is not enabled.
+        """
+
+        if self.response_cache is None:
+            return {}
+        return self.response_cache.get_stats()
+
     def rest_request(self, func, *args, **kwargs):
         r"""
         Perform redfish rest request and return response.
@@ -119,7 +346,20 @@ class redfish_plus(HttpClient):
         args = fa.args_to_objects(args)
         kwargs = fa.args_to_objects(kwargs)
         valid_status_codes = kwargs.pop('valid_status_codes', [200])
-        response = func(*args, **kwargs)
+        if self.response_cache is None:
+            response = func(*args, **kwargs)
+        elif func.__name__ == 'get' and len(args) == 1\
+                and not kwargs.get('args'):
+            # Requests with query arguments are not cached.
+            response = self.response_cache.get(func, *args, **kwargs)
+        elif func.__name__ in ['post', 'put', 'patch', 'delete']:
+            path = args[0] if len(args) > 0 else kwargs.get('path', '')
+            try:
+                response = func(*args, **kwargs)
+            finally:
+                self.response_cache.invalidate(path)
+        else:
+            response = func(*args, **kwargs)
         valid_http_status_code(response.status, valid_status_codes)
         return response
 
@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+
+r"""
+This module provides a pool of persistent, multiplexed paramiko SSH sessions
+along with functions such as pool_execute_command and
+pool_execute_commands.
+
+Unlike the SSHLibrary connections used by gen_robot_ssh, a pooled session may
+be used by many threads at once.  Each command is run on its own channel of
+the session's single SSH transport, so independent commands may be run in
+parallel without the cost of additional connections and logins.
+"""
+
+import os
+import time
+import socket
+import threading
+import paramiko
+
+import gen_print as gp
+
+# SSH_MAX_CHANNELS is the maximum number of channels (i.e. concurrently
+# running commands) to be opened on any one pooled session.  Note that many
+# SSH servers limit the number of sessions per connection (e.g. OpenSSH's
+# MaxSessions defaults to 10).
+SSH_MAX_CHANNELS = int(os.environ.get('SSH_MAX_CHANNELS', 4))
+# The interval, in seconds, at which keep-alive packets are to be sent on
+# idle pooled sessions.
+SSH_KEEPALIVE_INTERVAL = int(os.environ.get('SSH_KEEPALIVE_INTERVAL', 30))
+
+
+class ssh_session(object):
+    r"""
+    Define the ssh session class.
+
+    An ssh session represents one authenticated paramiko transport to a
+    host.  Commands are run via execute_command, each on its own channel.
+    """
+
+    def __init__(self,
+                 host,
+                 username,
+                 password,
+                 port=22,
+                 timeout=25.0,
+                 max_channels=SSH_MAX_CHANNELS,
+                 keepalive_interval=SSH_KEEPALIVE_INTERVAL):
+        r"""
+        Initialize the session.  The connection is not made until connect is
+        called.
+
+        Description of argument(s):
+        host                        The host name or IP address to connect
+                                    to.
+        username                    The user name to log in with.
+        password                    The password to log in with.
+        port                        The SSH port.
+        timeout                     The number of seconds to allow for
+                                    connecting and for opening each channel.
+        max_channels                The maximum number of channels to be
+                                    open at any one time.  Callers in excess
+                                    of this number will wait for a channel to
+                                    become available.
+        keepalive_interval          The interval, in seconds, at which
+                                    keep-alive packets are to be sent.
+        """
+
+        self.host = host
+        self.username = username
+        self.password = password
+        self.port = int(port)
+        self.timeout = float(timeout)
+        self.keepalive_interval = int(keepalive_interval)
+        self.__channel_semaphore = threading.BoundedSemaphore(max_channels)
+        self.__connect_lock = threading.Lock()
+        self.__client = None
+
+    def connect(self):
+        r"""
+        Connect and log in to the host unless the session is already
+        active.
+        """
+
+        with self.__connect_lock:
+            if self.is_active():
+                # Another thread has already connected.
+                return
+            self.close()
+            gp.lprint_timen("Connecting to " + self.host + ".")
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            client.connect(self.host, port=self.port, username=self.username,
+                           password=self.password, timeout=self.timeout,
+                           allow_agent=False, look_for_keys=False)
+            transport = client.get_transport()
+            if self.keepalive_interval:
+                transport.set_keepalive(self.keepalive_interval)
+            self.__client = client
+
+    def is_active(self):
+        r"""
+        Return True if the session's transport is connected and
+        authenticated.
+        """
+
+        if self.__client is None:
+            return False
+        transport = self.__client.get_transport()
+        return transport is not None and transport.is_active() \
+            and transport.is_authenticated()
+
+    def check_health(self):
+        r"""
+        Return True if the session is active and responds to a keep-alive
+        probe.  An unhealthy session is closed.
+        """
+
+        if not self.is_active():
+            self.close()
+            return False
+        try:
+            self.__client.get_transport().send_ignore()
+        except (paramiko.SSHException, socket.error, EOFError):
+            self.close()
+            return False
+        return True
+
+    def execute_command(self,
+                        cmd_buf,
+                        time_out=None,
+                        stdout_file=None):
+        r"""
+        Run the given command on a new channel and return its stdout, stderr
+        and return code.
+
+        Like SSHLibrary's execute_command, a single trailing newline is
+        removed from stdout and stderr.
+
+        If the command does not complete within time_out seconds, its channel
+        is closed and a ValueError is raised.
+
+        Description of argument(s):
+        cmd_buf                     The command string to be run.
+        time_out                    The number of seconds to allow for the
+                                    command.  A value of None means that
+                                    there is no limit.
+        stdout_file                 A binary file object to which the
+                                    command's stdout is to be written as it
+                                    arrives.  If this is specified, the
+                                    returned stdout will be empty.  This
+                                    allows large output (e.g. a tar stream)
+                                    to be received without holding it in
+                                    memory.
+        """
+
+        if not self.is_active():
+            self.connect()
+
+        if time_out is not None:
+            end_time = time.time() + float(time_out)
+
+        with self.__channel_semaphore:
+            channel = self.__client.get_transport().open_session(
+                timeout=self.timeout)
+            try:
+                channel.exec_command(cmd_buf)
+                stdout = []
+                stderr = []
+                if stdout_file is None:
+                    write_stdout = stdout.append
+                else:
+                    write_stdout = stdout_file.write
+                while True:
+                    if channel.recv_ready():
+                        write_stdout(channel.recv(32768))
+                    elif channel.recv_stderr_ready():
+                        stderr.append(channel.recv_stderr(32768))
+                    elif channel.exit_status_ready():
+                        break
+                    elif time_out is not None and time.time() >= end_time:
+                        raise ValueError("The \"" + cmd_buf + "\" command"
+                                         + " timed out after "
+                                         + str(time_out) + " seconds.\n")
+                    else:
+                        channel.status_event.wait(0.01)
+                # Collect any remaining output (up to end of file).
+                channel.settimeout(self.timeout)
+                for write, recv in ((write_stdout, channel.recv),
+                                    (stderr.append, channel.recv_stderr)):
+                    data = recv(32768)
+                    while data:
+                        write(data)
+                        data = recv(32768)
+                rc = channel.recv_exit_status()
+            finally:
+                channel.close()
+
+        stdout = b"".join(stdout).decode('utf-8', 'replace')
+        stderr = b"".join(stderr).decode('utf-8', 'replace')
+        if stdout.endswith("\n"):
+            stdout = stdout[:-1]
+        if stderr.endswith("\n"):
+            stderr = stderr[:-1]
+
+        return stdout, stderr, rc
+
+    def close(self):
+        r"""
+        Close the session's connection (if any).
+        """
+
+        if self.__client is not None:
+            self.__client.close()
+            self.__client = None
+
+
+class ssh_session_pool(object):
+    r"""
+    Define the ssh session pool class.
+
+    An ssh session pool holds one ssh session per (host, username, port) and
+    hands out healthy sessions, reconnecting as necessary.
+    """
+
+    def __init__(self,
+                 max_channels=SSH_MAX_CHANNELS):
+        r"""
+        Initialize the pool.
+
+        Description of argument(s):
+        max_channels                The maximum number of channels to be
+                                    open at any one time on each session.
+        """
+
+        self.max_channels = max_channels
+        self.__sessions = {}
+        self.__lock = threading.Lock()
+
+    def get_session(self,
+                    host,
+                    username,
+                    password,
+                    port=22,
+                    timeout=25.0):
+        r"""
+        Return a connected ssh session for the given host, username and port,
+        creating or reconnecting it as necessary.
+
+        Description of argument(s):
+        host                        The host name or IP address.
+        username                    The user name to log in with.
+        password                    The password to log in with.
+        port                        The SSH port.
+        timeout                     The number of seconds to allow for
+                                    connecting.
+        """
+
+        key = (host, username, int(port))
+        with self.__lock:
+            session = self.__sessions.get(key)
+            if session is None or session.password != password:
+                if session is not None:
+                    session.close()
+                session = ssh_session(host, username, password, port, timeout,
+                                      max_channels=self.max_channels)
+                self.__sessions[key] = session
+        if not session.is_active():
+            session.connect()
+        return session
+
+    def check_health(self):
+        r"""
+        Probe every session in the pool and discard those which are no longer
+        healthy.  Return the number of healthy sessions.
+        """
+
+        with self.__lock:
+            sessions = list(self.__sessions.items())
+        num_healthy = 0
+        for key, session in sessions:
+            if session.check_health():
+                num_healthy += 1
+            else:
+                with self.__lock:
+                    if self.__sessions.get(key) is session:
+                        del self.__sessions[key]
+        return num_healthy
+
+    def close_all(self):
+        r"""
+        Close all sessions in the pool.
+        """
+
+        with self.__lock:
+            sessions = list(self.__sessions.values())
+            self.__sessions = {}
+        for session in sessions:
+            session.close()
+
+
+# The default pool used by the functions below.
+session_pool = ssh_session_pool()
+
+
+def pool_execute_command(cmd_buf,
+                         host,
+                         username,
+                         password,
+                         port=22,
+                         timeout=25.0,
+                         time_out=None,
+                         stdout_file=None):
+    r"""
+    Run the given command via a pooled SSH session and return the stdout,
+    stderr and the return code.
+
+    If the command fails due to a broken connection, the session is re-opened
+    and the command is tried once more.
+
+    This function may be called from many threads at once.
+
+    Description of argument(s):
+    cmd_buf                         The command string to be run.
+    host                            The host name or IP address.
+    username                        The user name to log in with.
+    password                        The password to log in with.
+    port                            The SSH port.
+    timeout                         The number of seconds to allow for
+                                    connecting.
+    time_out                        The number of seconds to allow for the
+                                    execution of cmd_buf.  A value of None
+                                    means that there is no limit to how long
+                                    the command may take.
+    stdout_file                     A seekable binary file object to which
+                                    the command's stdout is to be written
+                                    (see ssh_session.execute_command).
+    """
+
+    max_exec_cmd_attempts = 2
+    for exec_cmd_attempt_num in range(1, max_exec_cmd_attempts + 1):
+        session = session_pool.get_session(host, username, password, port,
+                                           timeout)
+        try:
+            return session.execute_command(cmd_buf, time_out=time_out,
+                                           stdout_file=stdout_file)
+        except (paramiko.SSHException, socket.error, EOFError):
+            if exec_cmd_attempt_num == max_exec_cmd_attempts:
+                raise
+            gp.lprint_timen("Re-opening SSH session to " + host + ".")
+            session.close()
+            if stdout_file is not None:
+                # Discard any partial output from the failed attempt.
+                stdout_file.seek(0)
+                stdout_file.truncate()
+
+
+def pool_execute_commands(cmd_bufs,
+                          host,
+                          username,
+                          password,
+                          port=22,
+                          timeout=25.0,
+                          time_out=None,
+                          max_workers=None):
+    r"""
+    Run the given commands concurrently via one pooled SSH session and
+    return a list of (stdout, stderr, rc) tuples in the same order as
+    cmd_bufs.
+
+    A command which raises an exception (e.g. a time out) is reported with a
+    return code of 1 and the exception text as its stderr.
+
+    The commands are run one at a time if max_workers is 1 or if the
+    concurrent.futures module is not available (i.e. python 2 without the
+    futures backport).
+
+    Description of argument(s):
+    cmd_bufs                        A list of command strings to be run.
+    host                            See pool_execute_command.
+    username                        See pool_execute_command.
+    password                        See pool_execute_command.
+    port                            See pool_execute_command.
+    timeout                         See pool_execute_command.
+    time_out                        The number of seconds to allow for each
+                                    command.
+    max_workers                     The maximum number of commands to run at
+                                    once.  This defaults to the pool's
+                                    max_channels value.
+    """
+
+    if not cmd_bufs:
+        return []
+    if max_workers is None:
+        max_workers = session_pool.max_channels
+    max_workers = max(1, min(int(max_workers), len(cmd_bufs)))
+
+    # Connect up front so that the workers don't race to do so.
+    session_pool.get_session(host, username, password, port, timeout)
+
+    def run(cmd_buf):
+        try:
+            return pool_execute_command(cmd_buf, host, username, password,
+                                        port, timeout, time_out)
+        except Exception as exception:
+            return "", str(exception), 1
+
+    # concurrent.futures is imported here rather than at module level because
+    # python 2 only has it if the "futures" backport is installed.
+    try:
+        from concurrent import futures
+    except ImportError:
+        futures = None
+    if futures is None or max_workers == 1:
+        return [run(cmd_buf) for cmd_buf in cmd_bufs]
+
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(run, cmd_bufs))
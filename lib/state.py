@@ -31,15 +31,24 @@ import gen_print as gp
 import gen_valid as gv
 import gen_robot_utils as gru
 import gen_cmd as gc
+import gen_misc as gm
 import bmc_ssh_utils as bsu
 
 from robot.libraries.BuiltIn import BuiltIn
 from robot.utils import DotDict
+from robot.utils import timestr_to_secs
 
 import re
 import os
 import sys
 import imp
+import time
+import collections
+try:
+    import event_notification as en
+    event_notification_imported = True
+except ImportError:
+    event_notification_imported = False
 
 
 # NOTE: Avoid importing utils.robot because utils.robot imports state.py
@@ -130,6 +139,43 @@ default_os_req_states = ['os_ping',
 # or the local epoch time.
 USE_BMC_EPOCH_TIME = int(os.environ.get('USE_BMC_EPOCH_TIME', 0))
 
+# GET_STATE_CONCURRENT directs the get_state function to run its local probes
+# (i.e. ping, packet_loss, epoch_seconds and os_ping) in worker threads while
+# the BMC probes (i.e. uptime, rest, etc.) are being processed.  With this
+# set, the time taken by get_state is roughly that of its slowest probe rather
+# than the sum of all of its probes.  GET_STATE_PROBE_TIME_OUT is the number
+# of seconds that any one local probe is allowed to run.  This is off by
+# default.  It requires the concurrent.futures module (i.e. python 3 or the
+# python 2 futures backport); without it, the probes are run serially.
+GET_STATE_CONCURRENT = int(os.environ.get('GET_STATE_CONCURRENT', 0))
+GET_STATE_PROBE_TIME_OUT = int(os.environ.get('GET_STATE_PROBE_TIME_OUT', 20))
+
+# WAIT_STATE_MODE dictates how the wait_state function waits for a match:
+# - 'event': Subscribe to BMC state change events (see event_notification.py)
+#   and re-evaluate the state only when a relevant property changes.  If no
+#   subscription is possible, this falls back to 'backoff'.
+# - 'backoff': Poll the state, lengthening the interval between polls (up to
+#   WAIT_STATE_MAX_BACKOFF times the caller's interval) for as long as the
+#   state remains unchanged.
+# - 'poll': Poll the state at the caller's fixed interval.  This is the
+#   default.  'event' and 'backoff' must be requested via this environment
+#   variable or wait_state's wait_mode argument.
+WAIT_STATE_MODE = os.environ.get('WAIT_STATE_MODE', 'poll')
+WAIT_STATE_MAX_BACKOFF = int(os.environ.get('WAIT_STATE_MAX_BACKOFF', 6))
+
+# event_req_states is the list of sub states whose values are kept on D-Bus
+# under SYSTEM_STATE_URI and whose changes therefore generate event
+# notifications.
+event_req_states = ['chassis',
+                    'requested_chassis',
+                    'bmc',
+                    'requested_bmc',
+                    'boot_progress',
+                    'operating_system',
+                    'host',
+                    'requested_host',
+                    'attempts_left']
+
 # Useful state constant definition(s).
 # default_state is an initial value which may be of use to callers.
 default_state = DotDict([('rest', '1'),
@@ -228,6 +274,240 @@ def expressions_key():
     return '<expressions>'
 
 
+def state_attr_to_key(attr_name):
+    r"""
+    Return the state dictionary key corresponding to the given D-Bus state
+    property name (e.g. "CurrentHostState" -> "host", "BootProgress" ->
+    "boot_progress").
+
+    Description of argument(s):
+    attr_name                       A property name from one of the objects
+                                    under SYSTEM_STATE_URI.
+    """
+
+    new_attr_name = re.sub(r'^Current|(State|Transition)$', "", attr_name)
+    new_attr_name = re.sub(r'BMC', r'Bmc', new_attr_name)
+    new_attr_name = re.sub(r'([A-Z][a-z])', r'_\1', new_attr_name)
+    new_attr_name = new_attr_name.lower().lstrip("_")
+    new_attr_name = re.sub(r'power', r'chassis', new_attr_name)
+
+    return new_attr_name
+
+
+def state_attr_value(attr_value):
+    r"""
+    Return the state dictionary value corresponding to the given D-Bus state
+    property value (e.g. "xyz.openbmc_project.State.Host.HostState.Running"
+    -> "Running").
+
+    Description of argument(s):
+    attr_value                      A property value from one of the objects
+                                    under SYSTEM_STATE_URI.
+    """
+
+    try:
+        return re.sub(r'.*\.', "", attr_value)
+    except TypeError:
+        return attr_value
+
+
+class compiled_match_state:
+    r"""
+    Define the compiled match state class.
+
+    A compiled match state object holds a match state dictionary (see
+    compare_states for details) whose regular expressions have been compiled
+    with re.compile and whose expressions have been compiled to code objects.
+    Callers which compare states repeatedly against the same match state
+    (e.g. select_boot, wait_state) should create one of these objects once
+    and pass it to compare_states in place of the match state dictionary.
+
+    Example code:
+
+    compiled_match = compiled_match_state(standby_match_state)
+    if compare_states(state, compiled_match):
+        ...
+    """
+
+    def __init__(self,
+                 match_state):
+        r"""
+        Compile the given match state.
+
+        Description of argument(s):
+        match_state                 A match state dictionary.  See
+                                    compare_states for details.
+        """
+
+        self.match_state = match_state
+        # The predicates are kept in match_state order.  This matters since
+        # an expression may raise an exception if it is reached (e.g.
+        # int(state['uptime']) where uptime is blank).
+        self.predicates = []
+        self.has_expressions = False
+        for key, match_state_value in match_state.items():
+            # Blank match_state_value means "don't care".
+            if match_state_value == "":
+                continue
+            if key == expressions_key():
+                self.has_expressions = True
+                for expr in match_state_value:
+                    self.predicates.append(
+                        (key, compile(expr, expressions_key(), 'eval')))
+            else:
+                self.predicates.append((key, re.compile(match_state_value)))
+
+    def keys(self):
+        r"""
+        Return a list of the state keys referenced by this object's regular
+        expressions.
+        """
+
+        return [key for key, predicate in self.predicates
+                if key != expressions_key()]
+
+    def match(self,
+              state,
+              match_type='and'):
+        r"""
+        Return True if the state matches this object's match state and False
+        if it doesn't.  See compare_states for details.
+
+        Description of argument(s):
+        state                       A state dictionary such as the one
+                                    returned by the get_state function.
+        match_type                  This may be 'and' or 'or'.
+        """
+
+        default_match = (match_type == 'and')
+        for key, predicate in self.predicates:
+            if key == expressions_key():
+                # Use python interpreter to evaluate the expression.
+                match = eval(predicate, globals(), {'state': state})
+            else:
+                try:
+                    match = (predicate.match(str(state[key])) is not None)
+                except KeyError:
+                    match = False
+            if match != default_match:
+                return match
+
+        return default_match
+
+    def matching_keys(self,
+                      state):
+        r"""
+        Return a list of the state keys whose regular expressions match the
+        corresponding values in the state.  Expressions are not considered.
+
+        Description of argument(s):
+        state                       A state dictionary such as the one
+                                    returned by the get_state function.
+        """
+
+        return [key for key, predicate in self.predicates
+                if key != expressions_key() and key in state
+                and predicate.match(str(state[key])) is not None]
+
+
+class match_state_index:
+    r"""
+    Define the match state index class.
+
+    A match state index object holds a dictionary of named match states
+    (e.g. the 'start' states of each boot type in the boot table).  Its
+    matches method returns the names of all match states which match a given
+    state.  Results are memoized by state signature (i.e. the values of the
+    state keys referenced by any of the match states) so that, after the
+    first call for a given signature, a lookup is all that is required.
+
+    Example code:
+
+    boot_start_index = match_state_index(
+        dict((boot, boot_table[boot]['start']) for boot in boot_table))
+    valid_boots = boot_start_index.matches(state)
+    """
+
+    def __init__(self,
+                 match_states,
+                 max_signatures=1024):
+        r"""
+        Compile the given match states and create an empty index.
+
+        Description of argument(s):
+        match_states                A dictionary whose keys are names and
+                                    whose values are match state dictionaries
+                                    (see compare_states for details).
+        max_signatures              The maximum number of state signatures to
+                                    be held in the index.  When this is
+                                    exceeded, the index is cleared.
+        """
+
+        self.__compiled_match_states = collections.OrderedDict()
+        signature_keys = set()
+        self.__memoize = True
+        for name, match_state in match_states.items():
+            compiled_match = compiled_match_state(match_state)
+            self.__compiled_match_states[name] = compiled_match
+            signature_keys.update(compiled_match.keys())
+            # Expressions may refer to any state key so the results cannot be
+            # memoized by signature.
+            if compiled_match.has_expressions:
+                self.__memoize = False
+        self.__signature_keys = sorted(signature_keys)
+        self.__max_signatures = max_signatures
+        self.__index = {}
+
+    def __getitem__(self, name):
+        r"""
+        Return the compiled match state for the given name.
+        """
+
+        return self.__compiled_match_states[name]
+
+    def signature(self, state):
+        r"""
+        Return the signature of the state, i.e. a tuple of the values of each
+        state key referenced by this object's match states.  Keys missing from
+        the state are represented by None.
+
+        Description of argument(s):
+        state                       A state dictionary such as the one
+                                    returned by the get_state function.
+        """
+
+        return tuple(str(state[key]) if key in state else None
+                     for key in self.__signature_keys)
+
+    def matches(self, state):
+        r"""
+        Return a frozenset of the names of the match states which match the
+        given state.
+
+        Description of argument(s):
+        state                       A state dictionary such as the one
+                                    returned by the get_state function.
+        """
+
+        if self.__memoize:
+            signature = self.signature(state)
+            try:
+                return self.__index[signature]
+            except KeyError:
+                pass
+
+        names = frozenset(name for name, compiled_match
+                          in self.__compiled_match_states.items()
+                          if compiled_match.match(state))
+
+        if self.__memoize:
+            if len(self.__index) >= self.__max_signatures:
+                self.__index.clear()
+            self.__index[signature] = names
+
+        return names
+
+
 def compare_states(state,
                    match_state,
                    match_type='and'):
@@ -255,6 +535,11 @@ def compare_states(state,
                     such a case this function will call return_state_constant
                     to convert it to a proper dictionary as described above.
 
+                    This value may also be a compiled_match_state object.
+                    Callers which compare against the same match state
+                    repeatedly should pass such an object to avoid
+                    re-processing the regular expressions on each call.
+
                     Finally, one special value is accepted for the key field:
                     expression_key().  If such an entry exists, its value is
                     taken to be a list of expressions to be evaluated.  These
@@ -270,35 +555,60 @@ def compare_states(state,
     match_type      This may be 'and' or 'or'.
     """
 
-    error_message = gv.valid_value(match_type, valid_values=['and', 'or'])
-    if error_message != "":
+    if match_type not in ['and', 'or']:
+        error_message = gv.valid_value(match_type, valid_values=['and', 'or'])
         BuiltIn().fail(gp.sprint_error(error_message))
 
+    if isinstance(match_state, compiled_match_state):
+        return match_state.match(state, match_type)
+
     try:
-        match_state = return_state_constant(match_state)
-    except TypeError:
-        pass
+        compiled_match = compiled_state_constants[match_state]
+    except (KeyError, TypeError):
+        try:
+            match_state = return_state_constant(match_state)
+        except TypeError:
+            pass
+        compiled_match = compiled_match_state(match_state)
 
-    default_match = (match_type == 'and')
-    for key, match_state_value in match_state.items():
-        # Blank match_state_value means "don't care".
-        if match_state_value == "":
-            continue
-        if key == expressions_key():
-            for expr in match_state_value:
-                # Use python interpreter to evaluate the expression.
-                match = eval(expr)
-                if match != default_match:
-                    return match
-        else:
-            try:
-                match = (re.match(match_state_value, str(state[key])) is not None)
-            except KeyError:
-                match = False
-            if match != default_match:
-                return match
+    return compiled_match.match(state, match_type)
+
+
+# Compiled versions of the match state constants defined above.
+# compare_states uses these when called with a state constant name (e.g.
+# "standby_match_state").
+compiled_state_constants = \
+    dict((state_name, compiled_match_state(return_state_constant(state_name)))
+         for state_name in ['standby_match_state', 'os_running_match_state',
+                            'master_os_up_match', 'invalid_state_match'])
+
+
+def run_local_probe(cmd_buf,
+                    time_out=None):
+    r"""
+    Run the command in a local shell and return the shell return code and the
+    output.
+
+    Unlike gen_cmd.shell_cmd, this function does not use signals to enforce
+    time_out so it may safely be called from a worker thread.  If the command
+    has not finished within time_out seconds, its process group is killed and
+    a return code of 124 (the same value used by the timeout command) is
+    returned.
+
+    Description of argument(s):
+    cmd_buf                         The command string to be run in a shell
+                                    (e.g. "ping -c 1 -w 2 bmc1").
+    time_out                        The number of seconds to allow for the
+                                    command to run.  A value of None means no
+                                    limit.
+    """
+
+    shell_rc, out_buf, err_buf, command_timed_out, child_pid = \
+        gc.shell_cmd_attempt(cmd_buf, time_out)
+    if command_timed_out:
+        return 124, out_buf
 
-    return default_match
+    return shell_rc, out_buf
 
 
 def get_os_state(os_host="",
@@ -306,6 +616,7 @@ def get_os_state(os_host="",
                  os_password="",
                  req_states=default_os_req_states,
                  os_up=True,
+                 os_ping_rc=None,
                  quiet=None):
     r"""
     Get component states for the operating system such as ping, login,
@@ -326,6 +637,10 @@ def get_os_state(os_host="",
                  improve performance by passing os_up=False.  This function
                  will then simply return default values for all requested os
                  sub states.
+    os_ping_rc   The return code of a ping of os_host which the caller has
+                 already run (e.g. get_state running it concurrently with its
+                 other probes).  If this is None, this function will run the
+                 ping itself.
     quiet        Indicates whether status details (e.g. curl commands) should
                  be written to the console.
                  Defaults to either global value of ${QUIET} or to 1.
@@ -367,10 +682,11 @@ def get_os_state(os_host="",
     if os_up:
         if 'os_ping' in req_states:
             # See if the OS pings.
-            rc, out_buf = gc.shell_cmd("ping -c 1 -w 2 " + os_host,
-                                       print_output=0, show_err=0,
-                                       ignore_err=1)
-            if rc == 0:
+            if os_ping_rc is None:
+                os_ping_rc, out_buf = gc.shell_cmd("ping -c 1 -w 2 " + os_host,
+                                                   print_output=0, show_err=0,
+                                                   ignore_err=1)
+            if os_ping_rc == 0:
                 os_ping = 1
 
         # Programming note: All attributes which do not require an ssh login
@@ -406,6 +722,7 @@ def get_state(openbmc_host="",
               os_username="",
               os_password="",
               req_states=default_req_states,
+              concurrent=None,
               quiet=None):
     r"""
     Get component states such as chassis state, bmc state, etc, put them into a
@@ -413,6 +730,11 @@ def get_state(openbmc_host="",
 
     Note that all substate values are strings.
 
+    The local probes (i.e. ping, packet_loss, epoch_seconds and os_ping) are
+    run in worker threads concurrently with the BMC probes when concurrent is
+    set.  The BMC probes run robot keywords and must therefore remain in the
+    main thread.
+
     Note: If elapsed_boot_time is included in req_states, it is the caller's
     duty to call set_start_boot_seconds() in order to set global
     start_boot_seconds.  elapsed_boot_time is the current time minus
@@ -433,12 +755,16 @@ def get_state(openbmc_host="",
                       This defaults to global ${OS_PASSWORD}.
     req_states        This is a list of states whose values are being requested
                       by the caller.
+    concurrent        Indicates whether the local probes should be run
+                      concurrently with the BMC probes.  This defaults to the
+                      GET_STATE_CONCURRENT environment variable or to 0.
     quiet             Indicates whether status details (e.g. curl commands)
                       should be written to the console.
                       Defaults to either global value of ${QUIET} or to 1.
     """
 
     quiet = int(gp.get_var_value(quiet, 0))
+    concurrent = int(gm.dft(concurrent, GET_STATE_CONCURRENT))
 
     # Set parm defaults where necessary and validate all parms.
     if openbmc_host == "":
@@ -499,25 +825,51 @@ def get_state(openbmc_host="",
     requested_host = ''
     attempts_left = ''
 
-    # Get the component states.
+    # Compose the local probe commands.  These are run in local shells and
+    # may therefore be run in worker threads.
+    local_probes = collections.OrderedDict()
     if 'ping' in req_states:
-        # See if the OS pings.
-        rc, out_buf = gc.shell_cmd("ping -c 1 -w 2 " + openbmc_host,
-                                   print_output=0, show_err=0,
-                                   ignore_err=1)
-        if rc == 0:
-            ping = 1
-
+        # See if the BMC pings.
+        local_probes['ping'] = "ping -c 1 -w 2 " + openbmc_host
     if 'packet_loss' in req_states:
-        # See if the OS pings.
-        cmd_buf = "ping -c 5 -w 5 " + openbmc_host +\
+        local_probes['packet_loss'] = "ping -c 5 -w 5 " + openbmc_host +\
             " | egrep 'packet loss' | sed -re 's/.* ([0-9]+)%.*/\\1/g'"
-        rc, out_buf = gc.shell_cmd(cmd_buf,
-                                   print_output=0, show_err=0,
-                                   ignore_err=1)
-        if rc == 0:
-            packet_loss = out_buf.rstrip("\n")
+    if ('epoch_seconds' in req_states or 'elapsed_boot_time' in req_states)\
+            and not USE_BMC_EPOCH_TIME:
+        local_probes['epoch_seconds'] = "date -u +%s"
+    if 'os_ping' in req_states and os_host != "":
+        # This ping is run speculatively.  Its result is only used if the BMC
+        # states indicate that the OS may be up (see os_up below).
+        local_probes['os_ping'] = "ping -c 1 -w 2 " + os_host
+
+    probe_results = collections.OrderedDict()
+    probe_futures = collections.OrderedDict()
+    for cmd_buf in local_probes.values():
+        gp.qprint_issuing(cmd_buf)
+    if concurrent and len(local_probes) > 0:
+        # concurrent.futures is imported here rather than at module level
+        # because python 2 only has it if the "futures" backport is
+        # installed.
+        try:
+            from concurrent import futures
+        except ImportError:
+            concurrent = 0
+    if concurrent and len(local_probes) > 0:
+        executor = futures.ThreadPoolExecutor(max_workers=len(local_probes))
+        for probe_name, cmd_buf in local_probes.items():
+            probe_futures[probe_name] = \
+                executor.submit(run_local_probe, cmd_buf,
+                                GET_STATE_PROBE_TIME_OUT)
+        # Do not wait for the workers here.  They are collected below after
+        # the BMC probes have been run.
+        executor.shutdown(wait=False)
+    else:
+        for probe_name, cmd_buf in local_probes.items():
+            probe_results[probe_name] = \
+                gc.shell_cmd(cmd_buf, quiet=1, print_output=0, show_err=0,
+                             ignore_err=1, time_out=GET_STATE_PROBE_TIME_OUT)
 
+    # Get the component states.
     if 'uptime' in req_states:
         # Sometimes reading uptime results in a blank value. Call with
         # wait_until_keyword_succeeds to ensure a non-blank value is obtained.
@@ -537,28 +889,18 @@ def get_state(openbmc_host="",
         except AssertionError as my_assertion_error:
             pass
 
-    if 'epoch_seconds' in req_states or 'elapsed_boot_time' in req_states:
+    if ('epoch_seconds' in req_states or 'elapsed_boot_time' in req_states)\
+            and USE_BMC_EPOCH_TIME:
         date_cmd_buf = "date -u +%s"
-        if USE_BMC_EPOCH_TIME:
-            cmd_buf = ["BMC Execute Command", date_cmd_buf, 'quiet=${1}']
-            if not quiet:
-                gp.print_issuing(cmd_buf)
-            status, ret_values = \
-                BuiltIn().run_keyword_and_ignore_error(*cmd_buf)
-            if status == "PASS":
-                stdout, stderr, rc = ret_values
-                if rc == 0 and stderr == "":
-                    epoch_seconds = stdout.rstrip("\n")
-        else:
-            shell_rc, out_buf = gc.cmd_fnc_u(date_cmd_buf,
-                                             quiet=quiet,
-                                             print_output=0)
-            if shell_rc == 0:
-                epoch_seconds = out_buf.rstrip("\n")
-
-    if 'elapsed_boot_time' in req_states:
-        global start_boot_seconds
-        elapsed_boot_time = int(epoch_seconds) - start_boot_seconds
+        cmd_buf = ["BMC Execute Command", date_cmd_buf, 'quiet=${1}']
+        if not quiet:
+            gp.print_issuing(cmd_buf)
+        status, ret_values = \
+            BuiltIn().run_keyword_and_ignore_error(*cmd_buf)
+        if status == "PASS":
+            stdout, stderr, rc = ret_values
+            if rc == 0 and stderr == "":
+                epoch_seconds = stdout.rstrip("\n")
 
     master_req_rest = ['rest', 'host', 'requested_host', 'operating_system',
                        'attempts_left', 'boot_progress', 'chassis',
@@ -583,22 +925,29 @@ def get_state(openbmc_host="",
             for url_path in ret_values:
                 for attr_name in ret_values[url_path]:
                     # Create a state key value based on the attr_name.
-                    try:
-                        ret_values[url_path][attr_name] = \
-                            re.sub(r'.*\.', "",
-                                   ret_values[url_path][attr_name])
-                    except TypeError:
-                        pass
-                    # Do some key name manipulations.
-                    new_attr_name = re.sub(r'^Current|(State|Transition)$',
-                                           "", attr_name)
-                    new_attr_name = re.sub(r'BMC', r'Bmc', new_attr_name)
-                    new_attr_name = re.sub(r'([A-Z][a-z])', r'_\1',
-                                           new_attr_name)
-                    new_attr_name = new_attr_name.lower().lstrip("_")
-                    new_attr_name = re.sub(r'power', r'chassis', new_attr_name)
+                    new_attr_name = state_attr_to_key(attr_name)
                     if new_attr_name in req_states:
-                        state[new_attr_name] = ret_values[url_path][attr_name]
+                        state[new_attr_name] = \
+                            state_attr_value(ret_values[url_path][attr_name])
+
+    for probe_name, probe_future in probe_futures.items():
+        # run_local_probe enforces GET_STATE_PROBE_TIME_OUT on its own so
+        # this will not block for longer than that.
+        probe_results[probe_name] = probe_future.result()
+
+    # Process the local probe results.
+    if probe_results.get('ping', (1, ''))[0] == 0:
+        ping = 1
+    rc, out_buf = probe_results.get('packet_loss', (1, ''))
+    if rc == 0:
+        packet_loss = out_buf.rstrip("\n")
+    rc, out_buf = probe_results.get('epoch_seconds', (1, ''))
+    if rc == 0:
+        epoch_seconds = out_buf.rstrip("\n")
+
+    if 'elapsed_boot_time' in req_states:
+        global start_boot_seconds
+        elapsed_boot_time = int(epoch_seconds) - start_boot_seconds
 
     for sub_state in req_states:
         if sub_state in state:
@@ -634,6 +983,8 @@ def get_state(openbmc_host="",
                                 os_password=os_password,
                                 req_states=os_req_states,
                                 os_up=os_up,
+                                os_ping_rc=probe_results.get('os_ping',
+                                                             (None, ''))[0],
                                 quiet=quiet)
         # Append os_state dictionary to ours.
         state.update(os_state)
@@ -761,6 +1112,8 @@ def wait_state(match_state=(),
                os_host="",
                os_username="",
                os_password="",
+               wait_mode=None,
+               stage_times=None,
                quiet=None):
     r"""
     Wait for the Open BMC machine's composite state to match the specified
@@ -795,12 +1148,25 @@ def wait_state(match_state=(),
                       This defaults to global ${OS_USERNAME}.
     os_password       The password to be used to login to the OS.
                       This defaults to global ${OS_PASSWORD}.
+    wait_mode         One of 'event', 'backoff' or 'poll'.  See the prolog for
+                      WAIT_STATE_MODE (above) for details.  This defaults to
+                      the WAIT_STATE_MODE environment variable or to 'poll'.
+    stage_times       A dictionary which, if specified, will be filled with
+                      the number of seconds it took each key in match_state to
+                      first match (e.g. {'chassis': 3.1, 'os_ping': 97.4}).
+                      This is only supported in the 'event' and 'backoff' wait
+                      modes and is ignored when invert is set.
     quiet             Indicates whether status details should be written to the
                       console.  Defaults to either global value of ${QUIET} or
                       to 1.
     """
 
     quiet = int(gp.get_var_value(quiet, 0))
+    wait_mode = gm.dft(wait_mode, WAIT_STATE_MODE)
+    error_message = gv.valid_value(wait_mode,
+                                   valid_values=['event', 'backoff', 'poll'])
+    if error_message != "":
+        BuiltIn().fail(gp.sprint_error(error_message))
 
     try:
         match_state = return_state_constant(match_state)
@@ -827,16 +1193,33 @@ def wait_state(match_state=(),
         # In debug we print state so no need to print the "#".
         print_string = ""
     check_state_quiet = 1 - debug
-    cmd_buf = ["Check State", match_state, "invert=${" + str(invert) + "}",
-               "print_string=" + print_string, "openbmc_host=" + openbmc_host,
-               "openbmc_username=" + openbmc_username,
-               "openbmc_password=" + openbmc_password, "os_host=" + os_host,
-               "os_username=" + os_username, "os_password=" + os_password,
-               "quiet=${" + str(check_state_quiet) + "}"]
-    gp.dprint_issuing(cmd_buf)
     try:
-        state = BuiltIn().wait_until_keyword_succeeds(wait_time, interval,
-                                                      *cmd_buf)
+        if wait_mode == 'poll':
+            cmd_buf = ["Check State", match_state,
+                       "invert=${" + str(invert) + "}",
+                       "print_string=" + print_string,
+                       "openbmc_host=" + openbmc_host,
+                       "openbmc_username=" + openbmc_username,
+                       "openbmc_password=" + openbmc_password,
+                       "os_host=" + os_host, "os_username=" + os_username,
+                       "os_password=" + os_password,
+                       "quiet=${" + str(check_state_quiet) + "}"]
+            gp.dprint_issuing(cmd_buf)
+            state = BuiltIn().wait_until_keyword_succeeds(wait_time, interval,
+                                                          *cmd_buf)
+        else:
+            state = wait_state_on_events(match_state, wait_time=wait_time,
+                                         interval=interval, invert=invert,
+                                         print_string=print_string,
+                                         openbmc_host=openbmc_host,
+                                         openbmc_username=openbmc_username,
+                                         openbmc_password=openbmc_password,
+                                         os_host=os_host,
+                                         os_username=os_username,
+                                         os_password=os_password,
+                                         subscribe=(wait_mode == 'event'),
+                                         stage_times=stage_times,
+                                         quiet=check_state_quiet)
     except AssertionError as my_assertion_error:
         gp.printn()
         message = my_assertion_error.args[0]
@@ -861,6 +1244,219 @@ def wait_state(match_state=(),
     return state
 
 
+def open_state_subscription(openbmc_host="",
+                            openbmc_username="",
+                            openbmc_password=""):
+    r"""
+    Subscribe to event notifications for the objects under SYSTEM_STATE_URI
+    and return the resulting event_notification object.  Return None if a
+    subscription is not possible (e.g. the websocket module is not installed
+    or the BMC does not support the subscribe interface).
+
+    Description of argument(s):
+    openbmc_host      The DNS name or IP address of the BMC.
+                      This defaults to global ${OPENBMC_HOST}.
+    openbmc_username  The username to be used to login to the BMC.
+                      This defaults to global ${OPENBMC_USERNAME}.
+    openbmc_password  The password to be used to login to the BMC.
+                      This defaults to global ${OPENBMC_PASSWORD}.
+    """
+
+    if not event_notification_imported:
+        return None
+
+    if openbmc_host == "":
+        openbmc_host = BuiltIn().get_variable_value("${OPENBMC_HOST}")
+    if openbmc_username == "":
+        openbmc_username = BuiltIn().get_variable_value("${OPENBMC_USERNAME}")
+    if openbmc_password == "":
+        openbmc_password = BuiltIn().get_variable_value("${OPENBMC_PASSWORD}")
+
+    subscription = en.event_notification(openbmc_host, openbmc_username,
+                                         openbmc_password)
+    try:
+        subscription.open_subscription(SYSTEM_STATE_URI.rstrip("/"))
+    except Exception as exception:
+        gp.dprint_timen("Unable to subscribe to state change events.")
+        gp.dprint_varx("exception", str(exception))
+        return None
+
+    return subscription
+
+
+def wait_state_on_events(match_state,
+                         wait_time="1 min",
+                         interval="1 second",
+                         invert=0,
+                         print_string="",
+                         openbmc_host="",
+                         openbmc_username="",
+                         openbmc_password="",
+                         os_host="",
+                         os_username="",
+                         os_password="",
+                         subscribe=True,
+                         stage_times=None,
+                         quiet=None):
+    r"""
+    Wait for the Open BMC machine's composite state to match the specified
+    state and return the machine's composite state as a dictionary.  If the
+    wait_time expires first, raise an AssertionError.
+
+    This is the engine for wait_state's 'event' and 'backoff' wait modes.  The
+    state is obtained with get_state initially.  Thereafter:
+    - While subscribed to BMC state change events, the state is re-evaluated
+      whenever a relevant property change arrives.  If every key in
+      match_state is in event_req_states, the state is updated directly from
+      the event rather than with another get_state round-trip.
+    - Otherwise (or if the subscription is lost, e.g. due to a BMC reboot),
+      get_state is called at an interval which starts at interval and grows
+      (up to WAIT_STATE_MAX_BACKOFF times interval) for as long as the state
+      remains unchanged.  Any state change resets the interval.
+
+    Description of argument(s):
+    match_state       A dictionary whose key/value pairs are "state field"/
+                      "state value".  See check_state (above) for details.
+    wait_time         The total amount of time to wait for the desired state.
+                      This value may be expressed in Robot Framework's time
+                      format (e.g. 1 minute, 2 min 3 s, 4.5).
+    interval          The initial amount of time between state checks.  This
+                      value may be expressed in Robot Framework's time format.
+    invert            If this flag is set, this function will wait for the
+                      state of the machine to cease to match the match state.
+    print_string      This function will print this string to the console each
+                      time the state is evaluated.
+    openbmc_host, openbmc_username, openbmc_password, os_host, os_username,
+    os_password       See get_state (above) for details.
+    subscribe         Indicates whether this function should try to subscribe
+                      to BMC state change events.
+    stage_times       See wait_state (above) for details.
+    quiet             Indicates whether status details should be written to the
+                      console.  Defaults to either global value of ${QUIET} or
+                      to 1.
+    """
+
+    quiet = int(gp.get_var_value(quiet, 0))
+
+    req_states = list(match_state.keys())
+    # Remove special-case match key from req_states.
+    if expressions_key() in req_states:
+        req_states.remove(expressions_key())
+    events_suffice = set(req_states) <= set(event_req_states)
+    compiled_match = compiled_match_state(match_state)
+
+    wait_seconds = timestr_to_secs(wait_time)
+    min_interval = max(timestr_to_secs(interval), 0.1)
+    max_interval = min_interval * WAIT_STATE_MAX_BACKOFF
+    cur_interval = min_interval
+    start_time = time.time()
+    end_time = start_time + wait_seconds
+
+    subscription = None
+    if subscribe:
+        subscription = open_state_subscription(openbmc_host, openbmc_username,
+                                               openbmc_password)
+    gp.dprint_varx("subscribed", subscription is not None)
+
+    state = DotDict()
+    need_get_state = True
+    try:
+        while True:
+            if need_get_state:
+                gp.gp_print(print_string)
+                prior_state = state
+                state = get_state(openbmc_host=openbmc_host,
+                                  openbmc_username=openbmc_username,
+                                  openbmc_password=openbmc_password,
+                                  os_host=os_host,
+                                  os_username=os_username,
+                                  os_password=os_password,
+                                  req_states=req_states,
+                                  quiet=quiet)
+                if not quiet:
+                    gp.print_var(state)
+                last_get_state_time = time.time()
+                if state == prior_state:
+                    cur_interval = min(cur_interval * 2, max_interval)
+                else:
+                    cur_interval = min_interval
+
+            if exit_wait_early_message != "":
+                # See the corresponding comment in check_state.
+                return state
+
+            if stage_times is not None and not invert:
+                for key in compiled_match.matching_keys(state):
+                    if key not in stage_times:
+                        stage_times[key] = time.time() - start_time
+
+            if compare_states(state, compiled_match) != bool(invert):
+                return state
+
+            remaining_seconds = end_time - time.time()
+            if remaining_seconds <= 0:
+                break
+
+            need_get_state = True
+            if subscription is None:
+                time.sleep(min(cur_interval, remaining_seconds))
+                continue
+
+            # Wait for a relevant event.  Even when events suffice, do a
+            # get_state at max_interval as a safeguard against lost events.
+            if events_suffice:
+                next_get_state_time = last_get_state_time + max_interval
+            else:
+                next_get_state_time = time.time() + cur_interval
+            while True:
+                time_out = min(next_get_state_time, end_time) - time.time()
+                if time_out <= 0:
+                    break
+                try:
+                    event = subscription.receive_event(time_out=time_out)
+                except Exception as exception:
+                    gp.dprint_timen("Lost the state change event"
+                                    + " subscription.  Falling back to"
+                                    + " polling.")
+                    gp.dprint_varx("exception", str(exception))
+                    subscription.close()
+                    subscription = None
+                    break
+                if event is None:
+                    break
+                gp.dprint_var(event)
+                changed_keys = [state_attr_to_key(attr_name) for attr_name
+                                in event.get('properties', {})]
+                if not set(changed_keys) & set(req_states):
+                    # Not relevant to our match_state.
+                    continue
+                if events_suffice:
+                    gp.gp_print(print_string)
+                    state = state.copy()
+                    for attr_name, attr_value in \
+                            event['properties'].items():
+                        key = state_attr_to_key(attr_name)
+                        if key in req_states:
+                            state[key] = state_attr_value(attr_value)
+                    if not quiet:
+                        gp.print_var(state)
+                    need_get_state = False
+                break
+    finally:
+        if subscription is not None:
+            subscription.close()
+
+    if invert:
+        fail_msg = "The current state of the machine matches the match" +\
+                   " state:\n" + gp.sprint_varx("state", state)
+    else:
+        fail_msg = "The current state of the machine does NOT match the" +\
+                   " match state:\n" + gp.sprint_varx("state", state)
+    raise AssertionError("Timed out after " + str(wait_time) + " waiting for"
+                         + " the state of the machine.  The last error"
+                         + " was:\n" + gp.sprint_error(fail_msg))
+
+
 def set_start_boot_seconds(value=0):
     global start_boot_seconds
     start_boot_seconds = int(value)
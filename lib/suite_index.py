@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+
+r"""
+This module provides functions which maintain a persistent index of the test
+cases (i.e. name, tags and doc) defined in robot suite files.
+
+The index is kept in a JSON file and is keyed by suite file path.  Each entry
+records the file's mtime, size and sha1 hash.  When the index is updated,
+only the files which have changed are re-parsed, and those are parsed in
+parallel by a pool of worker processes.
+
+Example index entry:
+
+"/home/user1/git/openbmc-test-automation/tests/test_basic_poweron.robot": {
+    "mtime": 1571234567.0,
+    "size": 2345,
+    "hash": "8f3c...",
+    "tests": [
+        {"name": "Power On Test", "tags": ["Power_On_Test"], "doc": "..."}
+    ]
+}
+"""
+
+import os
+import json
+import hashlib
+import multiprocessing
+
+import gen_misc as gm
+
+# The default path of the index file.
+SUITE_INDEX_FILE_PATH = \
+    os.environ.get('SUITE_INDEX_FILE_PATH',
+                   "/tmp/" + gm.username() + "/suite_index.json")
+
+
+def get_file_hash(file_path):
+    r"""
+    Return the sha1 hash of the file's contents as a hex string.
+
+    Description of argument(s):
+    file_path                       The path of the file.
+    """
+
+    sha1 = hashlib.sha1()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(65536), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def parse_suite_file(file_path):
+    r"""
+    Parse the robot suite file and return a list of test dictionaries (each
+    with name, tags and doc keys).
+
+    This function is intended to be run in a worker process.
+
+    Description of argument(s):
+    file_path                       The path of the robot suite file.
+    """
+
+    from robot.parsing.model import TestData
+
+    tests = []
+    if os.path.basename(file_path) == "__init__.robot":
+        return tests
+    test_suite_obj = TestData(parent=None, source=file_path)
+    for testcase in test_suite_obj.testcase_table:
+        tags = getattr(testcase.tags, 'value', testcase.tags) or []
+        doc = getattr(testcase.doc, 'value', testcase.doc) or ""
+        tests.append({'name': str(testcase.name),
+                      'tags': [str(tag) for tag in tags],
+                      'doc': str(doc)})
+    return tests
+
+
+def index_suite_file(file_path):
+    r"""
+    Parse the robot suite file and return a tuple consisting of the file path
+    and the file's index entry (see the module prolog).
+
+    This function is intended to be run in a worker process.
+
+    Description of argument(s):
+    file_path                       The path of the robot suite file.
+    """
+
+    file_stat = os.stat(file_path)
+    return file_path, {'mtime': file_stat.st_mtime,
+                       'size': file_stat.st_size,
+                       'hash': get_file_hash(file_path),
+                       'tests': parse_suite_file(file_path)}
+
+
+def load_index(index_file_path=None):
+    r"""
+    Load and return the index dictionary from the index file or an empty
+    dictionary if the index file does not exist or cannot be read.
+
+    Description of argument(s):
+    index_file_path                 The path of the index file.  This defaults
+                                    to SUITE_INDEX_FILE_PATH.
+    """
+
+    index_file_path = gm.dft(index_file_path, SUITE_INDEX_FILE_PATH)
+    try:
+        with open(index_file_path, 'r') as index_file:
+            return json.load(index_file)
+    except (IOError, ValueError):
+        return {}
+
+
+def save_index(index,
+               index_file_path=None):
+    r"""
+    Atomically write the index dictionary to the index file.
+
+    Description of argument(s):
+    index                           The index dictionary.
+    index_file_path                 The path of the index file.  This defaults
+                                    to SUITE_INDEX_FILE_PATH.
+    """
+
+    index_file_path = gm.dft(index_file_path, SUITE_INDEX_FILE_PATH)
+    index_dir_path = os.path.dirname(os.path.abspath(index_file_path))
+    if not os.path.isdir(index_dir_path):
+        os.makedirs(index_dir_path)
+    temp_file_path = index_file_path + "." + str(os.getpid())
+    with open(temp_file_path, 'w') as index_file:
+        json.dump(index, index_file, sort_keys=True)
+    os.rename(temp_file_path, index_file_path)
+
+
+def update_index(file_paths,
+                 index_file_path=None,
+                 max_workers=None):
+    r"""
+    Bring the index up to date for the given robot suite files, save it and
+    return it.
+
+    A file is re-parsed only if its mtime or size differs from that recorded
+    in the index and its hash differs as well.  The files which must be
+    re-parsed are parsed in parallel.  Entries for files which no longer
+    exist are removed.
+
+    Description of argument(s):
+    file_paths                      A list of robot suite file paths.
+    index_file_path                 The path of the index file.  This defaults
+                                    to SUITE_INDEX_FILE_PATH.
+    max_workers                     The maximum number of worker processes.
+                                    This defaults to the number of CPUs.
+    """
+
+    index = load_index(index_file_path)
+    changed = False
+    stale_file_paths = []
+    for file_path in file_paths:
+        entry = index.get(file_path)
+        if entry is None:
+            stale_file_paths.append(file_path)
+            continue
+        file_stat = os.stat(file_path)
+        if entry['mtime'] == file_stat.st_mtime \
+           and entry['size'] == file_stat.st_size:
+            continue
+        if entry['size'] == file_stat.st_size \
+           and entry['hash'] == get_file_hash(file_path):
+            # Only the mtime has changed (e.g. the file was touched or
+            # re-checked out).
+            entry['mtime'] = file_stat.st_mtime
+            changed = True
+            continue
+        stale_file_paths.append(file_path)
+
+    for file_path in [file_path for file_path in index
+                      if not os.path.exists(file_path)]:
+        del index[file_path]
+        changed = True
+
+    if stale_file_paths:
+        max_workers = int(gm.dft(max_workers, multiprocessing.cpu_count()))
+        max_workers = max(1, min(max_workers, len(stale_file_paths)))
+        if max_workers > 1:
+            pool = multiprocessing.Pool(processes=max_workers)
+            try:
+                entries = pool.map(index_suite_file, stale_file_paths)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            entries = [index_suite_file(file_path)
+                       for file_path in stale_file_paths]
+        index.update(entries)
+        changed = True
+
+    if changed:
+        save_index(index, index_file_path)
+
+    return index
+
+
+def normalize_tag(tag):
+    r"""
+    Return the tag normalized the way robot compares tags (i.e. case and
+    spaces are ignored).
+
+    Description of argument(s):
+    tag                             The tag name.
+    """
+
+    return tag.lower().replace(" ", "")
+
+
+def query_index(index,
+                file_paths=None,
+                tags=None):
+    r"""
+    Return a list of (file_path, test dictionary) tuples, in file path order,
+    for the tests in the index which match the criteria.
+
+    Description of argument(s):
+    index                           The index dictionary.
+    file_paths                      A list of file paths to which the results
+                                    are to be restricted.  If this is None,
+                                    all indexed files are included.
+    tags                            A list of tags.  If specified, only tests
+                                    having at least one of these tags are
+                                    included.
+    """
+
+    if file_paths is None:
+        file_paths = sorted(index)
+    if tags:
+        tags = set([normalize_tag(tag) for tag in tags])
+
+    results = []
+    for file_path in file_paths:
+        for test in index.get(file_path, {}).get('tests', []):
+            if tags and not tags.intersection([normalize_tag(tag) for tag
+                                               in test['tags']]):
+                continue
+            results.append((file_path, test))
+    return results
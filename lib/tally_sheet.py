@@ -6,7 +6,6 @@ Define the tally_sheet class.
 
 import sys
 import collections
-import copy
 import re
 
 try:
@@ -84,19 +83,22 @@ class tally_sheet:
         self.__obj_name = obj_name
         # The row key field uniquely identifies the row.
         self.__row_key_field_name = row_key_field_name
-        # Create a "table" which is an ordered dictionary.
-        # If we're running python 2.7 or later, collections has an
-        # OrderedDict we can use.  Otherwise, we'll try to use the DotDict (a
-        # robot library).  If neither of those are available, we fail.
-        try:
-            self.__table = collections.OrderedDict()
-        except AttributeError:
-            self.__table = DotDict()
         # Save the initial fields dictionary.
         self.__init_fields_dict = init_fields_dict
-        self.__totals_line = init_fields_dict
+        self.__field_names = list(init_fields_dict.keys())
+        self.__field_ixs = dict((field_key, field_ix) for field_ix, field_key
+                                in enumerate(self.__field_names))
+        # The table is stored by column, i.e. one list of values per field.
+        # __row_ixs maps each row key to its index in the columns and keeps
+        # the rows in the order they were added.
+        self.__row_ixs = collections.OrderedDict()
+        self.__columns = [[] for field_key in self.__field_names]
         self.__sum_fields = []
+        self.__sum_field_ixs = set()
         self.__calc_fields = []
+        self.__compiled_calc_fields = []
+        # The totals line is kept up to date as rows are added and changed.
+        self.__totals = list(init_fields_dict.values())
 
     def init(self,
              row_key_field_name,
@@ -116,12 +118,19 @@ class tally_sheet:
         """
 
         self.__sum_fields = sum_fields
+        self.__sum_field_ixs = set(self.__field_ixs[field_key]
+                                   for field_key in sum_fields)
+        self.__recalc()
 
     def set_calc_fields(self, calc_fields):
         r"""
         Set the calc fields, i.e. create a list of field names within a given
         row which are to be calculated for the user.
 
+        Each calc field is compiled once into a function of the row's values.
+        Thereafter, a row's calc fields are re-calculated whenever one of its
+        fields is changed.
+
         Description of arguments:
         calc_fields                 A string expression such as
                                     'total=pass+fail' which shows which field
@@ -130,6 +139,72 @@ class tally_sheet:
         """
 
         self.__calc_fields = calc_fields
+        self.__compiled_calc_fields = [self.__compile_calc_field(calc_field)
+                                       for calc_field in calc_fields]
+        self.__recalc()
+
+    def __compile_calc_field(self, calc_field):
+        r"""
+        Compile the calc field and return a tuple consisting of the index of
+        the field to be calculated and a function which, given a list of the
+        row's values, returns the calculated value.
+
+        Description of arguments:
+        calc_field                  A string expression such as
+                                    'total=pass+fail'.
+        """
+
+        field_key, expression = calc_field.split("=", 1)
+        cmd_buf = ""
+        for token in [i for i in re.split(r'(\W+)', expression) if i]:
+            if re.match(r'\W', token) or token.isdigit():
+                cmd_buf += token
+            else:
+                cmd_buf += "row[" + str(self.__field_ixs[token]) + "]"
+        return (self.__field_ixs[field_key.strip()],
+                eval("lambda row: " + cmd_buf))
+
+    def __set_field(self, row_ix, field_ix, value):
+        r"""
+        Set a field in a row, adjusting the totals line accordingly.
+
+        Description of arguments:
+        row_ix                      The index of the row in the columns.
+        field_ix                    The index of the field.
+        value                       The value to be set.
+        """
+
+        column = self.__columns[field_ix]
+        if field_ix in self.__sum_field_ixs:
+            self.__totals[field_ix] += value - column[row_ix]
+        column[row_ix] = value
+
+    def __calc_row(self, row_ix):
+        r"""
+        Calculate the calc fields of a row.
+
+        Description of arguments:
+        row_ix                      The index of the row in the columns.
+        """
+
+        if not self.__compiled_calc_fields:
+            return
+        row = [column[row_ix] for column in self.__columns]
+        for field_ix, calc_func in self.__compiled_calc_fields:
+            row[field_ix] = calc_func(row)
+            self.__set_field(row_ix, field_ix, row[field_ix])
+
+    def __recalc(self):
+        r"""
+        Calculate every row's calc fields and the totals line from scratch.
+        This is only needed when the sum or calc fields are changed.
+        """
+
+        self.__totals = list(self.__init_fields_dict.values())
+        for field_ix in self.__sum_field_ixs:
+            self.__totals[field_ix] += sum(self.__columns[field_ix])
+        for row_ix in range(len(self.__row_ixs)):
+            self.__calc_row(row_ix)
 
     def add_row(self, row_key, init_fields_dict=None):
         r"""
@@ -146,17 +221,21 @@ class tally_sheet:
                                     used.
         """
 
-        if row_key in self.__table:
+        if row_key in self.__row_ixs:
             # If we allow this, the row values get re-initialized.
             message = "An entry for \"" + row_key + "\" already exists in"
             message += " tally sheet."
             raise ValueError(message)
         if init_fields_dict is None:
             init_fields_dict = self.__init_fields_dict
-        try:
-            self.__table[row_key] = collections.OrderedDict(init_fields_dict)
-        except AttributeError:
-            self.__table[row_key] = DotDict(init_fields_dict)
+        row_ix = len(self.__row_ixs)
+        self.__row_ixs[row_key] = row_ix
+        for field_ix, field_key in enumerate(self.__field_names):
+            value = init_fields_dict[field_key]
+            self.__columns[field_ix].append(value)
+            if field_ix in self.__sum_field_ixs:
+                self.__totals[field_ix] += value
+        self.__calc_row(row_ix)
 
     def update_row_field(self, row_key, field_key, value):
         r"""
@@ -171,7 +250,9 @@ class tally_sheet:
                                     row/field.
         """
 
-        self.__table[row_key][field_key] = value
+        row_ix = self.__row_ixs[row_key]
+        self.__set_field(row_ix, self.__field_ixs[field_key], value)
+        self.__calc_row(row_ix)
 
     def inc_row_field(self, row_key, field_key):
         r"""
@@ -185,7 +266,11 @@ class tally_sheet:
                                     row that is to be updated.
         """
 
-        self.__table[row_key][field_key] += 1
+        row_ix = self.__row_ixs[row_key]
+        field_ix = self.__field_ixs[field_key]
+        self.__set_field(row_ix, field_ix,
+                         self.__columns[field_ix][row_ix] + 1)
+        self.__calc_row(row_ix)
 
     def dec_row_field(self, row_key, field_key):
         r"""
@@ -199,37 +284,60 @@ class tally_sheet:
                                     row that is to be updated.
         """
 
-        self.__table[row_key][field_key] -= 1
+        row_ix = self.__row_ixs[row_key]
+        field_ix = self.__field_ixs[field_key]
+        self.__set_field(row_ix, field_ix,
+                         self.__columns[field_ix][row_ix] - 1)
+        self.__calc_row(row_ix)
+
+    def merge(self, other):
+        r"""
+        Add the sum field values of each row of another tally sheet to the
+        corresponding row of this tally sheet.  Rows which do not yet exist in
+        this tally sheet are added.
+
+        Description of arguments:
+        other                       A tally sheet object with the same fields
+                                    as this one.
+        """
+
+        for row_key, other_row_ix in other.__row_ixs.items():
+            if row_key not in self.__row_ixs:
+                self.add_row(row_key)
+            row_ix = self.__row_ixs[row_key]
+            for field_key in self.__sum_fields:
+                field_ix = self.__field_ixs[field_key]
+                self.__set_field(row_ix, field_ix,
+                                 self.__columns[field_ix][row_ix]
+                                 + other.__columns[field_ix][other_row_ix])
+            self.__calc_row(row_ix)
 
     def calc(self):
         r"""
-        Calculate totals and row calc fields.  Also, return totals_line
-        dictionary.
+        Return the totals_line dictionary.
+
+        Row calc fields and totals are kept up to date as rows are added and
+        changed so no calculation is required here.
+        """
+
+        try:
+            return collections.OrderedDict(zip(self.__field_names,
+                                               self.__totals))
+        except AttributeError:
+            return DotDict(zip(self.__field_names, self.__totals))
+
+    def __get_table(self):
+        r"""
+        Return the table as an ordered dictionary of row dictionaries keyed by
+        row key.
         """
 
-        self.__totals_line = copy.deepcopy(self.__init_fields_dict)
-        # Walk through the rows of the table.
-        for row_key, value in self.__table.items():
-            # Walk through the calc fields and process them.
-            for calc_field in self.__calc_fields:
-                tokens = [i for i in re.split(r'(\d+|\W+)', calc_field) if i]
-                cmd_buf = ""
-                for token in tokens:
-                    if token in ("=", "+", "-", "*", "/"):
-                        cmd_buf += token + " "
-                    else:
-                        # Note: Using "mangled" name for the sake of the exec
-                        # statement (below).
-                        cmd_buf += "self._" + self.__class__.__name__ +\
-                                   "__table['" + row_key + "']['" +\
-                                   token + "'] "
-                exec(cmd_buf)
-
-            for field_key, sub_value in value.items():
-                if field_key in self.__sum_fields:
-                    self.__totals_line[field_key] += sub_value
-
-        return self.__totals_line
+        table = collections.OrderedDict()
+        for row_key, row_ix in self.__row_ixs.items():
+            table[row_key] = collections.OrderedDict(
+                (field_key, column[row_ix]) for field_key, column
+                in zip(self.__field_names, self.__columns))
+        return table
 
     def sprint_obj(self):
         r"""
@@ -239,15 +347,16 @@ class tally_sheet:
 
         buffer = ""
 
+        table = self.__get_table()
+        totals_line = self.calc()
         buffer += "class name: " + self.__class__.__name__ + "\n"
         buffer += gp.sprint_var(self.__obj_name)
         buffer += gp.sprint_var(self.__row_key_field_name)
-        buffer += gp.sprint_var(self.__table)
+        buffer += gp.sprint_var(table)
         buffer += gp.sprint_var(self.__init_fields_dict)
         buffer += gp.sprint_var(self.__sum_fields)
-        buffer += gp.sprint_var(self.__totals_line)
+        buffer += gp.sprint_var(totals_line)
         buffer += gp.sprint_var(self.__calc_fields)
-        buffer += gp.sprint_var(self.__table)
 
         return buffer
 
@@ -273,33 +382,31 @@ class tally_sheet:
         dash_format_string = '{0:-<' + str(key_width) + '}'
         field_num = 0
 
-        try:
-            first_rec = next(iter(self.__table.items()))
-            for row_key, value in first_rec[1].items():
+        if self.__row_ixs:
+            for field_key, column in zip(self.__field_names, self.__columns):
                 field_num += 1
-                if isinstance(value, int):
+                if isinstance(column[0], int):
                     align = ':>'
                 else:
                     align = ':<'
                 format_string += ' {' + str(field_num) + align +\
-                                 str(len(row_key)) + '}'
+                                 str(len(field_key)) + '}'
                 dash_format_string += ' {' + str(field_num) + ':->' +\
-                                      str(len(row_key)) + '}'
-                report_width += 1 + len(row_key)
-                col_names.append(row_key.title())
-        except StopIteration:
-            pass
+                                      str(len(field_key)) + '}'
+                report_width += 1 + len(field_key)
+                col_names.append(field_key.title())
         num_fields = field_num + 1
         totals_line_fmt = '{0:=<' + str(report_width) + '}'
 
         buffer += format_string.format(*col_names) + "\n"
         buffer += dash_format_string.format(*([''] * num_fields)) + "\n"
-        for row_key, value in self.__table.items():
-            buffer += format_string.format(row_key, *value.values()) + "\n"
+        for row_key, row_ix in self.__row_ixs.items():
+            buffer += format_string.format(
+                row_key, *[column[row_ix] for column in self.__columns]) \
+                + "\n"
 
         buffer += totals_line_fmt.format('') + "\n"
-        buffer += format_string.format('Totals',
-                                       *self.__totals_line.values()) + "\n"
+        buffer += format_string.format('Totals', *self.__totals) + "\n"
 
         return buffer
 
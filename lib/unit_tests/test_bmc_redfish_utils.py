@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+r"""
+Test the enumerate_request functions of bmc_redfish_utils against a mock
+redfish server.
+
+Run from the base directory of the repository:
+
+python -m unittest discover -s lib/unit_tests
+"""
+
+import os
+import sys
+import json
+import threading
+import unittest
+try:
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+except ImportError:
+    raise unittest.SkipTest("These tests require python 3.7 or later.")
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+try:
+    import bmc_redfish_utils as bru
+except ImportError as exception:
+    raise unittest.SkipTest(str(exception))
+
+session_key = "mock_session_key"
+
+# The resources served by the mock redfish server, keyed by path.  Each value
+# is a (status, response dictionary) tuple.  A status of None causes the
+# server to drop the connection without responding.  Paths not listed here
+# get a 404.
+default_resources = {
+    "/redfish/v1": (200, {
+        "@odata.id": "/redfish/v1",
+        "Systems": {"@odata.id": "/redfish/v1/Systems"},
+        "Chassis": {"@odata.id": "/redfish/v1/Chassis"},
+        "JsonSchemas": {"@odata.id": "/redfish/v1/JsonSchemas"}}),
+    "/redfish/v1/Systems": (200, {
+        "@odata.id": "/redfish/v1/Systems",
+        "Members": [{"@odata.id": "/redfish/v1/Systems/system"}]}),
+    "/redfish/v1/Systems/system": (200, {
+        "@odata.id": "/redfish/v1/Systems/system",
+        "PowerState": "On",
+        "Bios": {"@odata.id": "/redfish/v1/Systems/system/Bios"}}),
+    "/redfish/v1/Chassis": (200, {
+        "@odata.id": "/redfish/v1/Chassis",
+        "Members": [{"@odata.id": "/redfish/v1/Chassis/chassis"}]}),
+    "/redfish/v1/Chassis/chassis": (200, {
+        "@odata.id": "/redfish/v1/Chassis/chassis",
+        "PowerState": "On"}),
+    "/redfish/v1/JsonSchemas": (500, {}),
+}
+
+
+class mock_redfish_handler(BaseHTTPRequestHandler):
+    r"""
+    Serve GET requests from the server's resources dictionary.
+    """
+
+    def do_GET(self):
+        self.server.requested_paths.append(self.path)
+        self.server.auth_tokens.add(self.headers.get('X-Auth-Token'))
+        status, response_dict = \
+            self.server.resources.get(self.path.rstrip('/'), (404, {}))
+        if status is None:
+            self.close_connection = True
+            return
+        body = json.dumps(response_dict).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class mock_rest_response(object):
+    r"""
+    Mimic the parts of a redfish rest response used by bmc_redfish_utils.
+    """
+
+    def __init__(self, response):
+        self.status = response.status_code
+        try:
+            self.dict = response.json()
+        except ValueError:
+            self.dict = {}
+
+
+class mock_redfish(object):
+    r"""
+    Mimic the parts of the redfish library object (see redfish_plus.py) used
+    by bmc_redfish_utils.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def get_session_key(self):
+        return session_key
+
+    def get_base_url(self):
+        return self.base_url
+
+    def get(self, path, valid_status_codes=[200]):
+        try:
+            response = requests.get(self.base_url + path,
+                                    headers={'X-Auth-Token': session_key})
+        except requests.exceptions.RequestException as exception:
+            raise ValueError(str(exception))
+        if response.status_code not in valid_status_codes:
+            raise ValueError("The HTTP status code was not valid: "
+                             + str(response.status_code))
+        return mock_rest_response(response)
+
+
+class test_enumerate_request(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0),
+                                          mock_redfish_handler)
+        self.server.daemon_threads = True
+        self.server.resources = dict(default_resources)
+        self.server.requested_paths = []
+        self.server.auth_tokens = set()
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        # Each test gets its own port and therefore its own host semaphore.
+        base_url = "http://127.0.0.1:" + str(self.server.server_address[1])
+        self.redfish_utils = bru.bmc_redfish_utils.__new__(
+            bru.bmc_redfish_utils)
+        self.redfish_utils._redfish_ = mock_redfish(base_url)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+
+    def enumerate(self, max_workers):
+        return dict(self.redfish_utils.enumerate_request_iter(
+            "/redfish/v1", max_workers=max_workers))
+
+    def test_parallel_matches_serial(self):
+        serial_result = self.enumerate(1)
+        parallel_result = self.enumerate(4)
+        self.assertEqual(parallel_result, serial_result)
+        self.assertEqual(sorted(parallel_result),
+                         ["/redfish/v1", "/redfish/v1/Chassis",
+                          "/redfish/v1/Chassis/chassis",
+                          "/redfish/v1/Systems",
+                          "/redfish/v1/Systems/system"])
+        self.assertEqual(self.server.auth_tokens, set([session_key]))
+
+    def test_json_schemas_not_requested(self):
+        self.enumerate(4)
+        self.assertFalse([path for path in self.server.requested_paths
+                          if 'JsonSchemas' in path])
+
+    def test_tolerated_status_codes_are_skipped(self):
+        self.server.resources["/redfish/v1/Chassis/chassis"] = (500, {})
+        for max_workers in [1, 4]:
+            result = self.enumerate(max_workers)
+            self.assertNotIn("/redfish/v1/Chassis/chassis", result)
+            self.assertIn("/redfish/v1/Systems/system", result)
+
+    def test_invalid_status_code_fails(self):
+        for status in [401, 403, 503]:
+            self.server.resources["/redfish/v1/Systems/system"] = (status, {})
+            for max_workers in [1, 4]:
+                with self.assertRaises(ValueError):
+                    self.enumerate(max_workers)
+
+    def test_connection_error_fails(self):
+        self.server.resources["/redfish/v1/Chassis"] = (None, {})
+        for max_workers in [1, 4]:
+            with self.assertRaises(ValueError):
+                self.enumerate(max_workers)
+
+
+if __name__ == '__main__':
+    unittest.main()
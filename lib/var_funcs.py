@@ -6,6 +6,7 @@ Define variable manipulation functions.
 
 import os
 import re
+import itertools
 
 try:
     from robot.utils import DotDict
@@ -253,18 +254,15 @@ def parse_key_value(string,
                                     underscores.
     """
 
-    pair = string.split(delim)
+    key, _, value = string.partition(delim)
 
-    key = pair[0].strip(strip)
-    if len(pair) == 0:
-        value = ""
-    else:
-        value = delim.join(pair[1:]).strip(strip)
+    key = key.strip(strip)
+    value = value.strip(strip)
 
     if to_lower:
         key = key.lower()
     if underscores:
-        key = re.sub(r" ", "_", key)
+        key = key.replace(" ", "_")
 
     return key, value
 
@@ -404,7 +402,7 @@ def key_value_list_to_dict(list,
                 result_dict[parent_key] = key_value_list_to_dict(sub_list,
                                                                  **args)
             else:
-                result_dict[parent_key] = map(str.strip, sub_list)
+                result_dict[parent_key] = [x.strip() for x in sub_list]
             del sub_list[:]
 
         result_dict[key] = value
@@ -420,7 +418,7 @@ def key_value_list_to_dict(list,
             # sub-dictionary.
             result_dict[parent_key] = key_value_list_to_dict(sub_list, **args)
         else:
-            result_dict[parent_key] = map(str.strip, sub_list)
+            result_dict[parent_key] = [x.strip() for x in sub_list]
 
     return result_dict
 
@@ -537,6 +535,124 @@ def create_field_desc_regex(line):
     return field_desc_regex
 
 
+# The field descriptor layouts created by get_field_desc_layout, keyed by
+# field descriptor line.
+field_desc_layouts = {}
+max_field_desc_layouts = 256
+
+
+def get_field_desc_layout(line):
+    r"""
+    Return a list of (start, end) tuples giving the position of each field
+    described by the field descriptor line.
+
+    This is the compiled form of the regular expression returned by
+    create_field_desc_regex.  Report lines can be split into fields by simple
+    slicing (i.e. line[start:end]) rather than by regex matching.  Layouts
+    are cached so that each distinct field descriptor line is only processed
+    once.
+
+    Example:
+
+    Given the following input line:
+
+    --------   ------------ ------------------ ------------------------
+
+    This function will return:
+
+    [(0, 8), (11, 23), (24, 42), (43, 67)]
+
+    Description of argument(s):
+    line                            A line consisting of dashes to represent
+                                    fields and spaces to delimit fields.
+    """
+
+    try:
+        return field_desc_layouts[line]
+    except KeyError:
+        pass
+
+    if len(field_desc_layouts) >= max_field_desc_layouts:
+        field_desc_layouts.clear()
+    layout = [(match.start(), match.end())
+              for match in re.finditer(r"-+", line)]
+    field_desc_layouts[line] = layout
+    return layout
+
+
+def iter_report(report_lines,
+                to_lower=1,
+                field_delim=None):
+    r"""
+    Parse report text lines, yielding a list of column names followed by a
+    list of field values for each report line.
+
+    This is the engine for list_to_report, outbuf_to_report and
+    list_to_columns.  Since it is a generator, it can process a report of any
+    size (e.g. from a file or a pipe) one line at a time.  Like csv.reader,
+    the first list yielded is the header (i.e. the column names).
+
+    Example:
+
+    report = iter_report(open("ps.out"))
+    columns = next(report)
+    for values in report:
+        ...
+
+    Description of argument(s):
+    report_lines                    An iterable of report lines (e.g. a list,
+                                    a file object).  Trailing newlines are
+                                    removed.  See list_to_report for a
+                                    description of the report format.
+    to_lower                        Change the resulting column names to lower
+                                    case.
+    field_delim                     Indicates that there are field delimiters
+                                    in the report lines (which should be
+                                    removed).
+    """
+
+    report_lines = iter(report_lines)
+    try:
+        header_line = next(report_lines).rstrip("\n")
+    except StopIteration:
+        return
+    if field_delim is not None:
+        header_line = header_line.replace(field_delim, "")
+    if to_lower:
+        header_line = header_line.lower()
+
+    layout = None
+    first_line = None
+    for report_line in report_lines:
+        first_line = report_line.rstrip("\n")
+        if field_delim is not None:
+            first_line = first_line.replace(field_delim, "")
+        if re.match(r"^-[ -]*$", first_line):
+            # We have a field descriptor line (as shown in example 2 of
+            # list_to_report).  It has served its purpose once the layout is
+            # obtained.
+            layout = get_field_desc_layout(first_line)
+            first_line = None
+        break
+
+    # Process the header line by creating a list of column names.
+    if layout is None:
+        yield header_line.split()
+    else:
+        yield [header_line[start:end].strip() for start, end in layout]
+
+    if first_line is not None:
+        report_lines = itertools.chain([first_line], report_lines)
+    for report_line in report_lines:
+        report_line = report_line.rstrip("\n")
+        if field_delim is not None:
+            report_line = report_line.replace(field_delim, "")
+        if layout is None:
+            yield report_line.split()
+        else:
+            yield [report_line[start:end].strip() for start, end in layout]
+
+
 def list_to_report(report_list,
                    to_lower=1,
                    field_delim=None):
@@ -594,12 +710,16 @@ def list_to_report(report_list,
     -------- ------------ ------------------ ------------------------
     20000001 in progress  0x7D0              ,,
 
+    For large reports, consider list_to_columns (below), which does not build
+    a dictionary for every report line.
+
     Description of argument(s):
     report_list                     A list where each entry is one line of
                                     output from a report.  The first entry
                                     must be a header line which contains
                                     column names.  Column names may not
-                                    contain spaces.
+                                    contain spaces.  This may also be any
+                                    iterable of lines (e.g. a file object).
     to_lower                        Change the resulting key names to lower
                                     case.
     field_delim                     Indicates that there are field delimiters
@@ -607,52 +727,16 @@ def list_to_report(report_list,
                                     removed).
     """
 
-    if len(report_list) <= 1:
-        # If we don't have at least a descriptor line and one line of data,
-        # return an empty array.
+    report = iter_report(report_list, to_lower, field_delim)
+    columns = next(report, None)
+    if columns is None:
         return []
 
-    if field_delim is not None:
-        report_list = [re.sub("\\|", "", line) for line in report_list]
-
-    header_line = report_list[0]
-    if to_lower:
-        header_line = header_line.lower()
-
-    field_desc_regex = ""
-    if re.match(r"^-[ -]*$", report_list[1]):
-        # We have a field descriptor line (as shown in example 2 above).
-        field_desc_regex = create_field_desc_regex(report_list[1])
-        field_desc_len = len(report_list[1])
-        pad_format_string = "%-" + str(field_desc_len) + "s"
-        # The field descriptor line has served its purpose.  Deleting it.
-        del report_list[1]
-
-    # Process the header line by creating a list of column names.
-    if field_desc_regex == "":
-        columns = header_line.split()
-    else:
-        # Pad the line with spaces on the right to facilitate processing with
-        # field_desc_regex.
-        header_line = pad_format_string % header_line
-        columns = map(str.strip, re.findall(field_desc_regex, header_line)[0])
-
-    report_obj = []
-    for report_line in report_list[1:]:
-        if field_desc_regex == "":
-            line = report_line.split()
-        else:
-            # Pad the line with spaces on the right to facilitate processing
-            # with field_desc_regex.
-            report_line = pad_format_string % report_line
-            line = map(str.strip, re.findall(field_desc_regex, report_line)[0])
-        try:
-            line_dict = collections.OrderedDict(zip(columns, line))
-        except AttributeError:
-            line_dict = DotDict(zip(columns, line))
-        report_obj.append(line_dict)
-
-    return report_obj
+    try:
+        return [collections.OrderedDict(zip(columns, line))
+                for line in report]
+    except AttributeError:
+        return [DotDict(zip(columns, line)) for line in report]
 
 
 def outbuf_to_report(out_buf,
@@ -704,10 +788,89 @@ def outbuf_to_report(out_buf,
                                     list_to_report function for details).
     """
 
-    report_list = list(filter(None, out_buf.split("\n")))
+    report_list = filter(None, out_buf.split("\n"))
     return list_to_report(report_list, **args)
 
 
+def list_to_columns(report_list,
+                    **args):
+    r"""
+    Convert a list containing report text lines to a columnar report and
+    return it.
+
+    A columnar report is a dictionary whose keys are the column names and
+    whose values are lists of the field values for each report line.  This
+    takes far less memory than the list of dictionaries returned by
+    list_to_report and can be queried with match_columns and filter_columns
+    (below).  A field missing from a report line (e.g. the "on" field in the
+    list_to_report example) is represented by None.
+
+    Example:
+
+    For the report_list shown in the list_to_report prolog, this function
+    would return:
+
+    df_columns:
+      [filesystem]:
+        [0]:                           dev
+        [1]:                           tmpfs
+      [1k-blocks]:
+        [0]:                           247120
+        [1]:                           248408
+      ...
+      [on]:
+        [0]:                           None
+        [1]:                           None
+
+    Description of argument(s):
+    report_list                     A list (or any iterable) of report lines.
+                                    See list_to_report for details.
+    **args                          Arguments to be interpreted by
+                                    iter_report (i.e. to_lower, field_delim).
+    """
+
+    try:
+        columns = collections.OrderedDict()
+    except AttributeError:
+        columns = DotDict()
+
+    report = iter_report(report_list, **args)
+    column_names = next(report, None)
+    if column_names is None:
+        return columns
+
+    for column_name in column_names:
+        columns[column_name] = []
+    # Each column name is assumed to be unique.
+    appends = [columns[column_name].append for column_name in column_names]
+    num_columns = len(appends)
+    for line in report:
+        if len(line) < num_columns:
+            line = line + [None] * (num_columns - len(line))
+        for append, value in zip(appends, line):
+            append(value)
+
+    return columns
+
+
+def outbuf_to_columns(out_buf,
+                      **args):
+    r"""
+    Convert a text buffer containing report lines to a columnar report and
+    return it.
+
+    Refer to list_to_columns (above) for more details.
+
+    Description of argument(s):
+    out_buf                         A text report.  See outbuf_to_report for
+                                    details.
+    **args                          Arguments to be interpreted by
+                                    iter_report (i.e. to_lower, field_delim).
+    """
+
+    return list_to_columns(filter(None, out_buf.split("\n")), **args)
+
+
 def nested_get(key_name, structure):
     r"""
     Return a list of all values from the nested structure that have the given
@@ -916,3 +1079,132 @@ def filter_struct(structure, filter_dict, regex=False, invert=False):
                 result[struct_key] = struct_value
 
     return result
+
+
+def match_columns(columns, match_dict, regex=False):
+    r"""
+    Return a list of the indexes of the rows of the columnar report which
+    match the match dictionary.
+
+    This is the columnar counterpart of match_struct.  Each match is done
+    with a single pass over the relevant column.
+
+    Example:
+
+    ps_columns = outbuf_to_columns(out_buf)
+    row_ixs = match_columns(ps_columns, {'cmd': 'obmc-console'}, regex=True)
+
+    Description of argument(s):
+    columns                         A columnar report such as the one returned
+                                    by list_to_columns.
+    match_dict                      Each key/value pair in match_dict must be
+                                    matched by a row for the row to be
+                                    considered a match.  A match value of None
+                                    is considered a special case where a row
+                                    would be considered a match only if it
+                                    has no value for the key in question.
+    regex                           Indicates whether the values in the
+                                    match_dict should be interpreted as
+                                    regular expressions.
+    """
+
+    if len(columns) == 0:
+        return []
+    row_ixs = range(len(next(iter(columns.values()))))
+    for match_key, match_value in match_dict.items():
+        column = columns.get(match_key)
+        if match_value is None:
+            # Handle this as special case.
+            if column is not None:
+                row_ixs = [ix for ix in row_ixs if column[ix] is None]
+            continue
+        if column is None:
+            return []
+        if regex:
+            search = re.compile(match_value).search
+            row_ixs = [ix for ix in row_ixs if column[ix] is not None
+                       and search(str(column[ix]))]
+        else:
+            row_ixs = [ix for ix in row_ixs if column[ix] == match_value]
+
+    return list(row_ixs)
+
+
+def filter_columns(columns, filter_dict, regex=False, invert=False):
+    r"""
+    Filter the columnar report by removing any rows that do NOT match the
+    keys/values specified in filter_dict and return the result as a new
+    columnar report.
+
+    This is the columnar counterpart of filter_struct.
+
+    Example:
+
+    sdr_columns = outbuf_to_columns(out_buf)
+    sdr_columns = filter_columns(sdr_columns, "[('status', 'ok')]",
+                                 invert=True)
+
+    Description of argument(s):
+    columns                         A columnar report such as the one returned
+                                    by list_to_columns.
+    filter_dict                     See match_columns for details.  This may
+                                    also be a string containing a python
+                                    object definition (see filter_struct).
+    regex                           Indicates whether the values in the
+                                    filter_dict should be interpreted as
+                                    regular expressions.
+    invert                          Invert the results.  Instead of including
+                                    only matching rows in the results,
+                                    include only NON-matching rows in the
+                                    results.
+    """
+
+    filter_dict = fa.source_to_object(filter_dict)
+    row_ixs = match_columns(columns, filter_dict, regex)
+    if invert:
+        matched_row_ixs = set(row_ixs)
+        num_rows = len(next(iter(columns.values()))) if len(columns) else 0
+        row_ixs = [ix for ix in range(num_rows) if ix not in matched_row_ixs]
+
+    try:
+        result = collections.OrderedDict()
+    except AttributeError:
+        result = DotDict()
+    for column_name, column in columns.items():
+        result[column_name] = [column[ix] for ix in row_ixs]
+
+    return result
+
+
+def columns_to_report(columns, row_ixs=None):
+    r"""
+    Convert a columnar report (or selected rows thereof) to a report "object"
+    (i.e. a list of dictionaries as returned by list_to_report) and return
+    it.  Fields whose value is None are omitted.
+
+    Description of argument(s):
+    columns                         A columnar report such as the one returned
+                                    by list_to_columns.
+    row_ixs                         A list of the indexes of the rows to be
+                                    converted (e.g. as returned by
+                                    match_columns).  This defaults to all
+                                    rows.
+    """
+
+    if len(columns) == 0:
+        return []
+    if row_ixs is None:
+        row_ixs = range(len(next(iter(columns.values()))))
+    column_items = list(columns.items())
+    report_obj = []
+    for ix in row_ixs:
+        try:
+            line_dict = collections.OrderedDict()
+        except AttributeError:
+            line_dict = DotDict()
+        for column_name, column in column_items:
+            if column[ix] is not None:
+                line_dict[column_name] = column[ix]
+        report_obj.append(line_dict)
+
+    return report_obj
@@ -1,21 +1,25 @@
 #!/usr/bin/env python
 
 r"""
-Use robot framework API to extract test result data from output.xml generated
-by robot tests. For more information on the Robot Framework API, see
-http://robot-framework.readthedocs.io/en/3.0/autodoc/robot.result.html
+Extract test result data from output.xml files generated by robot tests.
+
+The output.xml files are parsed incrementally (via ElementTree.iterparse) so
+that arbitrarily large files can be processed in constant memory.  A CSV row
+is written as each test element is closed, and each element is discarded once
+it has been processed.
 """
 
 import sys
 import os
 import getopt
 import csv
-import robot.errors
 import re
 import stat
+import glob
+import shutil
+import tempfile
+import multiprocessing
 from datetime import datetime
-from robot.api import ExecutionResult
-from robot.result.visitor import ResultVisitor
 from xml.etree import ElementTree
 
 # Remove the python library path to restore with local project path later.
@@ -40,18 +44,18 @@ if len(sys.argv) == 1:
 
 parser = argparse.ArgumentParser(
     usage=info,
-    description="%(prog)s uses a robot framework API to extract test result\
-    data from output.xml generated by robot tests. For more information on the\
-    Robot Framework API, see\
-    http://robot-framework.readthedocs.io/en/3.0/autodoc/robot.result.html",
+    description="%(prog)s extracts test result data from output.xml files\
+    generated by robot tests and writes it to a .csv file.",
     formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     prefix_chars='-+')
 
 parser.add_argument(
     '--source',
     '-s',
-    help='The output.xml robot test result file path.  This parameter is \
-          required.')
+    help='The output.xml robot test result file path or the path of a \
+          directory containing output.xml files (i.e. *.xml files).  The \
+          files in a directory are processed in parallel and their results \
+          are merged into one .csv file.  This parameter is required.')
 
 parser.add_argument(
     '--dest',
@@ -85,6 +89,13 @@ parser.add_argument(
     help='Name of processor, e.g. "P9". This parameter is optional.',
     default="OPENPOWER")
 
+parser.add_argument(
+    '--max_workers',
+    type=int,
+    help='The maximum number of output.xml files to be processed at once when\
+          source is a directory.  This defaults to the number of CPUs.',
+    default=multiprocessing.cpu_count())
+
 
 # Populate stock_list with options we want.
 stock_list = [("test_mode", 0), ("quiet", 0), ("debug", 0)]
@@ -128,7 +139,7 @@ def validate_parms():
     accordingly.
     """
 
-    if not valid_file_path(source):
+    if not os.path.isdir(source) and not valid_file_path(source):
         return False
 
     if not valid_dir_path(dest):
@@ -139,54 +150,105 @@ def validate_parms():
     return True
 
 
-def parse_output_xml(xml_file_path, csv_dir_path, version_id, platform, level,
-                     test_phase, processor):
+def iter_output_xml_tests(xml_file_path,
+                          stats):
     r"""
-    Parse the robot-generated output.xml file and extract various test
-    output data. Put the extracted information into a csv file in the "dest"
-    folder.
+    Parse the robot-generated output.xml file incrementally and yield a
+    dictionary for each test as its element is closed.
+
+    Each dictionary contains the following keys:
+    name                            The test name.
+    suite_name                      The name of the suite containing the test.
+    status                          The test status (e.g. "PASS").
+    starttime                       The test start time (e.g. "20170206
+                                    05:05:19.342").
+    endtime                         The test end time.
+
+    Each test element and each top level keyword element of a suite is
+    removed from the tree once it has been processed so that memory use does
+    not grow with the size of the file.
 
     Description of argument(s):
     xml_file_path                   The path to a Robot-generated output.xml
                                     file.
-    csv_dir_path                    The path to the directory that is to
-                                    contain the .csv files generated by
-                                    this function.
+    stats                           A dictionary which this function fills in
+                                    with the following keys: passed, failed
+                                    (i.e. the number of critical tests which
+                                    passed and failed), starttime and endtime
+                                    (i.e. those of the top level suite).
+    """
+
+    stats.update({'passed': 0, 'failed': 0, 'starttime': "", 'endtime': ""})
+    suite_names = []
+    elem_stack = []
+    for event, elem in ElementTree.iterparse(xml_file_path,
+                                             events=('start', 'end')):
+        if event == 'start':
+            elem_stack.append(elem)
+            if elem.tag == 'suite':
+                suite_names.append(elem.get('name', ""))
+            continue
+        elem_stack.pop()
+        if not elem_stack or elem_stack[-1].tag != 'suite':
+            # Elements nested within tests and keywords are discarded along
+            # with their test or keyword.
+            continue
+        parent = elem_stack[-1]
+        if elem.tag == 'test':
+            status = elem.find('status')
+            if status.get('critical', 'yes') == 'yes':
+                if status.get('status') == 'PASS':
+                    stats['passed'] += 1
+                else:
+                    stats['failed'] += 1
+            yield {'name': elem.get('name', ""),
+                   'suite_name': suite_names[-1],
+                   'status': status.get('status'),
+                   'starttime': status.get('starttime'),
+                   'endtime': status.get('endtime')}
+        elif elem.tag == 'suite':
+            suite_names.pop()
+        if elem.tag in ('test', 'kw', 'suite'):
+            parent.remove(elem)
+            elem.clear()
+
+    # The root element's last child is the top level suite's status.
+    suite_status = elem.find('suite/status')
+    if suite_status is not None:
+        stats['starttime'] = suite_status.get('starttime', "")
+        stats['endtime'] = suite_status.get('endtime', "")
+
+
+def write_csv_rows(xml_file_path,
+                   csv_file_path,
+                   version_id,
+                   platform,
+                   level,
+                   test_phase,
+                   processor):
+    r"""
+    Write a CSV row (without a header) for each test in the robot-generated
+    output.xml file.  Return a tuple consisting of the stats dictionary (see
+    iter_output_xml_tests), the driver and the platform.  If the driver or
+    platform cannot be determined, no file is written and None is returned.
+
+    This function may be run in a worker process.
+
+    Description of argument(s):
+    xml_file_path                   The path to a Robot-generated output.xml
+                                    file.
+    csv_file_path                   The path of the CSV file to be written.
     version_id                      Version of the openbmc firmware
-                                    (e.g. "v2.1-215-g6e7eacb").
+                                    (e.g. "v2.1-215-g6e7eacb").  If either
+                                    this or platform is blank, both are
+                                    obtained from the output.xml file.
     platform                        Platform of the openbmc system.
     level                           Release level of the OpenBMC system
                                     (e.g. "Master").
+    test_phase                      Name of testing phase (e.g. "FVT").
+    processor                       Name of processor (e.g. "P9").
     """
 
-    result = ExecutionResult(xml_file_path)
-    result.configure(stat_config={'suite_stat_level': 2,
-                                  'tag_stat_combine': 'tagANDanother'})
-
-    stats = result.statistics
-    print("--------------------------------------")
-    total_tc = stats.total.critical.passed + stats.total.critical.failed
-    print("Total Test Count:\t %d" % total_tc)
-    print("Total Test Failed:\t %d" % stats.total.critical.failed)
-    print("Total Test Passed:\t %d" % stats.total.critical.passed)
-    print("Test Start Time:\t %s" % result.suite.starttime)
-    print("Test End Time:\t\t %s" % result.suite.endtime)
-    print("--------------------------------------")
-
-    # Use ResultVisitor object and save off the test data info
-    class TestResult(ResultVisitor):
-        def __init__(self):
-            self.testData = []
-
-        def visit_test(self, test):
-            self.testData += [test]
-
-    collectDataObj = TestResult()
-    result.visit(collectDataObj)
-
-    # Write the result statistics attributes to CSV file
-    l_csvlist = []
-
     # Default Test data
     l_subsys = 'OPENBMC'
     l_test_type = test_phase
@@ -197,78 +259,165 @@ def parse_output_xml(xml_file_path, csv_dir_path, version_id, platform, level,
 
     l_env = 'HW'
     l_proc = processor
-    l_platform_type = ""
-    l_func_area = ""
-
-    # System data from XML meta data
-    # l_system_info = get_system_details(xml_file_path)
 
     # First let us try to collect information from keyboard input
     # If keyboard input cannot give both information, then find from xml file.
     if version_id and platform:
         l_driver = version_id
         l_platform_type = platform
-        print("BMC Version_id:%s" % version_id)
-        print("BMC Platform:%s" % platform)
     else:
         # System data from XML meta data
         l_system_info = get_system_details(xml_file_path)
         l_driver = l_system_info[0]
         l_platform_type = l_system_info[1]
 
-    # Driver version id and platform are mandatorily required for CSV file
-    # generation. If any one is not avaulable, exit CSV file generation
-    # process.
-    if l_driver and l_platform_type:
-        print("Driver and system info set.")
+    if not (l_driver and l_platform_type):
+        return None
+
+    stats = {}
+    with open(csv_file_path, "w") as l_file:
+        l_writer = csv.writer(l_file, lineterminator='\n')
+        for testcase in iter_output_xml_tests(xml_file_path, stats):
+            # Functional Area: Suite Name
+            # Test Name: Test Case Name
+            l_func_area = testcase['suite_name'].split(' ', 1)[-1]
+            l_test_name = testcase['name']
+
+            # Test Result pass=0 fail=1
+            if testcase['status'] == 'PASS':
+                l_test_result = 0
+            else:
+                l_test_result = 1
+
+            # Format datetime from robot output.xml to "%Y-%m-%d-%H-%M-%S"
+            l_stime = xml_to_csv_time(testcase['starttime'])
+            l_etime = xml_to_csv_time(testcase['endtime'])
+            # Data Sequence: test_start,test_end,subsys,test_type,
+            #                test_result,test_name,pse_rel,driver,
+            #                env,proc,platform_type,test_func_area,
+            l_writer.writerow([l_stime, l_etime, l_subsys, l_test_type,
+                               l_test_result, l_test_name, l_pse_rel,
+                               l_driver, l_env, l_proc, l_platform_type,
+                               l_func_area])
+
+    return stats, l_driver, l_platform_type
+
+
+def write_csv_rows_star(args):
+    r"""
+    Call write_csv_rows with the given tuple of arguments and return the
+    result.  This allows write_csv_rows to be used with Pool.imap.
+
+    Description of argument(s):
+    args                            A tuple of write_csv_rows arguments.
+    """
+
+    return write_csv_rows(*args)
+
+
+def parse_output_xml(xml_file_path, csv_dir_path, version_id, platform, level,
+                     test_phase, processor, max_workers=1):
+    r"""
+    Parse the robot-generated output.xml file and extract various test
+    output data. Put the extracted information into a csv file in the "dest"
+    folder.
+
+    If xml_file_path is a directory, each *.xml file in it is parsed (in
+    parallel) and the results are merged into one csv file.
+
+    Description of argument(s):
+    xml_file_path                   The path to a Robot-generated output.xml
+                                    file or to a directory of such files.
+    csv_dir_path                    The path to the directory that is to
+                                    contain the .csv files generated by
+                                    this function.
+    version_id                      Version of the openbmc firmware
+                                    (e.g. "v2.1-215-g6e7eacb").
+    platform                        Platform of the openbmc system.
+    level                           Release level of the OpenBMC system
+                                    (e.g. "Master").
+    test_phase                      Name of testing phase (e.g. "FVT").
+    processor                       Name of processor (e.g. "P9").
+    max_workers                     The maximum number of files to be parsed
+                                    at once.
+    """
+
+    if os.path.isdir(xml_file_path):
+        xml_file_paths = sorted(glob.glob(os.path.join(xml_file_path,
+                                                       "*.xml")))
     else:
-        print("Both driver and system info need to be set.\
-                CSV file is not generated.")
-        sys.exit()
-
-    # Default header
-    l_header = ['test_start', 'test_end', 'subsys', 'test_type',
-                'test_result', 'test_name', 'pse_rel', 'driver',
-                'env', 'proc', 'platform_type', 'test_func_area']
-
-    l_csvlist.append(l_header)
-
-    # Generate CSV file onto the path with current time stamp
-    l_base_dir = csv_dir_path
-    l_timestamp = datetime.utcnow().strftime("%Y-%m-%d-%H-%M-%S")
-    # Example: 2017-02-20-08-47-22_Witherspoon.csv
-    l_csvfile = l_base_dir + l_timestamp + "_" + l_platform_type + ".csv"
-
-    print("Writing data into csv file:%s" % l_csvfile)
-
-    for testcase in collectDataObj.testData:
-        # Functional Area: Suite Name
-        # Test Name: Test Case Name
-        l_func_area = str(testcase.parent).split(' ', 1)[1]
-        l_test_name = str(testcase)
-
-        # Test Result pass=0 fail=1
-        if testcase.status == 'PASS':
-            l_test_result = 0
+        xml_file_paths = [xml_file_path]
+
+    if version_id and platform:
+        print("BMC Version_id:%s" % version_id)
+        print("BMC Platform:%s" % platform)
+
+    # Each file's rows are written to a part file in the "dest" folder.  The
+    # part files are then concatenated in file order.
+    part_dir_path = tempfile.mkdtemp(dir=csv_dir_path)
+    try:
+        args_list = [(path, os.path.join(part_dir_path, str(ix) + ".csv"),
+                      version_id, platform, level, test_phase, processor)
+                     for ix, path in enumerate(xml_file_paths)]
+        max_workers = max(1, min(max_workers, len(args_list)))
+        if max_workers > 1:
+            pool = multiprocessing.Pool(processes=max_workers)
+            try:
+                results = pool.map(write_csv_rows_star, args_list)
+            finally:
+                pool.close()
+                pool.join()
         else:
-            l_test_result = 1
-
-        # Format datetime from robot output.xml to "%Y-%m-%d-%H-%M-%S"
-        l_stime = xml_to_csv_time(testcase.starttime)
-        l_etime = xml_to_csv_time(testcase.endtime)
-        # Data Sequence: test_start,test_end,subsys,test_type,
-        #                test_result,test_name,pse_rel,driver,
-        #                env,proc,platform_type,test_func_area,
-        l_data = [l_stime, l_etime, l_subsys, l_test_type, l_test_result,
-                  l_test_name, l_pse_rel, l_driver, l_env, l_proc,
-                  l_platform_type, l_func_area]
-        l_csvlist.append(l_data)
-
-    # Open the file and write to the CSV file
-    l_file = open(l_csvfile, "w")
-    l_writer = csv.writer(l_file, lineterminator='\n')
-    l_writer.writerows(l_csvlist)
-    l_file.close()
+            results = [write_csv_rows(*args) for args in args_list]
+
+        # Driver version id and platform are mandatorily required for CSV
+        # file generation. If any one is not avaulable, exit CSV file
+        # generation process.
+        if None in results:
+            print("Both driver and system info need to be set.\
+                    CSV file is not generated.")
+            sys.exit()
+        print("Driver and system info set.")
+
+        passed = sum([stats['passed'] for stats, driver, platform_type
+                      in results])
+        failed = sum([stats['failed'] for stats, driver, platform_type
+                      in results])
+        starttimes = [stats['starttime'] for stats, driver, platform_type
+                      in results if stats['starttime']]
+        endtimes = [stats['endtime'] for stats, driver, platform_type
+                    in results if stats['endtime']]
+        print("--------------------------------------")
+        print("Total Test Count:\t %d" % (passed + failed))
+        print("Total Test Failed:\t %d" % failed)
+        print("Total Test Passed:\t %d" % passed)
+        print("Test Start Time:\t %s" % min(starttimes or [""]))
+        print("Test End Time:\t\t %s" % max(endtimes or [""]))
+        print("--------------------------------------")
+
+        # Default header
+        l_header = ['test_start', 'test_end', 'subsys', 'test_type',
+                    'test_result', 'test_name', 'pse_rel', 'driver',
+                    'env', 'proc', 'platform_type', 'test_func_area']
+
+        # Generate CSV file onto the path with current time stamp
+        l_base_dir = csv_dir_path
+        l_timestamp = datetime.utcnow().strftime("%Y-%m-%d-%H-%M-%S")
+        l_platform_type = results[0][2]
+        # Example: 2017-02-20-08-47-22_Witherspoon.csv
+        l_csvfile = l_base_dir + l_timestamp + "_" + l_platform_type + ".csv"
+
+        print("Writing data into csv file:%s" % l_csvfile)
+
+        with open(l_csvfile, "w") as l_file:
+            l_writer = csv.writer(l_file, lineterminator='\n')
+            l_writer.writerow(l_header)
+            for args in args_list:
+                with open(args[1], "r") as part_file:
+                    shutil.copyfileobj(part_file, l_file)
+    finally:
+        shutil.rmtree(part_dir_path, ignore_errors=True)
+
     # Set file permissions 666.
     perm = stat.S_IRUSR + stat.S_IWUSR + stat.S_IRGRP + stat.S_IWGRP + stat.S_IROTH + stat.S_IWOTH
     os.chmod(l_csvfile, perm)
@@ -306,20 +455,20 @@ def get_system_details(xml_file_path):
 
     bmc_version_id = ""
     bmc_platform = ""
-    with open(xml_file_path, 'rt') as output:
-        tree = ElementTree.parse(output)
-
-    for node in tree.iter('msg'):
-        # /etc/os-release output is logged in the XML as msg
-        # Example: ${output} = VERSION_ID="v1.99.2-71-gbc49f79"
-        if '${output} = VERSION_ID=' in node.text:
-            # Get BMC version (e.g. v1.99.1-96-g2a46570)
-            bmc_version_id = str(node.text.split("VERSION_ID=")[1])[1:-1]
-
-        # Platform is logged in the XML as msg.
-        # Example: ${bmc_model} = Witherspoon BMC
-        if '${bmc_model} = ' in node.text:
-            bmc_platform = node.text.split(" = ")[1]
+    # Parse incrementally, discarding each element once it has been closed.
+    for event, node in ElementTree.iterparse(xml_file_path):
+        if node.tag == 'msg' and node.text:
+            # /etc/os-release output is logged in the XML as msg
+            # Example: ${output} = VERSION_ID="v1.99.2-71-gbc49f79"
+            if '${output} = VERSION_ID=' in node.text:
+                # Get BMC version (e.g. v1.99.1-96-g2a46570)
+                bmc_version_id = str(node.text.split("VERSION_ID=")[1])[1:-1]
+
+            # Platform is logged in the XML as msg.
+            # Example: ${bmc_model} = Witherspoon BMC
+            if '${bmc_model} = ' in node.text:
+                bmc_platform = node.text.split(" = ")[1]
+        node.clear()
 
     print_vars(bmc_version_id, bmc_platform)
     return [str(bmc_version_id), str(bmc_platform)]
@@ -336,7 +485,7 @@ def main():
     qprint_pgm_header()
 
     parse_output_xml(source, dest, version_id, platform, level,
-                     test_phase, processor)
+                     test_phase, processor, max_workers)
 
     return True
 